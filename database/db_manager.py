@@ -2,6 +2,7 @@
 
 import sqlite3
 import os
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Optional, List, Dict, Tuple
 
@@ -57,6 +58,17 @@ class DatabaseManager:
             print(f"Query execution error: {e}")
             return False
     
+    def execute_many(self, query: str, params_list: List[tuple]) -> bool:
+        """Run one statement for every parameter tuple in a single commit"""
+        try:
+            self.cursor.executemany(query, params_list)
+            self.connection.commit()
+            return True
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            print(f"Query execution error: {e}")
+            return False
+    
     def fetch_one(self, query: str, params: tuple = None) -> Optional[sqlite3.Row]:
         try:
             if params:
@@ -79,6 +91,23 @@ class DatabaseManager:
             print(f"Fetch error: {e}")
             return []
     
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor whose statements commit together or not at all"""
+        if self.connection.in_transaction:
+            self.connection.commit()
+        
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            yield cursor
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    
     def get_last_insert_id(self) -> int:
         return self.cursor.lastrowid
     
@@ -134,6 +163,11 @@ class DatabaseManager:
         query = "SELECT * FROM vehicles WHERE vehicle_number = ?"
         return self.fetch_one(query, (vehicle_number,))
     
+    def get_all_vehicles(self) -> List[sqlite3.Row]:
+        """Get all registered vehicles"""
+        query = "SELECT vehicle_id, user_id, vehicle_number, vehicle_type FROM vehicles"
+        return self.fetch_all(query)
+    
     def create_parking_slot(self, slot_number: str, floor: int, section: str,
                            vehicle_type: str, base_price: float, slot_type: str = 'regular') -> Optional[int]:
         """Create new parking slot"""
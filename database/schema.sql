@@ -127,7 +127,120 @@ CREATE TABLE IF NOT EXISTS analytics_cache (
     total_revenue REAL DEFAULT 0.0,
     occupancy_rate REAL DEFAULT 0.0,
     peak_hour TEXT,
-    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_bookings INTEGER DEFAULT 0,
+    total_hours REAL DEFAULT 0.0
+);
+
+-- Analytics Rollup Tables (maintained by models/analytics_rollup.py)
+CREATE TABLE IF NOT EXISTS analytics_hourly (
+    date DATE NOT NULL,
+    hour INTEGER NOT NULL,
+    bookings INTEGER DEFAULT 0,
+    completed_bookings INTEGER DEFAULT 0,
+    revenue REAL DEFAULT 0.0,
+    occupied_slot_hours REAL DEFAULT 0.0,
+    PRIMARY KEY (date, hour)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_vehicle_daily (
+    date DATE NOT NULL,
+    vehicle_type TEXT NOT NULL,
+    bookings INTEGER DEFAULT 0,
+    revenue REAL DEFAULT 0.0,
+    PRIMARY KEY (date, vehicle_type)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_dirty_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    day_from DATE NOT NULL,
+    day_to DATE NOT NULL,
+    logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS analytics_watermarks (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Log the days touched by every booking change for incremental rollups
+CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_insert AFTER INSERT ON bookings
+WHEN NEW.entry_time IS NOT NULL
+BEGIN
+    INSERT INTO analytics_dirty_log (day_from, day_to)
+    VALUES (DATE(NEW.entry_time), COALESCE(DATE(NEW.exit_time), DATE(NEW.checkout_time), DATE('now', 'localtime')));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_update
+AFTER UPDATE OF entry_time, exit_time, checkin_time, checkout_time, booking_status,
+                total_amount, duration_hours, vehicle_id, slot_id, base_amount,
+                payment_status, checkin_deadline, forfeited
+ON bookings
+BEGIN
+    INSERT INTO analytics_dirty_log (day_from, day_to)
+    SELECT DATE(OLD.entry_time), COALESCE(DATE(OLD.exit_time), DATE(OLD.checkout_time), DATE('now', 'localtime'))
+    WHERE OLD.entry_time IS NOT NULL;
+    INSERT INTO analytics_dirty_log (day_from, day_to)
+    SELECT DATE(NEW.entry_time), COALESCE(DATE(NEW.exit_time), DATE(NEW.checkout_time), DATE('now', 'localtime'))
+    WHERE NEW.entry_time IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_delete AFTER DELETE ON bookings
+WHEN OLD.entry_time IS NOT NULL
+BEGIN
+    INSERT INTO analytics_dirty_log (day_from, day_to)
+    VALUES (DATE(OLD.entry_time), COALESCE(DATE(OLD.exit_time), DATE(OLD.checkout_time), DATE('now', 'localtime')));
+END;
+
+-- Document Jobs Table (QR / PDF / chart rendering queue)
+CREATE TABLE IF NOT EXISTS document_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'done', 'failed')),
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 3,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Artifact Store Tables (content-addressed generated files)
+CREATE TABLE IF NOT EXISTS artifacts (
+    digest TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_access TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS artifact_refs (
+    digest TEXT NOT NULL,
+    ref_type TEXT NOT NULL,
+    ref_id TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (digest, ref_type, ref_id)
+);
+
+-- Revenue leakage and data-quality findings (models/anomalies.py)
+CREATE TABLE IF NOT EXISTS booking_anomalies (
+    anomaly_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rule TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    amount REAL,
+    details TEXT,
+    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    resolved_at TIMESTAMP,
+    UNIQUE (rule, entity_id)
 );
 
 -- Insert default admin user (password: admin123)
@@ -154,6 +267,15 @@ CREATE INDEX IF NOT EXISTS idx_parking_slots_status ON parking_slots(status);
 CREATE INDEX IF NOT EXISTS idx_parking_slots_type ON parking_slots(vehicle_type);
 CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id);
 CREATE INDEX IF NOT EXISTS idx_payments_booking ON payments(booking_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_entry_time ON bookings(entry_time);
+CREATE INDEX IF NOT EXISTS idx_bookings_exit_time ON bookings(exit_time);
+CREATE INDEX IF NOT EXISTS idx_bookings_booking_date ON bookings(booking_date);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_analytics_cache_date ON analytics_cache(date);
+CREATE INDEX IF NOT EXISTS idx_document_jobs_claim ON document_jobs(status, priority DESC, job_id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind ON artifacts(kind, last_access);
+CREATE INDEX IF NOT EXISTS idx_artifact_refs_owner ON artifact_refs(ref_type, ref_id);
+CREATE INDEX IF NOT EXISTS idx_booking_anomalies_open ON booking_anomalies(resolved_at, rule);
+CREATE INDEX IF NOT EXISTS idx_booking_anomalies_entity ON booking_anomalies(entity, entity_id);
 
 -- Initialize 100 parking slots
 INSERT OR IGNORE INTO parking_slots (slot_number, floor, section, vehicle_type, base_price_per_hour, location_x, location_y)
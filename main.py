@@ -7,6 +7,7 @@ from tkinter import ttk, messagebox, filedialog
 from ttkthemes import ThemedTk
 import sys
 import os
+import sqlite3
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -15,13 +16,21 @@ from models.parking_slot import ParkingSlotManager
 from models.booking import BookingManager, PaymentManager
 from models.analytics import AnalyticsManager
 from utils.qr_generator import QRCodeGenerator
-from utils.pdf_generator import PDFGenerator
 from utils.qr_handler import QRHandler
+from utils.qr_payload import parse_booking_qr, get_secret, QRPayloadError, QRSecretError
+from models.booking_cache import get_booking_cache
+from models.job_queue import get_job_queue, PRIORITY_HIGH
+from models.artifact_store import get_artifact_store
+from models.anomalies import get_anomaly_scanner
+from models.gate_snapshot import SnapshotExporter, OfflineGateVerifier
 from database.db_manager import get_db_manager
 from datetime import datetime, timedelta
 import json
 from PIL import Image, ImageTk
 
+# Snapshot the desk's QR scanner falls back to when the database is unavailable
+DESK_GATE_ID = 'desk'
+
 
 class LoginWindow:
     """Login and Registration Window"""
@@ -92,6 +101,13 @@ class MainApplication:
         self.booking_manager = BookingManager(user_data['user_id'])
         self.payment_manager = PaymentManager(user_data['user_id'])
         self.analytics_manager = AnalyticsManager()
+        self.booking_cache = get_booking_cache()
+        self.booking_cache.warm()
+        self.job_queue = get_job_queue()
+        get_artifact_store().start_sweeper()
+        get_anomaly_scanner().start_scanner()
+        self.offline_verifiers = {}
+        self.snapshot_exporter = self.start_snapshot_exporter()
         
         self.root.title(f"Smart Parking System - {user_data['name']}")
         self.root.geometry("1200x700")
@@ -497,7 +513,7 @@ class MainApplication:
             qr_data = qr_handler.scan_qr_from_webcam()
             
             if qr_data:
-                self.process_scanned_qr(json.dumps(qr_data))
+                self.process_scanned_qr(qr_data['raw'])
             else:
                 messagebox.showwarning("Scan Failed", "No QR code detected. Please try again.")
         except Exception as e:
@@ -516,7 +532,7 @@ class MainApplication:
                 qr_data = qr_handler.scan_qr_from_image(file_path)
                 
                 if qr_data:
-                    self.process_scanned_qr(json.dumps(qr_data))
+                    self.process_scanned_qr(qr_data['raw'])
                 else:
                     messagebox.showwarning("Scan Failed", "No QR code found in image.")
             except Exception as e:
@@ -574,65 +590,91 @@ class MainApplication:
     def process_scanned_qr(self, qr_data):
         """Process scanned QR code and display booking details"""
         try:
-            # Parse QR data
-            qr_dict = json.loads(qr_data)
-            
-            # Validate QR format
-            if qr_dict.get('type') != 'parking_booking':
-                messagebox.showerror("Invalid QR", "This is not a valid parking booking QR code")
+            # Parse QR data - signed tickets are checked for forgery (and on
+            # entry, expiry) here, before touching the database
+            try:
+                qr_dict = parse_booking_qr(qr_data, check_expiry=self.qr_mode_var.get() != 'exit')
+            except QRPayloadError as e:
+                messagebox.showerror("Invalid QR", str(e))
                 return
             
             booking_id = qr_dict.get('booking_id')
             ticket_number = qr_dict.get('ticket')
             
-            # Fetch booking details - verify both booking_id AND ticket number match
-            db = get_db_manager()
-            booking = db.fetch_one("""
-                SELECT b.*, u.name, u.email, u.phone, v.vehicle_number, v.vehicle_type,
-                       ps.slot_number, ps.floor, ps.section
-                FROM bookings b
-                JOIN users u ON b.user_id = u.user_id
-                JOIN vehicles v ON b.vehicle_id = v.vehicle_id
-                JOIN parking_slots ps ON b.slot_id = ps.slot_id
-                WHERE b.booking_id = ? AND b.ticket_number = ?
-            """, (booking_id, ticket_number))
-            
-            if not booking:
-                # Try searching by ticket number only in case booking_id is wrong
-                booking = db.fetch_one("""
-                    SELECT b.*, u.name, u.email, u.phone, v.vehicle_number, v.vehicle_type,
-                           ps.slot_number, ps.floor, ps.section
-                    FROM bookings b
-                    JOIN users u ON b.user_id = u.user_id
-                    JOIN vehicles v ON b.vehicle_id = v.vehicle_id
-                    JOIN parking_slots ps ON b.slot_id = ps.slot_id
-                    WHERE b.ticket_number = ?
-                """, (ticket_number,))
+            try:
+                self.sync_offline_scans()
                 
-                if not booking:
-                    messagebox.showerror("Not Found", 
-                                       f"Booking not found in database.\n\n"
-                                       f"QR Code Data:\n"
-                                       f"  Ticket: {ticket_number}\n"
-                                       f"  Booking ID: {booking_id}\n"
-                                       f"  Vehicle: {qr_dict.get('vehicle')}\n"
-                                       f"  Slot: {qr_dict.get('slot')}\n\n"
-                                       f"This QR code may be invalid or the booking was deleted.\n"
-                                       f"Note: Booking ID {booking_id} was removed from the database.")
-                    return
+                # Fetch booking details - verify both booking_id AND ticket number match.
+                # Pending/active bookings are served from memory by the lookup cache.
+                booking = self.booking_cache.get_by_booking(booking_id, ticket_number)
+                
+                # A signed ticket already vouches for its booking_id, so only
+                # legacy JSON codes fall back to a lookup by ticket number
+                if not booking and not qr_dict['signed']:
+                    booking = self.booking_cache.get_by_ticket(ticket_number)
+            except sqlite3.Error as e:
+                self.verify_offline(qr_data, e)
+                return
             
-            # Convert Row object to dictionary
-            booking_dict = dict(booking)
+            if not booking:
+                messagebox.showerror("Not Found", 
+                                   f"Booking not found in database.\n\n"
+                                   f"QR Code Data:\n"
+                                   f"  Ticket: {ticket_number}\n"
+                                   f"  Booking ID: {booking_id}\n"
+                                   f"  Vehicle: {qr_dict.get('vehicle', '-')}\n"
+                                   f"  Slot: {qr_dict.get('slot', '-')}\n\n"
+                                   f"This QR code may be invalid or the booking was deleted.\n"
+                                   f"Note: Booking ID {booking_id} was removed from the database.")
+                return
             
-            self.current_qr_booking = booking_dict
-            self.display_booking_details(booking_dict)
+            self.current_qr_booking = booking
+            self.display_booking_details(booking)
             self.qr_process_btn.config(state='normal')
             
-        except json.JSONDecodeError:
-            messagebox.showerror("Invalid QR", "QR code data is corrupted")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to process QR: {str(e)}")
     
+    def start_snapshot_exporter(self):
+        """Keep the desk's offline snapshot current; needs the QR signing key"""
+        try:
+            get_secret()
+        except QRSecretError:
+            return None
+        exporter = SnapshotExporter()
+        exporter.run_periodic([DESK_GATE_ID])
+        # Created up front so journals left by an earlier session sync too
+        path = exporter.snapshot_path(DESK_GATE_ID)
+        self.offline_verifiers = {mode: OfflineGateVerifier(path, mode) for mode in ('entry', 'exit')}
+        return exporter
+    
+    def sync_offline_scans(self):
+        """Replay scans accepted offline once the database is reachable again"""
+        for verifier in self.offline_verifiers.values():
+            if verifier.has_pending():
+                print(f"✓ Synced offline {verifier.mode} scans: {verifier.sync()}")
+    
+    def verify_offline(self, qr_data, error):
+        """Check in/out against the last snapshot while the database is unavailable"""
+        verifier = self.offline_verifiers.get(self.qr_mode_var.get())
+        if verifier is None:
+            messagebox.showerror("Database Unavailable", f"Could not look up the booking:\n{error}")
+            return
+        
+        verifier.reload()
+        result = verifier.verify(qr_data)
+        
+        if result['accepted']:
+            action = 'Check-in' if result['action'] == 'checkin' else 'Check-out'
+            messagebox.showinfo("Offline " + action,
+                              f"⚠️ Database unavailable - verified against the offline snapshot.\n\n"
+                              f"{action} recorded for ticket {result['ticket']}.\n"
+                              f"It will be saved once the database is back.")
+        else:
+            messagebox.showerror("Offline Check Failed",
+                               f"Database unavailable and the offline snapshot rejected this ticket:\n\n"
+                               f"{result['reason']}")
+    
     def display_booking_details(self, booking):
         """Display booking details in the text widget"""
         self.qr_details_text.config(state='normal')
@@ -770,6 +812,8 @@ Timing:
                         SET status = 'available'
                         WHERE slot_id = ?
                     """, (booking['slot_id'],))
+                    self.booking_cache.invalidate(booking['booking_id'])
+                    get_artifact_store().release('booking', booking['booking_id'])
                     
                     messagebox.showinfo("Cancelled", "Booking marked as cancelled. Slot freed.")
                     self.clear_qr_details()
@@ -803,6 +847,7 @@ Timing:
                     SET status = 'occupied'
                     WHERE slot_id = ?
                 """, (booking['slot_id'],))
+                self.booking_cache.invalidate(booking['booking_id'])
                 
                 messagebox.showinfo("Success", 
                                   f"✅ Check-in successful!\n\n"
@@ -857,6 +902,8 @@ Timing:
                     SET status = 'available'
                     WHERE slot_id = ?
                 """, (booking['slot_id'],))
+                self.booking_cache.invalidate(booking['booking_id'])
+                get_artifact_store().release('booking', booking['booking_id'])
                 
                 messagebox.showinfo("Success", 
                                   f"✅ Check-out successful!\n\n"
@@ -865,6 +912,7 @@ Timing:
                                   f"Thank you for using Smart Parking!")
                 
                 self.clear_qr_details()
+                self.booking_cache.refresh()
                 self.refresh_dashboard()
                 
             except Exception as e:
@@ -883,6 +931,9 @@ Timing:
         # First, expire old pending bookings
         self.auto_expire_bookings()
         
+        # Reload the scan cache now, so the next scan is served from memory
+        self.booking_cache.refresh()
+        
         self.pending_tree.delete(*self.pending_tree.get_children())
         
         db = get_db_manager()
@@ -970,6 +1021,8 @@ Timing:
                         WHERE slot_id = ?
                     """, (booking['slot_id'],))
                     
+                    self.booking_cache.invalidate(booking['booking_id'])
+                    get_artifact_store().release('booking', booking['booking_id'])
                     print(f"✓ Auto-expired booking: {booking['ticket_number']} - Slot {booking['slot_number']} freed")
                 except Exception as e:
                     print(f"✗ Error expiring booking {booking['ticket_number']}: {e}")
@@ -1051,8 +1104,10 @@ Timing:
             row=0, column=1, padx=5, pady=5)
         ttk.Button(btn_grid, text="Peak Hours Chart", command=self.generate_peak_hours_chart).grid(
             row=0, column=2, padx=5, pady=5)
-        ttk.Button(btn_grid, text="Export Bookings CSV", command=self.export_bookings).grid(
+        ttk.Button(btn_grid, text="Weekly Heatmap", command=self.generate_heatmap_chart).grid(
             row=0, column=3, padx=5, pady=5)
+        ttk.Button(btn_grid, text="Export Bookings CSV", command=self.export_bookings).grid(
+            row=0, column=4, padx=5, pady=5)
     
     def refresh_dashboard(self):
         """Refresh dashboard statistics"""
@@ -1310,10 +1365,8 @@ Timing:
         btn_frame.pack(fill='x', pady=15)
         
         def save_pdf():
-            from utils.pdf_generator import PDFGenerator
-            pdf_gen = PDFGenerator()
-            pdf_path = pdf_gen.generate_parking_receipt(bill)
-            messagebox.showinfo("Receipt Saved", f"Receipt saved at:\n{pdf_path}")
+            self.run_document_job('receipt', {'bill': bill}, self._show_receipt_saved,
+                                  priority=PRIORITY_HIGH)
         
         ttk.Button(btn_frame, text="💾 Save PDF", command=save_pdf).pack(side='left', padx=5, expand=True, fill='x')
         ttk.Button(btn_frame, text="✅ Done", command=dialog.destroy).pack(side='right', padx=5, expand=True, fill='x')
@@ -1363,10 +1416,8 @@ Timing:
             if success:
                 messagebox.showinfo("Success", msg)
                 
-                pdf_gen = PDFGenerator()
-                pdf_path = pdf_gen.generate_parking_receipt(bill)
-                
-                messagebox.showinfo("Receipt Generated", f"Receipt saved at:\n{pdf_path}")
+                self.run_document_job('receipt', {'bill': bill}, self._show_receipt_saved,
+                                      priority=PRIORITY_HIGH)
                 dialog.destroy()
                 self.load_my_bookings()
                 self.refresh_dashboard()
@@ -1375,6 +1426,12 @@ Timing:
         
         ttk.Button(frame, text="Pay Now", command=make_payment).pack(pady=20)
     
+    def _show_receipt_saved(self, job):
+        if job and job['status'] == 'done':
+            messagebox.showinfo("Receipt Generated", f"Receipt saved at:\n{job['result']['path']}")
+        else:
+            messagebox.showerror("Error", "Receipt could not be generated")
+    
     def cancel_booking(self):
         """Cancel selected booking"""
         selection = self.active_bookings_tree.selection()
@@ -2050,6 +2107,8 @@ Payment Status: {booking['payment_status']}
                 # Free the slot
                 db.execute_query("UPDATE parking_slots SET status = 'available' WHERE slot_id = ?",
                           (booking['slot_id'],))
+                self.booking_cache.invalidate(booking_id)
+                get_artifact_store().release('booking', booking_id)
                 
                 messagebox.showinfo("Success", "Booking cancelled successfully")
                 self.load_admin_bookings()
@@ -2114,26 +2173,45 @@ Total Revenue: ₹{total_revenue:.2f}
             
             messagebox.showinfo("Success", f"Old data cleaned successfully")
     
-    def generate_revenue_chart(self):
-        """Generate revenue chart"""
-        path = self.analytics_manager.generate_revenue_chart(7)
-        if path:
+    def run_document_job(self, job_type, params, on_done, priority=0):
+        """Queue a rendering job and call on_done(job) from the Tk loop when it finishes"""
+        self.job_queue.start_workers()
+        job_id = self.job_queue.enqueue(job_type, params, priority=priority)
+        
+        def check():
+            job = self.job_queue.poll(job_id)
+            if job is None or job['status'] in ('done', 'failed'):
+                on_done(job)
+            else:
+                self.root.after(200, check)
+        
+        self.root.after(200, check)
+        return job_id
+    
+    def _open_chart(self, job):
+        if job and job['status'] == 'done':
+            path = job['result']['path']
             messagebox.showinfo("Success", f"Chart saved at:\n{path}")
             os.startfile(path)
+        else:
+            error = job['error'].splitlines()[0] if job and job['error'] else "Chart generation failed"
+            messagebox.showerror("Error", error)
+    
+    def generate_revenue_chart(self):
+        """Generate revenue chart"""
+        self.run_document_job('chart', {'chart': 'revenue', 'days': 7}, self._open_chart)
     
     def generate_occupancy_chart(self):
         """Generate occupancy chart"""
-        path = self.analytics_manager.generate_occupancy_chart()
-        if path:
-            messagebox.showinfo("Success", f"Chart saved at:\n{path}")
-            os.startfile(path)
+        self.run_document_job('chart', {'chart': 'occupancy'}, self._open_chart)
     
     def generate_peak_hours_chart(self):
         """Generate peak hours chart"""
-        path = self.analytics_manager.generate_peak_hours_chart()
-        if path:
-            messagebox.showinfo("Success", f"Chart saved at:\n{path}")
-            os.startfile(path)
+        self.run_document_job('chart', {'chart': 'peak_hours'}, self._open_chart)
+    
+    def generate_heatmap_chart(self):
+        """Generate weekday x hour occupancy heatmap"""
+        self.run_document_job('chart', {'chart': 'heatmap', 'metric': 'occupancy'}, self._open_chart)
     
     def export_bookings(self):
         """Export bookings to CSV"""
@@ -1,34 +1,63 @@
 """Analytics and Reports"""
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
 from datetime import datetime, timedelta
 from typing import Dict, List
 import os
 from database.db_manager import get_db_manager
+from models.analytics_rollup import get_analytics_rollup
 
 
 class AnalyticsManager:
     
     def __init__(self):
         self.db = get_db_manager()
+        self.rollup = get_analytics_rollup()
         self.output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'outputs', 'charts')
         os.makedirs(self.output_dir, exist_ok=True)
     
+    def _today(self) -> Dict:
+        """Bring rollups up to date and aggregate today, which is never materialized"""
+        self.rollup.run()
+        return self.rollup.aggregate_day(datetime.now().strftime('%Y-%m-%d'))
+    
     def get_revenue_stats(self, days: int = 30) -> Dict:
         start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-        end_date = datetime.now().strftime('%Y-%m-%d')
-        
-        stats = self.db.get_revenue_stats(start_date, end_date)
-        
-        if stats:
-            stats['total_revenue'] = round(stats.get('total_revenue', 0) or 0, 2)
-            stats['avg_revenue'] = round(stats.get('avg_revenue', 0) or 0, 2)
-            stats['total_hours'] = round(stats.get('total_hours', 0) or 0, 2)
-        
-        return stats
+        today = self._today()['cache']
+        
+        row = self.db.fetch_one("""
+            SELECT COALESCE(SUM(completed_bookings), 0) as total_bookings,
+                   COALESCE(SUM(total_revenue), 0) as total_revenue,
+                   COALESCE(SUM(total_hours), 0) as total_hours
+            FROM analytics_cache
+            WHERE date >= ? AND date < ?
+        """, (start_date, today['date']))
+        
+        total_bookings = row['total_bookings'] + today['completed_bookings']
+        total_revenue = row['total_revenue'] + today['total_revenue']
+        
+        return {
+            'total_bookings': total_bookings,
+            'total_revenue': round(total_revenue, 2),
+            'avg_revenue': round(total_revenue / total_bookings, 2) if total_bookings else 0,
+            'total_hours': round(row['total_hours'] + today['total_hours'], 2)
+        }
+    
+    def get_daily_revenue(self, days: int = 7) -> List[Dict]:
+        """Completed bookings and revenue per day, newest first"""
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        today = self._today()['cache']
+        
+        data = [dict(row) for row in self.db.fetch_all("""
+            SELECT date, completed_bookings as bookings, total_revenue as revenue
+            FROM analytics_cache
+            WHERE date >= ? AND date < ? AND completed_bookings > 0
+            ORDER BY date DESC
+        """, (start_date, today['date']))]
+        
+        if today['completed_bookings']:
+            data.insert(0, {'date': today['date'], 'bookings': today['completed_bookings'],
+                            'revenue': today['total_revenue']})
+        return data
     
     def get_occupancy_trends(self) -> Dict:
 
@@ -50,114 +79,75 @@ class AnalyticsManager:
         
         return trends
     
-    def get_peak_hours(self) -> List[Dict]:
-        data = self.db.get_peak_hours_analysis()
-        return [dict(row) for row in data]
+    def get_heatmap(self, weeks: int = 12, bins_per_hour: int = 1, tz: str = None) -> Dict:
+        """Weekday x hour arrival, departure and occupancy matrices as nested lists"""
+        from models.heatmap import HeatmapAnalytics, get_heatmap_analytics
+        
+        heatmaps = HeatmapAnalytics(tz=tz) if tz else get_heatmap_analytics()
+        result = heatmaps.compute(weeks, bins_per_hour)
+        for metric in ('arrivals', 'departures', 'occupancy'):
+            result[metric] = result[metric].tolist()
+        return result
     
-    def get_vehicle_distribution(self) -> List[Dict]:
-        data = self.db.get_vehicle_type_distribution()
-        return [dict(row) for row in data]
+    def generate_heatmap_chart(self, metric: str = 'occupancy', weeks: int = 12) -> str:
+        from models.heatmap import get_heatmap_analytics
+        return get_heatmap_analytics().generate_chart(metric, weeks)
     
-    def generate_revenue_chart(self, days: int = 7) -> str:
-        data = self.db.get_daily_revenue(days)
-        
-        if not data:
-            return None
-        
-        df = pd.DataFrame([dict(row) for row in data])
-        df['revenue'] = df['revenue'].fillna(0)
-        
-        plt.figure(figsize=(10, 6))
-        plt.plot(df['date'], df['revenue'], marker='o', linewidth=2, markersize=8)
-        plt.title(f'Revenue Trend - Last {days} Days', fontsize=16, fontweight='bold')
-        plt.xlabel('Date', fontsize=12)
-        plt.ylabel('Revenue (₹)', fontsize=12)
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        filename = f'revenue_trend_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath, dpi=300)
-        plt.close()
-        
-        return filepath
+    def get_occupancy_history(self, start: str, end: str = None, resolution: str = '1h',
+                              group_by: List[str] = None) -> List[Dict]:
+        """Historical occupancy per time bin, optionally by floor/section/vehicle_type"""
+        from models.occupancy import get_occupancy_timeline
+        
+        df = get_occupancy_timeline().series(start, end, resolution, group_by or [])
+        df['time'] = df['time'].dt.strftime('%Y-%m-%d %H:%M')
+        return df.to_dict('records')
     
-    def generate_occupancy_chart(self) -> str:
-        stats = self.db.get_slot_statistics()
-        
-        labels = ['Occupied', 'Available', 'Reserved', 'Maintenance']
-        sizes = [
-            stats.get('occupied', 0),
-            stats.get('available', 0),
-            stats.get('reserved', 0),
-            stats.get('maintenance', 0)
-        ]
-        colors = ['#ff6b6b', '#51cf66', '#ffd43b', '#868e96']
-        explode = (0.1, 0, 0, 0)
-        
-        plt.figure(figsize=(10, 8))
-        plt.pie(sizes, explode=explode, labels=labels, colors=colors,
-                autopct='%1.1f%%', shadow=True, startangle=90)
-        plt.title('Current Parking Occupancy', fontsize=16, fontweight='bold')
-        plt.axis('equal')
-        
-        filename = f'occupancy_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath, dpi=300)
-        plt.close()
-        
-        return filepath
-    
-    def generate_peak_hours_chart(self) -> str:
-
-        data = self.get_peak_hours()
-        
-        if not data:
-            return None
-        
-        df = pd.DataFrame(data)
-        df = df.sort_values('hour')
-        
-        plt.figure(figsize=(12, 6))
-        plt.bar(df['hour'], df['bookings'], color='#339af0', alpha=0.8)
-        plt.title('Peak Parking Hours Analysis', fontsize=16, fontweight='bold')
-        plt.xlabel('Hour of Day', fontsize=12)
-        plt.ylabel('Number of Bookings', fontsize=12)
-        plt.xticks(range(0, 24))
-        plt.grid(True, alpha=0.3, axis='y')
-        plt.tight_layout()
+    def get_peak_hours(self) -> List[Dict]:
+        today = self._today()
         
-        filename = f'peak_hours_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath, dpi=300)
-        plt.close()
+        counts = {row['hour']: row['bookings'] for row in self.db.fetch_all("""
+            SELECT hour, SUM(bookings) as bookings FROM analytics_hourly
+            WHERE date < ? GROUP BY hour
+        """, (today['cache']['date'],))}
+        for row in today['hourly']:
+            counts[row['hour']] = counts.get(row['hour'], 0) + row['bookings']
         
-        return filepath
+        data = [{'hour': hour, 'bookings': bookings} for hour, bookings in counts.items() if bookings]
+        return sorted(data, key=lambda r: r['bookings'], reverse=True)
     
-    def generate_vehicle_type_chart(self) -> str:
-
-        data = self.get_vehicle_distribution()
-        
-        if not data:
-            return None
-        
-        df = pd.DataFrame(data)
-        
-        plt.figure(figsize=(10, 6))
-        plt.bar(df['vehicle_type'], df['count'], color=['#845ef7', '#20c997', '#ff6b6b'])
-        plt.title('Vehicle Type Distribution', fontsize=16, fontweight='bold')
-        plt.xlabel('Vehicle Type', fontsize=12)
-        plt.ylabel('Number of Bookings', fontsize=12)
-        plt.grid(True, alpha=0.3, axis='y')
-        plt.tight_layout()
+    def get_vehicle_distribution(self) -> List[Dict]:
+        today = self._today()
         
-        filename = f'vehicle_types_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png'
-        filepath = os.path.join(self.output_dir, filename)
-        plt.savefig(filepath, dpi=300)
-        plt.close()
+        counts = {row['vehicle_type']: row['count'] for row in self.db.fetch_all("""
+            SELECT vehicle_type, SUM(bookings) as count FROM analytics_vehicle_daily
+            WHERE date < ? GROUP BY vehicle_type
+        """, (today['cache']['date'],))}
+        for row in today['vehicles']:
+            counts[row['vehicle_type']] = counts.get(row['vehicle_type'], 0) + row['bookings']
         
-        return filepath
+        return [{'vehicle_type': vehicle_type, 'count': count}
+                for vehicle_type, count in sorted(counts.items()) if count]
+    
+    def generate_revenue_chart(self, days: int = 7, quality: str = 'print') -> str:
+        from models.chart_service import get_chart_service
+        return get_chart_service().render('revenue', {'days': days}, quality)
+    
+    def generate_occupancy_chart(self, quality: str = 'print') -> str:
+        from models.chart_service import get_chart_service
+        return get_chart_service().render('occupancy', quality=quality)
+    
+    def generate_peak_hours_chart(self, quality: str = 'print') -> str:
+        from models.chart_service import get_chart_service
+        return get_chart_service().render('peak_hours', quality=quality)
+    
+    def generate_vehicle_type_chart(self, quality: str = 'print') -> str:
+        from models.chart_service import get_chart_service
+        return get_chart_service().render('vehicle_type', quality=quality)
+    
+    def generate_dashboard_charts(self, quality: str = 'preview') -> Dict:
+        """Render all dashboard charts at once; unchanged charts come from cache"""
+        from models.chart_service import get_chart_service
+        return get_chart_service().render_dashboard(quality)
     
     def generate_dashboard_report(self) -> Dict:
 
@@ -171,38 +161,43 @@ class AnalyticsManager:
         
         return dashboard
     
+    def get_history_summary(self, period: str = 'month', start_date: str = None,
+                            end_date: str = None) -> Dict:
+        """Multi-year revenue by period, stay durations and user cohorts, streamed in chunks"""
+        from models.columnar import history_summary
+        return history_summary(period, start_date, end_date, db_path=self.db.db_path)
+    
+    def get_demand_forecast(self, hours: int = 24) -> List[Dict]:
+        """Hourly occupancy and arrival forecasts per floor and vehicle type"""
+        from models.forecast import get_demand_forecaster
+        return get_demand_forecaster().forecast(hours)
+    
+    def get_cohort_report(self, period: str = 'month', max_offset: int = 12) -> Dict:
+        """Signup cohorts with retention, repeat-visit rate and lifetime value"""
+        from models.cohorts import get_cohort_analytics
+        return get_cohort_analytics().compute(period, max_offset)
+    
+    def export_cohorts_to_csv(self, period: str = 'month') -> str:
+        from models.cohorts import get_cohort_analytics
+        return get_cohort_analytics().export_csv(period)
+    
+    def get_anomalies(self, open_only: bool = True, rule: str = None) -> List[Dict]:
+        """Revenue leakage and data-quality findings, newest first"""
+        from models.anomalies import get_anomaly_scanner
+        return get_anomaly_scanner().get_anomalies(open_only, rule)
+    
+    def get_anomaly_summary(self) -> Dict:
+        from models.anomalies import get_anomaly_scanner
+        return get_anomaly_scanner().get_summary()
+    
     def export_bookings_to_csv(self, start_date: str = None, end_date: str = None) -> str:
         """Export booking data to CSV"""
-        query = """
-            SELECT 
-                b.ticket_number, b.booking_date, b.entry_time, b.exit_time,
-                b.duration_hours, b.total_amount, b.payment_status, b.booking_status,
-                u.name as user_name, u.email, u.phone,
-                v.vehicle_number, v.vehicle_type,
-                s.slot_number, s.floor, s.section
-            FROM bookings b
-            JOIN users u ON b.user_id = u.user_id
-            JOIN vehicles v ON b.vehicle_id = v.vehicle_id
-            JOIN parking_slots s ON b.slot_id = s.slot_id
-        """
-        
-        if start_date and end_date:
-            query += f" WHERE DATE(b.booking_date) BETWEEN '{start_date}' AND '{end_date}'"
-        
-        query += " ORDER BY b.booking_date DESC"
-        
-        data = self.db.fetch_all(query)
-        
-        if not data:
-            return None
-        
-        df = pd.DataFrame([dict(row) for row in data])
-        
-        output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'outputs', 'reports')
-        os.makedirs(output_dir, exist_ok=True)
+        from models.export import BookingExporter
         
-        filename = f'bookings_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        filepath = os.path.join(output_dir, filename)
-        df.to_csv(filepath, index=False)
+        exporter = BookingExporter(self.db.db_path)
+        try:
+            result = exporter.export(fmt='csv', start_date=start_date, end_date=end_date)
+        finally:
+            exporter.close()
         
-        return filepath
+        return result['path'] if result else None
@@ -0,0 +1,413 @@
+"""Incremental Daily and Hourly Analytics Rollups"""
+
+import argparse
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Set, Tuple
+
+from database.db_manager import get_db_manager
+
+
+ROLLUP_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS analytics_hourly (
+        date DATE NOT NULL,
+        hour INTEGER NOT NULL,
+        bookings INTEGER DEFAULT 0,
+        completed_bookings INTEGER DEFAULT 0,
+        revenue REAL DEFAULT 0.0,
+        occupied_slot_hours REAL DEFAULT 0.0,
+        PRIMARY KEY (date, hour)
+    );
+    CREATE TABLE IF NOT EXISTS analytics_vehicle_daily (
+        date DATE NOT NULL,
+        vehicle_type TEXT NOT NULL,
+        bookings INTEGER DEFAULT 0,
+        revenue REAL DEFAULT 0.0,
+        PRIMARY KEY (date, vehicle_type)
+    );
+    CREATE TABLE IF NOT EXISTS analytics_dirty_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        day_from DATE NOT NULL,
+        day_to DATE NOT NULL,
+        logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS analytics_watermarks (
+        name TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_analytics_cache_date ON analytics_cache(date);
+    CREATE INDEX IF NOT EXISTS idx_bookings_entry_time ON bookings(entry_time);
+    CREATE INDEX IF NOT EXISTS idx_bookings_exit_time ON bookings(exit_time);
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_insert AFTER INSERT ON bookings
+    WHEN NEW.entry_time IS NOT NULL
+    BEGIN
+        INSERT INTO analytics_dirty_log (day_from, day_to)
+        VALUES (DATE(NEW.entry_time), COALESCE(DATE(NEW.exit_time), DATE(NEW.checkout_time), DATE('now', 'localtime')));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_update
+    AFTER UPDATE OF entry_time, exit_time, checkin_time, checkout_time, booking_status,
+                total_amount, duration_hours, vehicle_id, slot_id, base_amount,
+                payment_status, checkin_deadline, forfeited
+    ON bookings
+    BEGIN
+        INSERT INTO analytics_dirty_log (day_from, day_to)
+        SELECT DATE(OLD.entry_time), COALESCE(DATE(OLD.exit_time), DATE(OLD.checkout_time), DATE('now', 'localtime'))
+        WHERE OLD.entry_time IS NOT NULL;
+        INSERT INTO analytics_dirty_log (day_from, day_to)
+        SELECT DATE(NEW.entry_time), COALESCE(DATE(NEW.exit_time), DATE(NEW.checkout_time), DATE('now', 'localtime'))
+        WHERE NEW.entry_time IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_rollup_delete AFTER DELETE ON bookings
+    WHEN OLD.entry_time IS NOT NULL
+    BEGIN
+        INSERT INTO analytics_dirty_log (day_from, day_to)
+        VALUES (DATE(OLD.entry_time), COALESCE(DATE(OLD.exit_time), DATE(OLD.checkout_time), DATE('now', 'localtime')));
+    END;
+"""
+
+# Columns added to the original analytics_cache definition
+CACHE_EXTRA_COLUMNS = {
+    'completed_bookings': 'INTEGER DEFAULT 0',
+    'total_hours': 'REAL DEFAULT 0.0',
+}
+
+OCCUPYING_STATUSES = ('active', 'completed')
+
+
+def _parse_timestamp(value, utc: bool = False) -> Optional[datetime]:
+    """
+    A stored timestamp as naive local time
+
+    Values with an offset (web bookings) are converted; naive values are
+    taken as UTC when `utc` is set (entry_time), else as local time.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None and utc:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+class AnalyticsRollup:
+    """
+    Materialize per-day, per-hour and per-vehicle-type booking aggregates
+
+    Triggers on `bookings` append the affected date range to
+    analytics_dirty_log; run() recomputes only those days (plus any day
+    that has closed since the last run) and advances its watermark.
+    Today is never materialized, it is still changing; use aggregate_day()
+    for it instead.
+    """
+
+    def __init__(self):
+        self.db = get_db_manager()
+        self.last_run = {'days': 0, 'seq': 0, 'ms': 0.0}
+        self.ensure_schema()
+
+    def ensure_schema(self):
+        columns = {row['name'] for row in self.db.fetch_all("PRAGMA table_info(analytics_cache)")}
+        for column, definition in CACHE_EXTRA_COLUMNS.items():
+            if column not in columns:
+                self.db.execute_query(f"ALTER TABLE analytics_cache ADD COLUMN {column} {definition}")
+
+        # Older builds could have written duplicate dates; keep the newest
+        self.db.execute_query("""
+            DELETE FROM analytics_cache WHERE cache_id NOT IN (
+                SELECT MAX(cache_id) FROM analytics_cache GROUP BY date
+            )
+        """)
+        # Older triggers ignored checkout_time, which desk and gate checkouts set
+        # instead of exit_time, and the fields the booking lookup cache serves;
+        # replace them so those updates mark days dirty
+        trigger = self.db.fetch_one("""
+            SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_bookings_rollup_update'
+        """)
+        if trigger and 'checkin_deadline' not in trigger['sql']:
+            self.db.connection.executescript("""
+                DROP TRIGGER IF EXISTS trg_bookings_rollup_insert;
+                DROP TRIGGER IF EXISTS trg_bookings_rollup_update;
+                DROP TRIGGER IF EXISTS trg_bookings_rollup_delete;
+            """)
+        self.db.connection.executescript(ROLLUP_SCHEMA_SQL)
+
+    # -- watermarks --------------------------------------------------------
+
+    def _get_watermark(self, name: str) -> Optional[str]:
+        row = self.db.fetch_one("SELECT value FROM analytics_watermarks WHERE name = ?", (name,))
+        return row['value'] if row else None
+
+    @staticmethod
+    def _set_watermark(cursor, name: str, value):
+        cursor.execute("""
+            INSERT INTO analytics_watermarks (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = excluded.value
+        """, (name, str(value)))
+
+    def current_seq(self) -> int:
+        """Latest dirty-log sequence number; changes whenever any booking does"""
+        row = self.db.fetch_one("SELECT MAX(seq) AS seq FROM analytics_dirty_log")
+        return (row['seq'] or 0) if row else 0
+
+    # -- aggregation -------------------------------------------------------
+
+    def aggregate_day(self, day: str, total_slots: int = None) -> Dict:
+        """
+        Compute one day's aggregates from raw bookings without storing them
+
+        Returns:
+            dict: {'cache': {...}, 'hourly': [...], 'vehicles': [...]}
+        """
+        day_start = datetime.strptime(day, '%Y-%m-%d')
+        day_end = day_start + timedelta(days=1)
+        start, end = day_start.strftime('%Y-%m-%d'), day_end.strftime('%Y-%m-%d')
+        # entry_time is stored in UTC, so its local day can be either side of
+        # its raw date; the raw range is widened to keep the index usable
+        raw_start = (day_start - timedelta(days=1)).strftime('%Y-%m-%d')
+        raw_end = (day_end + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        if total_slots is None:
+            total_slots = self.db.fetch_one("SELECT COUNT(*) AS total FROM parking_slots")['total']
+
+        hourly = {hour: {'bookings': 0, 'completed_bookings': 0, 'revenue': 0.0,
+                         'occupied_slot_hours': 0.0} for hour in range(24)}
+        vehicles = defaultdict(lambda: {'bookings': 0, 'revenue': 0.0})
+
+        for row in self.db.fetch_all("""
+            SELECT CAST(strftime('%H', b.entry_time, 'localtime') AS INTEGER) AS hour, v.vehicle_type,
+                   COUNT(*) AS bookings
+            FROM bookings b JOIN vehicles v ON b.vehicle_id = v.vehicle_id
+            WHERE b.entry_time >= ? AND b.entry_time < ?
+            AND DATE(b.entry_time, 'localtime') = ?
+            GROUP BY hour, v.vehicle_type
+        """, (raw_start, raw_end, day)):
+            hourly[row['hour']]['bookings'] += row['bookings']
+            vehicles[row['vehicle_type']]['bookings'] += row['bookings']
+
+        total_hours = 0.0
+        for row in self.db.fetch_all("""
+            SELECT CAST(strftime('%H', b.exit_time) AS INTEGER) AS hour, v.vehicle_type,
+                   COUNT(*) AS completed, SUM(b.total_amount) AS revenue,
+                   SUM(b.duration_hours) AS hours
+            FROM bookings b JOIN vehicles v ON b.vehicle_id = v.vehicle_id
+            WHERE b.booking_status = 'completed' AND b.exit_time >= ? AND b.exit_time < ?
+            GROUP BY hour, v.vehicle_type
+        """, (start, end)):
+            hourly[row['hour']]['completed_bookings'] += row['completed']
+            hourly[row['hour']]['revenue'] += row['revenue'] or 0.0
+            vehicles[row['vehicle_type']]['revenue'] += row['revenue'] or 0.0
+            total_hours += row['hours'] or 0.0
+
+        # Slot-hours occupied in each hour, clipping every stay to this day.
+        # Desk and gate checkouts only set checkout_time.
+        now = datetime.now()
+        for row in self.db.fetch_all(f"""
+            SELECT entry_time, COALESCE(exit_time, checkout_time) AS exit_time FROM bookings
+            WHERE booking_status IN ({','.join('?' * len(OCCUPYING_STATUSES))})
+            AND entry_time < ?
+            AND (COALESCE(exit_time, checkout_time) IS NULL OR COALESCE(exit_time, checkout_time) >= ?)
+        """, OCCUPYING_STATUSES + (raw_end, start)):
+            entry = _parse_timestamp(row['entry_time'], utc=True)
+            exit_ = _parse_timestamp(row['exit_time']) or now
+            if entry is None:
+                continue
+            entry, exit_ = max(entry, day_start), min(exit_, day_end)
+            while entry < exit_:
+                hour_end = entry.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+                span_end = min(hour_end, exit_)
+                hourly[entry.hour]['occupied_slot_hours'] += (span_end - entry).total_seconds() / 3600
+                entry = span_end
+
+        hourly_rows = [dict(date=day, hour=hour, **values) for hour, values in hourly.items()]
+        busiest = max(hourly_rows, key=lambda r: (r['bookings'], -r['hour']))
+        slot_hours = sum(r['occupied_slot_hours'] for r in hourly_rows)
+
+        cache = {
+            'date': day,
+            'total_bookings': sum(r['bookings'] for r in hourly_rows),
+            'completed_bookings': sum(r['completed_bookings'] for r in hourly_rows),
+            'total_revenue': round(sum(r['revenue'] for r in hourly_rows), 2),
+            'total_hours': round(total_hours, 2),
+            'occupancy_rate': round(slot_hours / (total_slots * 24) * 100, 2) if total_slots else 0.0,
+            'peak_hour': f"{busiest['hour']:02d}:00" if busiest['bookings'] else None,
+        }
+        vehicle_rows = [dict(date=day, vehicle_type=vehicle_type, **values)
+                        for vehicle_type, values in sorted(vehicles.items())]
+
+        return {'cache': cache, 'hourly': hourly_rows, 'vehicles': vehicle_rows}
+
+    # -- incremental job ---------------------------------------------------
+
+    def pending_days(self) -> Tuple[Set[str], int]:
+        """Days to recompute and the dirty-log sequence they cover"""
+        yesterday = date.today() - timedelta(days=1)
+        watermark = int(self._get_watermark('dirty_seq') or 0)
+        days: Set[str] = set()
+
+        rows = self.db.fetch_all("""
+            SELECT seq, day_from, day_to FROM analytics_dirty_log WHERE seq > ? ORDER BY seq
+        """, (watermark,))
+        max_seq = watermark
+        for row in rows:
+            max_seq = row['seq']
+            # day_from is the raw UTC entry date; west of UTC the local day is earlier
+            first = date.fromisoformat(row['day_from']) - timedelta(days=1)
+            last = min(date.fromisoformat(row['day_to']), yesterday)
+            while first <= last:
+                days.add(first.isoformat())
+                first += timedelta(days=1)
+
+        # Days that ended since the last run, e.g. stays still open at midnight.
+        # On the very first run that is every day with bookings (the backfill).
+        closed_through = self._get_watermark('closed_through')
+        if closed_through:
+            day = date.fromisoformat(closed_through) + timedelta(days=1)
+        else:
+            first = self.db.fetch_one("SELECT DATE(MIN(entry_time), 'localtime') AS first FROM bookings")
+            day = date.fromisoformat(first['first']) if first and first['first'] else yesterday
+        while day <= yesterday:
+            days.add(day.isoformat())
+            day += timedelta(days=1)
+
+        return days, max_seq
+
+    def run(self, max_days: int = None) -> Dict:
+        """
+        Recompute every dirty day and advance the watermark
+
+        Args:
+            max_days: Process at most this many days (oldest first); the
+                      watermark only advances once the backlog is cleared
+
+        Returns:
+            dict: {'days': processed day count, 'seq': watermark, 'ms': elapsed}
+        """
+        started = time.perf_counter()
+        days, max_seq = self.pending_days()
+        ordered = sorted(days)
+        batch = ordered[:max_days] if max_days else ordered
+        complete = len(batch) == len(ordered)
+
+        total_slots = self.db.fetch_one("SELECT COUNT(*) AS total FROM parking_slots")['total']
+        results = [self.aggregate_day(day, total_slots) for day in batch]
+
+        with self.db.transaction() as cursor:
+            for result in results:
+                self._store_day(cursor, result)
+            if complete:
+                self._set_watermark(cursor, 'dirty_seq', max_seq)
+                self._set_watermark(cursor, 'closed_through',
+                                    (date.today() - timedelta(days=1)).isoformat())
+                # Keep the newest entry so current_seq() never goes backwards, and
+                # anything other consumers (watermarks named dirty_seq:<name>) still need
+                cursor.execute("""
+                    DELETE FROM analytics_dirty_log WHERE seq < (
+                        SELECT MIN(CAST(value AS INTEGER)) FROM analytics_watermarks
+                        WHERE name = 'dirty_seq' OR name LIKE 'dirty_seq:%'
+                    )
+                """)
+
+        self.last_run = {'days': len(batch), 'seq': max_seq if complete else None,
+                         'ms': round((time.perf_counter() - started) * 1000, 2)}
+        return self.last_run
+
+    @staticmethod
+    def _store_day(cursor, result: Dict):
+        cache = result['cache']
+        cursor.execute("""
+            INSERT INTO analytics_cache (date, total_bookings, completed_bookings, total_revenue,
+                                         total_hours, occupancy_rate, peak_hour, generated_at)
+            VALUES (:date, :total_bookings, :completed_bookings, :total_revenue,
+                    :total_hours, :occupancy_rate, :peak_hour, CURRENT_TIMESTAMP)
+            ON CONFLICT(date) DO UPDATE SET
+                total_bookings = excluded.total_bookings,
+                completed_bookings = excluded.completed_bookings,
+                total_revenue = excluded.total_revenue,
+                total_hours = excluded.total_hours,
+                occupancy_rate = excluded.occupancy_rate,
+                peak_hour = excluded.peak_hour,
+                generated_at = excluded.generated_at
+        """, cache)
+
+        cursor.execute("DELETE FROM analytics_hourly WHERE date = ?", (cache['date'],))
+        cursor.executemany("""
+            INSERT INTO analytics_hourly (date, hour, bookings, completed_bookings, revenue,
+                                          occupied_slot_hours)
+            VALUES (:date, :hour, :bookings, :completed_bookings, :revenue, :occupied_slot_hours)
+        """, [row for row in result['hourly']
+              if row['bookings'] or row['completed_bookings'] or row['occupied_slot_hours']])
+
+        cursor.execute("DELETE FROM analytics_vehicle_daily WHERE date = ?", (cache['date'],))
+        cursor.executemany("""
+            INSERT INTO analytics_vehicle_daily (date, vehicle_type, bookings, revenue)
+            VALUES (:date, :vehicle_type, :bookings, :revenue)
+        """, result['vehicles'])
+
+    def check(self) -> Dict:
+        """
+        Materialized days and hours with more occupied slot-hours than slots exist
+
+        Any hit means a stay was never closed off, e.g. a checkout the
+        occupancy query did not recognise.
+
+        Returns:
+            dict: {'days': [{date, occupancy_rate}], 'hours': [{date, hour, occupied_slot_hours}]}
+        """
+        total_slots = self.db.fetch_one("SELECT COUNT(*) AS total FROM parking_slots")['total']
+        days = self.db.fetch_all("""
+            SELECT date, occupancy_rate FROM analytics_cache WHERE occupancy_rate > 100 ORDER BY date
+        """)
+        hours = self.db.fetch_all("""
+            SELECT date, hour, occupied_slot_hours FROM analytics_hourly
+            WHERE occupied_slot_hours > ? + 0.01 ORDER BY date, hour
+        """, (total_slots,))
+        return {'days': [dict(row) for row in days], 'hours': [dict(row) for row in hours]}
+
+    def rebuild(self) -> Dict:
+        """Mark every day with bookings dirty and recompute from scratch"""
+        first = self.db.fetch_one("SELECT DATE(MIN(entry_time)) AS first FROM bookings")
+        if first and first['first']:
+            self.db.execute_query(
+                "INSERT INTO analytics_dirty_log (day_from, day_to) VALUES (?, ?)",
+                (first['first'], date.today().isoformat())
+            )
+        return self.run()
+
+
+_rollup_instance: Optional[AnalyticsRollup] = None
+
+def get_analytics_rollup() -> AnalyticsRollup:
+    global _rollup_instance
+    if _rollup_instance is None:
+        _rollup_instance = AnalyticsRollup()
+    return _rollup_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh analytics rollups")
+    parser.add_argument('--rebuild', action='store_true', help='Recompute every day from raw bookings')
+    parser.add_argument('--max-days', type=int)
+    parser.add_argument('--check', action='store_true', help='Fail if any day or hour is over 100%% occupied')
+    args = parser.parse_args()
+
+    rollup = get_analytics_rollup()
+    summary = rollup.rebuild() if args.rebuild else rollup.run(args.max_days)
+    print(f"✓ Rolled up {summary['days']} days in {summary['ms']}ms (watermark {summary['seq']})")
+    if args.check:
+        problems = rollup.check()
+        for row in problems['days']:
+            print(f"✗ {row['date']}: occupancy {row['occupancy_rate']}%")
+        for row in problems['hours']:
+            print(f"✗ {row['date']} {row['hour']:02d}:00: {row['occupied_slot_hours']:.1f} slot-hours")
+        if problems['days'] or problems['hours']:
+            raise SystemExit(1)
+        print("✓ Occupancy within capacity")
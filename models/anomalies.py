@@ -0,0 +1,478 @@
+"""Revenue Leakage and Anomaly Scanning over Bookings, Payments and Slots"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from database.db_manager import get_db_manager
+from models.columnar import NULL_EPOCH, ColumnarReader
+
+
+ANOMALY_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS booking_anomalies (
+        anomaly_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        rule TEXT NOT NULL,
+        entity TEXT NOT NULL,
+        entity_id TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        amount REAL,
+        details TEXT,
+        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        resolved_at TIMESTAMP,
+        UNIQUE (rule, entity_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_booking_anomalies_open ON booking_anomalies(resolved_at, rule);
+    CREATE INDEX IF NOT EXISTS idx_booking_anomalies_entity ON booking_anomalies(entity, entity_id);
+    CREATE INDEX IF NOT EXISTS idx_payments_booking ON payments(booking_id);
+"""
+
+# rule -> (entity, severity, description)
+RULES = {
+    'zero_amount_completion': ('booking', 'high', 'Completed with no charge and no payment'),
+    'unpaid_completion': ('booking', 'high', 'Completed with an amount due but no payment'),
+    'payment_mismatch': ('booking', 'medium', 'Payments differ from the booking amount'),
+    'refund_exceeds_charge': ('booking', 'high', 'Refunds exceed what was paid'),
+    'forfeit_refunded': ('booking', 'medium', 'Forfeited booking was refunded'),
+    'long_duration': ('booking', 'low', 'Stay longer than the duration threshold'),
+    'ghost_occupancy': ('slot', 'medium', 'Slot marked occupied with no active booking'),
+    'stale_reservation': ('slot', 'low', 'Slot marked reserved with no pending booking'),
+    'slot_status_mismatch': ('slot', 'medium', 'Active booking on a slot not marked occupied'),
+    'double_booking': ('slot', 'high', 'More than one active booking on a slot'),
+    'revenue_outlier': ('day', 'medium', 'Daily revenue far from the trailing median'),
+}
+
+SCAN_COLUMNS = ('booking_id', 'booking_status', 'entry', 'exit', 'checkin', 'checkout',
+                'duration_hours', 'total_amount', 'paid', 'refunded', 'forfeited')
+
+WATERMARK_SEQ = 'dirty_seq:anomalies'
+WATERMARK_PAYMENT = 'anomalies:payment_id'
+
+
+def _day_ranges(days: Set[str]) -> List[Tuple[str, str]]:
+    """Collapse a set of ISO days into sorted inclusive (first, last) ranges"""
+    ranges: List[List[date]] = []
+    for day in sorted(date.fromisoformat(d) for d in days):
+        if ranges and day - ranges[-1][1] <= timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [(first.isoformat(), last.isoformat()) for first, last in ranges]
+
+
+class AnomalyScanner:
+    """
+    Flag revenue leakage and inconsistent state in vectorised passes
+
+    Booking rules run over NumPy column chunks of only the days touched
+    since the last scan (the rollup dirty log, new payments and days with
+    stays still open); slot rules run over one grouped query; daily revenue
+    is checked against a robust trailing baseline from the rollups. Findings
+    are upserted into booking_anomalies and resolved once a rescan no
+    longer reproduces them. Uses its own connection so it can run on a
+    background thread.
+    """
+
+    def __init__(self, db_path: str = None, max_hours: float = 24.0, amount_tolerance: float = 1.0,
+                 outlier_window: int = 28, outlier_z: float = 3.5, chunk_size: int = 20000):
+        self.db_path = db_path or get_db_manager().db_path
+        self.max_hours = max_hours
+        self.amount_tolerance = amount_tolerance
+        self.outlier_window = outlier_window
+        self.outlier_z = outlier_z
+        self.chunk_size = chunk_size
+        self.last_scan: Dict = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._scanner: Optional[threading.Thread] = None
+
+        # The rollup's triggers maintain the dirty log this scanner follows
+        from models.analytics_rollup import get_analytics_rollup
+        get_analytics_rollup()
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(ANOMALY_SCHEMA_SQL)
+
+    def close(self):
+        self.stop_scanner()
+        self.conn.close()
+
+    # -- watermarks --------------------------------------------------------
+
+    def _get_watermark(self, name: str) -> Optional[int]:
+        row = self.conn.execute("SELECT value FROM analytics_watermarks WHERE name = ?", (name,)).fetchone()
+        return int(row['value']) if row else None
+
+    @staticmethod
+    def _set_watermark(cursor, name: str, value: int):
+        cursor.execute("""
+            INSERT INTO analytics_watermarks (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = excluded.value
+        """, (name, str(value)))
+
+    def pending_days(self, full: bool = False) -> Tuple[Optional[Set[str]], int, int]:
+        """
+        Entry days to rescan, plus the dirty-log and payment ids they cover
+
+        Returns None for the days when everything must be scanned (first run
+        or an explicit full scan).
+        """
+        seq_mark = self._get_watermark(WATERMARK_SEQ)
+        payment_mark = self._get_watermark(WATERMARK_PAYMENT) or 0
+        max_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM analytics_dirty_log").fetchone()[0]
+        max_payment = self.conn.execute("SELECT COALESCE(MAX(payment_id), 0) FROM payments").fetchone()[0]
+        if full or seq_mark is None:
+            return None, max_seq, max_payment
+
+        today = date.today()
+        days: Set[str] = set()
+        for row in self.conn.execute("""
+            SELECT day_from, day_to FROM analytics_dirty_log WHERE seq > ? AND seq <= ?
+        """, (seq_mark, max_seq)):
+            first = date.fromisoformat(row['day_from'])
+            last = min(date.fromisoformat(row['day_to']), today)
+            while first <= last:
+                days.add(first.isoformat())
+                first += timedelta(days=1)
+
+        # New payments, and open stays whose duration keeps growing
+        days.update(row[0] for row in self.conn.execute("""
+            SELECT DISTINCT DATE(b.entry_time) FROM payments p JOIN bookings b ON p.booking_id = b.booking_id
+            WHERE p.payment_id > ? AND p.payment_id <= ? AND b.entry_time IS NOT NULL
+        """, (payment_mark, max_payment)))
+        days.update(row[0] for row in self.conn.execute("""
+            SELECT DISTINCT DATE(entry_time) FROM bookings
+            WHERE booking_status = 'active' AND entry_time IS NOT NULL
+        """))
+        return days, max_seq, max_payment
+
+    # -- rules -------------------------------------------------------------
+
+    def _booking_findings(self, chunk: Dict[str, np.ndarray], status_codes: Dict[str, int],
+                          now: int) -> List[Tuple]:
+        status = chunk['booking_status']
+        completed = status == status_codes['completed']
+        active = status == status_codes['active']
+        total = np.nan_to_num(chunk['total_amount'])
+        paid, refunded = chunk['paid'], chunk['refunded']
+        tolerance = self.amount_tolerance
+
+        # Open stays run from check-in/entry to now. duration_hours holds the
+        # booked length for web bookings and desk/gate checkouts never update
+        # it, so completed stays take the larger of it and the derived stay.
+        start = np.where(chunk['checkin'] != NULL_EPOCH, chunk['checkin'], chunk['entry'])
+        end = np.where(chunk['exit'] != NULL_EPOCH, chunk['exit'], chunk['checkout'])
+        end = np.where(active, now, end)
+        derived = np.where((start != NULL_EPOCH) & (end != NULL_EPOCH), (end - start) / 3600, np.nan)
+        hours = np.where(active, derived, np.fmax(chunk['duration_hours'], derived))
+
+        masks = {
+            'zero_amount_completion': completed & (total <= 0) & (paid <= 0),
+            'unpaid_completion': completed & (total > tolerance) & (paid <= 0),
+            'payment_mismatch': completed & (total > 0) & (paid > 0) & (np.abs(paid - total) > tolerance),
+            'refund_exceeds_charge': refunded > paid + 0.005,
+            'forfeit_refunded': (chunk['forfeited'] == 1) & (refunded > 0),
+            'long_duration': (completed | active) & (np.nan_to_num(hours) > self.max_hours),
+        }
+        amounts = {
+            'zero_amount_completion': np.zeros_like(total),
+            'unpaid_completion': total,
+            'payment_mismatch': total - paid,
+            'refund_exceeds_charge': refunded - paid,
+            'forfeit_refunded': refunded,
+            'long_duration': np.full_like(total, np.nan),
+        }
+
+        findings = []
+        ids = chunk['booking_id']
+        for rule, mask in masks.items():
+            for i in np.flatnonzero(mask).tolist():
+                amount = amounts[rule][i]
+                details = {'total_amount': round(float(total[i]), 2), 'paid': round(float(paid[i]), 2),
+                           'refunded': round(float(refunded[i]), 2)}
+                if rule == 'long_duration':
+                    details = {'hours': round(float(hours[i]), 2), 'open': bool(active[i])}
+                findings.append((rule, str(ids[i]), None if np.isnan(amount) else round(float(amount), 2),
+                                 json.dumps(details)))
+        return findings
+
+    def _slot_findings(self) -> List[Tuple]:
+        # Open bookings come off idx_bookings_status; joining from slots would
+        # walk every historical booking of each slot
+        open_counts = {row['slot_id']: (row['active'], row['pending']) for row in self.conn.execute("""
+            SELECT slot_id, SUM(booking_status = 'active') AS active,
+                   SUM(booking_status = 'pending') AS pending
+            FROM bookings WHERE booking_status IN ('active', 'pending')
+            GROUP BY slot_id
+        """)}
+        rows = self.conn.execute("SELECT slot_id, slot_number, status FROM parking_slots").fetchall()
+        if not rows:
+            return []
+
+        slot_ids, numbers, statuses = zip(*rows)
+        statuses = np.array(statuses, dtype=object)
+        active = np.array([open_counts.get(slot_id, (0, 0))[0] for slot_id in slot_ids])
+        pending = np.array([open_counts.get(slot_id, (0, 0))[1] for slot_id in slot_ids])
+
+        masks = {
+            'ghost_occupancy': (statuses == 'occupied') & (active == 0),
+            'stale_reservation': (statuses == 'reserved') & (pending == 0) & (active == 0),
+            'slot_status_mismatch': (statuses != 'occupied') & (active > 0),
+            'double_booking': active > 1,
+        }
+        findings = []
+        for rule, mask in masks.items():
+            for i in np.flatnonzero(mask).tolist():
+                findings.append((rule, str(slot_ids[i]), None, json.dumps({
+                    'slot_number': numbers[i], 'status': statuses[i],
+                    'active_bookings': int(active[i]), 'pending_bookings': int(pending[i]),
+                })))
+        return findings
+
+    def _revenue_findings(self, days: Optional[Set[str]]) -> Tuple[List[Tuple], Set[str]]:
+        """Robust z-score of each checked day's revenue against the trailing window"""
+        closed = self.conn.execute(
+            "SELECT value FROM analytics_watermarks WHERE name = 'closed_through'").fetchone()
+        if not closed:
+            return [], set()
+        last = date.fromisoformat(closed['value'])
+        if days is None:
+            first_row = self.conn.execute("SELECT MIN(date) FROM analytics_cache").fetchone()[0]
+            first = date.fromisoformat(first_row) if first_row else last
+        else:
+            checked = [date.fromisoformat(d) for d in days if d <= last.isoformat()]
+            if not checked:
+                return [], set()
+            first = min(checked)
+
+        window = self.outlier_window
+        origin = first - timedelta(days=window)
+        span = (last - origin).days + 1
+        revenue = np.zeros(span)
+        for row in self.conn.execute("""
+            SELECT date, total_revenue FROM analytics_cache WHERE date >= ? AND date <= ?
+        """, (origin.isoformat(), last.isoformat())):
+            revenue[(date.fromisoformat(row['date']) - origin).days] = row['total_revenue'] or 0.0
+
+        # Row i of the window view covers the `window` days before day i + window
+        trailing = np.lib.stride_tricks.sliding_window_view(revenue, window)[:-1]
+        current = revenue[window:]
+        median = np.median(trailing, axis=1)
+        mad = np.median(np.abs(trailing - median[:, None]), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(mad > 0, 0.6745 * (current - median) / mad, 0.0)
+
+        labels = [(origin + timedelta(days=window + i)).isoformat() for i in range(len(current))]
+        wanted = np.array([days is None or label in days for label in labels], dtype=bool)
+        findings = []
+        for i in np.flatnonzero(wanted & (np.abs(z) > self.outlier_z)).tolist():
+            findings.append(('revenue_outlier', labels[i], round(float(current[i] - median[i]), 2),
+                             json.dumps({'revenue': round(float(current[i]), 2),
+                                         'median': round(float(median[i]), 2),
+                                         'z': round(float(z[i]), 2)})))
+        return findings, {label for label, keep in zip(labels, wanted) if keep}
+
+    # -- scanning ----------------------------------------------------------
+
+    def scan(self, full: bool = False) -> Dict:
+        """
+        Run every rule over what changed since the last scan
+
+        Args:
+            full: Rescan all bookings and days (also catches refunds edited
+                  on existing payments, which leave no dirty-log entry)
+
+        Returns:
+            dict: days and rows scanned, findings per rule, resolved count, ms
+        """
+        with self._lock:
+            started = time.perf_counter()
+            days, max_seq, max_payment = self.pending_days(full)
+            now = int((datetime.now() - datetime(1970, 1, 1)).total_seconds())
+
+            reader = ColumnarReader(self.db_path, self.chunk_size)
+            findings: List[Tuple] = []
+            scanned_ids: List[np.ndarray] = []
+            try:
+                ranges = [(None, None)] if days is None else _day_ranges(days)
+                for first, last in ranges:
+                    for chunk in reader.iter_chunks(SCAN_COLUMNS, first, last):
+                        vocab = reader.vocab['booking_status']
+                        codes = {name: vocab.code(name) for name in ('completed', 'active')}
+                        findings.extend(self._booking_findings(chunk, codes, now))
+                        scanned_ids.append(chunk['booking_id'])
+            finally:
+                reader.close()
+
+            findings.extend(self._slot_findings())
+            revenue_findings, checked_days = self._revenue_findings(days)
+            findings.extend(revenue_findings)
+
+            scanned_bookings = set(np.concatenate(scanned_ids).astype(str).tolist()) if scanned_ids else set()
+            resolved = self._store(findings, scanned_bookings, checked_days, days is None,
+                                   max_seq, max_payment)
+
+            counts: Dict[str, int] = {}
+            for finding in findings:
+                counts[finding[0]] = counts.get(finding[0], 0) + 1
+            self.last_scan = {
+                'full': days is None,
+                'days': None if days is None else len(days),
+                'rows': len(scanned_bookings),
+                'findings': counts,
+                'resolved': resolved,
+                'ms': round((time.perf_counter() - started) * 1000, 2),
+            }
+            return self.last_scan
+
+    def _store(self, findings: List[Tuple], scanned_bookings: Set[str], checked_days: Set[str],
+               full: bool, max_seq: int, max_payment: int) -> int:
+        """Upsert findings, resolve what a rescan no longer reproduces, advance watermarks"""
+        found = {(rule, entity_id) for rule, entity_id, _, _ in findings}
+        stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            # Incremental scans only look at open findings for what they
+            # revisited: slots and days (few rows) and the bookings on dirty days
+            if full:
+                open_rows = cursor.execute("""
+                    SELECT rule, entity, entity_id FROM booking_anomalies WHERE resolved_at IS NULL
+                """).fetchall()
+            else:
+                cursor.execute("CREATE TEMP TABLE IF NOT EXISTS anomaly_scope (entity_id TEXT PRIMARY KEY)")
+                cursor.execute("DELETE FROM temp.anomaly_scope")
+                cursor.executemany("INSERT INTO temp.anomaly_scope VALUES (?)",
+                                   [(entity_id,) for entity_id in scanned_bookings])
+                open_rows = cursor.execute("""
+                    SELECT rule, entity, entity_id FROM booking_anomalies
+                    WHERE entity IN ('slot', 'day') AND resolved_at IS NULL
+                    UNION ALL
+                    SELECT a.rule, a.entity, a.entity_id
+                    FROM temp.anomaly_scope s
+                    JOIN booking_anomalies a ON a.entity = 'booking' AND a.entity_id = s.entity_id
+                    WHERE a.resolved_at IS NULL
+                """).fetchall()
+            stale = []
+            for rule, entity, entity_id in open_rows:
+                rescanned = (entity == 'slot' or full
+                             or (entity == 'booking' and entity_id in scanned_bookings)
+                             or (entity == 'day' and entity_id in checked_days))
+                if rescanned and (rule, entity_id) not in found:
+                    stale.append((stamp, rule, entity_id))
+
+            cursor.executemany("""
+                INSERT INTO booking_anomalies (rule, entity, entity_id, severity, amount, details,
+                                               first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(rule, entity_id) DO UPDATE SET
+                    amount = excluded.amount, details = excluded.details,
+                    last_seen = excluded.last_seen, resolved_at = NULL
+            """, [(rule, RULES[rule][0], entity_id, RULES[rule][1], amount, details, stamp, stamp)
+                  for rule, entity_id, amount, details in findings])
+            cursor.executemany("""
+                UPDATE booking_anomalies SET resolved_at = ? WHERE rule = ? AND entity_id = ?
+            """, stale)
+            # Bookings deleted since they were flagged
+            cursor.execute("""
+                UPDATE booking_anomalies SET resolved_at = ?
+                WHERE resolved_at IS NULL AND entity = 'booking'
+                AND NOT EXISTS (SELECT 1 FROM bookings b
+                                WHERE b.booking_id = CAST(booking_anomalies.entity_id AS INTEGER))
+            """, (stamp,))
+            deleted = cursor.rowcount
+            self._set_watermark(cursor, WATERMARK_SEQ, max_seq)
+            self._set_watermark(cursor, WATERMARK_PAYMENT, max_payment)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return len(stale) + max(deleted, 0)
+
+    def get_anomalies(self, open_only: bool = True, rule: str = None, limit: int = 200) -> List[Dict]:
+        query = "SELECT * FROM booking_anomalies WHERE 1 = 1"
+        params: list = []
+        if open_only:
+            query += " AND resolved_at IS NULL"
+        if rule:
+            query += " AND rule = ?"
+            params.append(rule)
+        query += " ORDER BY last_seen DESC, anomaly_id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(query, params)]
+
+    def get_summary(self) -> Dict:
+        """Open anomalies per rule with the money at stake"""
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT rule, COUNT(*) AS count, ROUND(TOTAL(ABS(amount)), 2) AS amount
+                FROM booking_anomalies WHERE resolved_at IS NULL GROUP BY rule
+            """).fetchall()
+        return {row['rule']: {'count': row['count'], 'amount': row['amount'],
+                              'severity': RULES.get(row['rule'], ('', 'medium'))[1]} for row in rows}
+
+    # -- background --------------------------------------------------------
+
+    def start_scanner(self, interval_seconds: float = 300, full_every: int = 288):
+        """Scan periodically on a daemon thread; every `full_every`-th scan is full"""
+        if self._scanner is not None and self._scanner.is_alive():
+            return
+        self._stop_event.clear()
+
+        def loop():
+            runs = 0
+            while not self._stop_event.wait(interval_seconds):
+                runs += 1
+                try:
+                    self.scan(full=(runs % full_every == 0))
+                except Exception as e:
+                    print(f"Anomaly scan failed: {e}")
+
+        self._scanner = threading.Thread(target=loop, name='anomaly-scanner', daemon=True)
+        self._scanner.start()
+
+    def stop_scanner(self):
+        self._stop_event.set()
+        if self._scanner is not None:
+            self._scanner.join(timeout=5)
+            self._scanner = None
+
+
+_scanner_instance: Optional[AnomalyScanner] = None
+
+def get_anomaly_scanner() -> AnomalyScanner:
+    global _scanner_instance
+    if _scanner_instance is None:
+        _scanner_instance = AnomalyScanner()
+    return _scanner_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan bookings, payments and slots for anomalies")
+    parser.add_argument('--full', action='store_true', help='Rescan everything, not just changes')
+    parser.add_argument('--max-hours', type=float, default=24.0, help='Long-stay threshold')
+    parser.add_argument('--list', action='store_true', help='Print open anomalies')
+    args = parser.parse_args()
+
+    scanner = AnomalyScanner(max_hours=args.max_hours)
+    result = scanner.scan(full=args.full)
+    print(f"✓ Scanned {result['rows']} bookings in {result['ms']}ms "
+          f"({'full' if result['full'] else str(result['days']) + ' days'}), "
+          f"resolved {result['resolved']}")
+    for rule, stats in sorted(scanner.get_summary().items()):
+        print(f"  {rule:<24} {stats['severity']:<7} {stats['count']:>6}  ₹{stats['amount']:,.2f}")
+    if args.list:
+        for row in scanner.get_anomalies():
+            print(f"  [{row['severity']}] {row['rule']} {row['entity']} {row['entity_id']}: {row['details']}")
+    scanner.close()
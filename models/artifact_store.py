@@ -0,0 +1,394 @@
+"""Content-Addressed Storage and Garbage Collection for Generated Artifacts"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from database.db_manager import get_db_manager
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARTIFACT_DIR = os.path.join(PROJECT_ROOT, 'outputs', 'artifacts')
+
+ARTIFACT_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS artifacts (
+        digest TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_access TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS artifact_refs (
+        digest TEXT NOT NULL,
+        ref_type TEXT NOT NULL,
+        ref_id TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (digest, ref_type, ref_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_artifacts_kind ON artifacts(kind, last_access);
+    CREATE INDEX IF NOT EXISTS idx_artifact_refs_owner ON artifact_refs(ref_type, ref_id);
+"""
+
+# Per-kind limits. max_age_days applies to unreferenced artifacts only;
+# requires_ref marks kinds that are garbage as soon as nothing points at them.
+DEFAULT_QUOTAS: Dict[str, Dict] = {
+    'qr': {'max_bytes': 64 * 1024 * 1024, 'max_age_days': 30, 'requires_ref': True},
+    'receipt': {'max_bytes': 256 * 1024 * 1024, 'max_age_days': 90, 'requires_ref': True},
+    'chart': {'max_bytes': 128 * 1024 * 1024, 'max_age_days': 7, 'requires_ref': False},
+}
+
+# Pre-store directories that only ever grew; old files there are swept by age,
+# except PNGs still referenced from bookings.qr_code_path
+LEGACY_DIRS = [
+    os.path.join(PROJECT_ROOT, 'outputs', 'qrcodes'),
+    os.path.join(PROJECT_ROOT, 'outputs', 'tickets'),
+    os.path.join(PROJECT_ROOT, 'outputs', 'charts'),
+    os.path.join(PROJECT_ROOT, 'parking_web', 'media', 'qrcodes'),
+]
+LEGACY_MAX_AGE_DAYS = 30
+
+# A booking in one of these states no longer needs its QR code
+FINISHED_BOOKING_STATUSES = ('completed', 'cancelled', 'expired')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _now(offset_seconds: float = 0) -> str:
+    return (datetime.now() + timedelta(seconds=offset_seconds)).strftime(TIMESTAMP_FORMAT)
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Deduplicating file store for QR images, receipts and charts
+
+    Files are written once under outputs/artifacts/<kind>/<aa>/<sha256>.<ext>,
+    so identical renders share one file. Owners (bookings, tickets) register
+    references; sweep() removes orphaned, expired and over-quota artifacts in
+    bounded batches so it can run in the background without stalling callers.
+    """
+
+    def __init__(self, db_path: str = None, root: str = None, quotas: Dict[str, Dict] = None,
+                 legacy_dirs: list = None):
+        self.db_path = db_path or get_db_manager().db_path
+        self.root = root or ARTIFACT_DIR
+        self.quotas = quotas or DEFAULT_QUOTAS
+        self.legacy_dirs = LEGACY_DIRS if legacy_dirs is None else legacy_dirs
+
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(ARTIFACT_TABLES_SQL)
+        self._lock = threading.RLock()
+
+        self._sweeper = None
+        self._stop_event = threading.Event()
+
+        self.writes = 0
+        self.dedup_hits = 0
+        self.swept = {'orphaned': 0, 'expired': 0, 'quota': 0, 'missing': 0, 'legacy': 0}
+        self.swept_bytes = 0
+        self.last_sweep_ms = 0.0
+
+    def _path_for(self, kind: str, digest: str, ext: str) -> str:
+        return os.path.join(self.root, kind, digest[:2], f"{digest}.{ext.lstrip('.')}")
+
+    def put(self, data: bytes, kind: str, ext: str, ref: Tuple[str, object] = None) -> str:
+        """
+        Store `data` (or reuse an identical artifact) and return its path
+
+        Args:
+            data: File content
+            kind: Artifact kind, a key of the quota table ('qr', 'receipt', 'chart')
+            ext: File extension
+            ref: Optional (ref_type, ref_id) owner, e.g. ('booking', 42)
+        """
+        digest = content_digest(data)
+        path = self._path_for(kind, digest, ext)
+
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM artifacts WHERE digest = ?",
+                                     (digest,)).fetchone()
+            if row is not None and os.path.exists(row['path']):
+                self.dedup_hits += 1
+                self._conn.execute("UPDATE artifacts SET last_access = ? WHERE digest = ?",
+                                   (_now(), digest))
+                path = row['path']
+            else:
+                self._write_atomic(path, data)
+                self._conn.execute("""
+                    INSERT OR REPLACE INTO artifacts (digest, kind, path, size_bytes, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (digest, kind, path, len(data), _now(), _now()))
+                self.writes += 1
+
+            if ref is not None:
+                self.add_ref(digest, *ref)
+
+        return path
+
+    def put_file(self, src_path: str, kind: str, ref: Tuple[str, object] = None) -> str:
+        """Move an already-written file into the store"""
+        with open(src_path, 'rb') as f:
+            data = f.read()
+        path = self.put(data, kind, os.path.splitext(src_path)[1] or '.bin', ref)
+        if os.path.abspath(src_path) != os.path.abspath(path):
+            os.remove(src_path)
+        return path
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def add_ref(self, digest: str, ref_type: str, ref_id) -> None:
+        with self._lock:
+            self._conn.execute("""
+                INSERT OR IGNORE INTO artifact_refs (digest, ref_type, ref_id, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (digest, ref_type, str(ref_id), _now()))
+
+    def release(self, ref_type: str, ref_id) -> int:
+        """Drop every reference held by one owner; the sweeper reclaims the files"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM artifact_refs WHERE ref_type = ? AND ref_id = ?",
+                                        (ref_type, str(ref_id)))
+            return cursor.rowcount
+
+    def _prune_dead_refs(self, limit: int) -> int:
+        """
+        Release references whose booking or ticket no longer exists
+
+        ('booking', id) refs are also dropped once the booking has finished,
+        which catches bookings closed by the web app or another process
+        that could not call release() on this store.
+        """
+        placeholders = ', '.join('?' for _ in FINISHED_BOOKING_STATUSES)
+        cursor = self._conn.execute(f"""
+            DELETE FROM artifact_refs WHERE rowid IN (
+                SELECT r.rowid FROM artifact_refs r
+                WHERE (r.ref_type = 'booking' AND NOT EXISTS (
+                           SELECT 1 FROM bookings b WHERE b.booking_id = CAST(r.ref_id AS INTEGER)
+                           AND b.booking_status NOT IN ({placeholders})))
+                   OR (r.ref_type = 'ticket' AND NOT EXISTS (
+                           SELECT 1 FROM bookings b WHERE b.ticket_number = r.ref_id))
+                LIMIT ?
+            )
+        """, FINISHED_BOOKING_STATUSES + (limit,))
+        return cursor.rowcount
+
+    def _delete_artifact(self, row, reason: str):
+        try:
+            os.remove(row['path'])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove artifact {row['path']}: {e}")
+            return
+        self._conn.execute("DELETE FROM artifacts WHERE digest = ?", (row['digest'],))
+        self._conn.execute("DELETE FROM artifact_refs WHERE digest = ?", (row['digest'],))
+        self.swept[reason] += 1
+        self.swept_bytes += row['size_bytes']
+
+    def sweep(self, max_deletes: int = 200, max_seconds: float = 2.0,
+              grace_seconds: int = 3600) -> Dict:
+        """
+        Remove orphaned, expired and over-quota artifacts
+
+        Work is capped at `max_deletes` files and roughly `max_seconds`, so
+        a large backlog is cleared over several runs.
+
+        Args:
+            grace_seconds: Minimum age before an unreferenced artifact counts as orphaned
+
+        Returns:
+            dict: Number of files removed per reason in this run
+        """
+        started = time.perf_counter()
+        before = dict(self.swept)
+        budget = [max_deletes]
+
+        def out_of_budget() -> bool:
+            return budget[0] <= 0 or time.perf_counter() - started > max_seconds
+
+        def delete_rows(query: str, params: tuple, reason: str):
+            for row in self._conn.execute(query, params + (budget[0],)).fetchall():
+                if out_of_budget():
+                    return
+                self._delete_artifact(row, reason)
+                budget[0] -= 1
+
+        unreferenced = "NOT EXISTS (SELECT 1 FROM artifact_refs r WHERE r.digest = a.digest)"
+
+        with self._lock:
+            self._prune_dead_refs(max_deletes)
+
+            for kind, quota in self.quotas.items():
+                if out_of_budget():
+                    break
+
+                if quota.get('requires_ref'):
+                    delete_rows(f"""
+                        SELECT a.* FROM artifacts a
+                        WHERE a.kind = ? AND a.created_at < ? AND {unreferenced}
+                        ORDER BY a.last_access LIMIT ?
+                    """, (kind, _now(-grace_seconds)), 'orphaned')
+
+                if quota.get('max_age_days') and not out_of_budget():
+                    delete_rows(f"""
+                        SELECT a.* FROM artifacts a
+                        WHERE a.kind = ? AND a.last_access < ? AND {unreferenced}
+                        ORDER BY a.last_access LIMIT ?
+                    """, (kind, _now(-quota['max_age_days'] * 86400)), 'expired')
+
+                if quota.get('max_bytes') and not out_of_budget():
+                    self._enforce_size_quota(kind, quota['max_bytes'], budget, out_of_budget)
+
+            if not out_of_budget():
+                self._sweep_missing(budget, out_of_budget)
+            if not out_of_budget():
+                self._sweep_legacy(budget, out_of_budget)
+
+        self.last_sweep_ms = (time.perf_counter() - started) * 1000
+        return {reason: self.swept[reason] - before[reason] for reason in self.swept}
+
+    def _enforce_size_quota(self, kind: str, max_bytes: int, budget: list, out_of_budget):
+        """Evict least recently used unreferenced artifacts until `kind` fits its quota"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM artifacts WHERE kind = ?",
+                                   (kind,)).fetchone()[0]
+        if total <= max_bytes:
+            return
+
+        rows = self._conn.execute("""
+            SELECT a.* FROM artifacts a
+            WHERE a.kind = ? AND NOT EXISTS (SELECT 1 FROM artifact_refs r WHERE r.digest = a.digest)
+            ORDER BY a.last_access LIMIT ?
+        """, (kind, budget[0])).fetchall()
+        for row in rows:
+            if total <= max_bytes or out_of_budget():
+                return
+            self._delete_artifact(row, 'quota')
+            total -= row['size_bytes']
+            budget[0] -= 1
+
+    def _sweep_missing(self, budget: list, out_of_budget):
+        """Forget rows whose file was deleted behind the store's back"""
+        for row in self._conn.execute("SELECT digest, path, size_bytes FROM artifacts").fetchall():
+            if out_of_budget():
+                return
+            if not os.path.exists(row['path']):
+                self._conn.execute("DELETE FROM artifacts WHERE digest = ?", (row['digest'],))
+                self.swept['missing'] += 1
+                budget[0] -= 1
+
+    def _sweep_legacy(self, budget: list, out_of_budget):
+        cutoff = time.time() - LEGACY_MAX_AGE_DAYS * 86400
+        in_use = None
+
+        for directory in self.legacy_dirs:
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if out_of_budget():
+                        return
+                    if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+                        continue
+
+                    if in_use is None:
+                        in_use = {os.path.abspath(row[0]) for row in self._conn.execute(
+                            "SELECT qr_code_path FROM bookings WHERE qr_code_path IS NOT NULL")}
+                    if os.path.abspath(entry.path) in in_use:
+                        continue
+
+                    size = entry.stat().st_size
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        continue
+                    self.swept['legacy'] += 1
+                    self.swept_bytes += size
+                    budget[0] -= 1
+
+    def start_sweeper(self, interval_seconds: float = 600, **sweep_options):
+        """Run sweep() periodically on a daemon thread"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._stop_event.clear()
+
+        def loop():
+            while not self._stop_event.wait(interval_seconds):
+                try:
+                    self.sweep(**sweep_options)
+                except Exception as e:
+                    print(f"Artifact sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=loop, name='artifact-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop_event.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            kinds = {row['kind']: {'files': row['files'], 'bytes': row['bytes']}
+                     for row in self._conn.execute("""
+                         SELECT kind, COUNT(*) AS files, SUM(size_bytes) AS bytes
+                         FROM artifacts GROUP BY kind
+                     """)}
+            refs = self._conn.execute("SELECT COUNT(*) FROM artifact_refs").fetchone()[0]
+
+        return {
+            'kinds': kinds,
+            'refs': refs,
+            'writes': self.writes,
+            'dedup_hits': self.dedup_hits,
+            'swept': dict(self.swept),
+            'swept_bytes': self.swept_bytes,
+            'last_sweep_ms': round(self.last_sweep_ms, 2),
+        }
+
+
+_store_instance: Optional[ArtifactStore] = None
+
+def get_artifact_store() -> ArtifactStore:
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = ArtifactStore()
+    return _store_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep generated artifacts")
+    parser.add_argument('--max-deletes', type=int, default=1000)
+    parser.add_argument('--max-seconds', type=float, default=30.0)
+    parser.add_argument('--stats', action='store_true', help='Only print store metrics')
+    args = parser.parse_args()
+
+    store = get_artifact_store()
+    if not args.stats:
+        removed = store.sweep(max_deletes=args.max_deletes, max_seconds=args.max_seconds)
+        print(f"✓ Swept {sum(removed.values())} files: {removed}")
+    print(store.get_stats())
@@ -0,0 +1,228 @@
+"""Bulk QR and PDF Ticket Issuance for Event Pre-Bookings"""
+
+import argparse
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from database.db_manager import get_db_manager
+from utils.qr_payload import encode_booking_payload, error_correction_for
+from utils.qr_renderer import QRRenderer, get_qr_renderer
+
+
+BATCH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'outputs', 'tickets', 'batches')
+
+# Per-process state, created once by _init_worker
+_worker_renderer = None
+_worker_pdf = None
+
+
+def _init_worker(include_pdf: bool):
+    global _worker_renderer, _worker_pdf
+    _worker_renderer = QRRenderer()
+    if include_pdf:
+        from utils.pdf_generator import PDFGenerator
+        _worker_pdf = PDFGenerator()
+
+
+def _deadline_expiry(booking: Dict) -> Optional[datetime]:
+    """The booking's check-in deadline, so pre-issued event tickets outlive the default TTL"""
+    deadline = booking.get('checkin_deadline')
+    if not deadline:
+        return None
+    if isinstance(deadline, datetime):
+        return deadline
+    try:
+        return datetime.fromisoformat(str(deadline))
+    except ValueError:
+        return None
+
+
+def _render_ticket(job: Dict) -> Dict:
+    """Render one booking's QR payload, PNG and (optionally) PDF ticket"""
+    import io
+
+    if _worker_renderer is None or (job['include_pdf'] and _worker_pdf is None):
+        _init_worker(job['include_pdf'])
+
+    booking = job['booking']
+    result = {'booking_id': booking['booking_id'], 'ticket_number': booking['ticket_number']}
+    try:
+        qr_data = encode_booking_payload(booking['booking_id'], booking['ticket_number'],
+                                         job['expires_at'] or _deadline_expiry(booking))
+        png = _worker_renderer.render(qr_data, 'png',
+                                      error_correction=error_correction_for(qr_data))
+        result.update(qr_data=qr_data, png=png, pdf=None, error=None)
+
+        if job['include_pdf']:
+            buffer = io.BytesIO()
+            _worker_pdf.generate_booking_ticket(booking, png, buffer)
+            result['pdf'] = buffer.getvalue()
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+
+class BatchTicketIssuer:
+    """
+    Issue QR codes and PDF tickets for many bookings at once
+
+    Rendering is fanned out across worker processes; results stream back
+    into a zip archive or a directory of files, and every booking's
+    qr_code_data/qr_code_path is updated in one executemany statement.
+    """
+
+    def __init__(self, workers: int = None, chunksize: int = 16):
+        self.db = get_db_manager()
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+
+    def load_bookings(self, booking_ids: List[int] = None, status: str = None) -> List[Dict]:
+        """Fetch the fields printed on a ticket for the given bookings"""
+        query = """
+            SELECT b.booking_id, b.ticket_number, b.user_id, b.booking_time,
+                   b.checkin_deadline, u.name, v.vehicle_number,
+                   ps.slot_number, ps.floor, ps.section
+            FROM bookings b
+            JOIN users u ON b.user_id = u.user_id
+            JOIN vehicles v ON b.vehicle_id = v.vehicle_id
+            JOIN parking_slots ps ON b.slot_id = ps.slot_id
+        """
+        conditions, params = [], []
+        if booking_ids:
+            conditions.append(f"b.booking_id IN ({','.join('?' * len(booking_ids))})")
+            params.extend(booking_ids)
+        if status:
+            conditions.append("b.booking_status = ?")
+            params.append(status)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY b.booking_id"
+
+        return [dict(row) for row in self.db.fetch_all(query, tuple(params))]
+
+    def issue(self, bookings: List[Dict], output: str = 'zip', output_path: str = None,
+              include_pdf: bool = True, expires_at: datetime = None) -> Dict:
+        """
+        Render and store tickets for `bookings`
+
+        Args:
+            bookings: Rows from load_bookings()
+            output: 'zip' for one archive, 'files' for a directory of PNG/PDF files
+            output_path: Archive file or directory (default outputs/tickets/batches)
+            include_pdf: Also render a PDF ticket per booking
+            expires_at: Ticket expiry for every QR (default each booking's
+                        checkin_deadline, else the payload TTL)
+
+        Returns:
+            dict: Summary with counts, output path and throughput
+        """
+        if output not in ('zip', 'files'):
+            raise ValueError("output must be 'zip' or 'files'")
+
+        started = time.perf_counter()
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if output_path is None:
+            name = f"batch_{stamp}.zip" if output == 'zip' else f"batch_{stamp}"
+            output_path = os.path.join(BATCH_DIR, name)
+
+        jobs = [{'booking': b, 'include_pdf': include_pdf, 'expires_at': expires_at}
+                for b in bookings]
+
+        updates = []
+        failed = []
+        archive = None
+        if output == 'zip':
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            # PNG and PDF are already compressed, so store them as-is
+            archive = zipfile.ZipFile(output_path, 'w', zipfile.ZIP_STORED)
+        else:
+            os.makedirs(output_path, exist_ok=True)
+
+        try:
+            for result in self._run(jobs, include_pdf):
+                if result['error']:
+                    failed.append({'booking_id': result['booking_id'], 'error': result['error']})
+                    continue
+
+                base = f"booking_{result['booking_id']}_{result['ticket_number']}"
+                qr_path = self._write(archive, output_path, f"{base}.png", result['png'])
+                if result['pdf']:
+                    self._write(archive, output_path, f"{base}.pdf", result['pdf'])
+
+                updates.append((result['qr_data'], qr_path, result['booking_id']))
+        finally:
+            if archive is not None:
+                archive.close()
+
+        # Zip entries have no path on disk; keep whatever file the booking already has
+        saved = self.db.execute_many(
+            "UPDATE bookings SET qr_code_data = ?, qr_code_path = COALESCE(?, qr_code_path) WHERE booking_id = ?",
+            updates
+        ) if updates else True
+
+        renderer = get_qr_renderer()
+        for _, _, booking_id in updates:
+            renderer.invalidate(booking_id)
+
+        elapsed = time.perf_counter() - started
+        return {
+            'requested': len(bookings),
+            'issued': len(updates) if saved else 0,
+            'failed': failed,
+            'db_updated': saved,
+            'output': output_path,
+            'seconds': round(elapsed, 2),
+            'per_second': round(len(updates) / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def _run(self, jobs: List[Dict], include_pdf: bool):
+        if self.workers <= 1 or len(jobs) < 2:
+            for job in jobs:
+                yield _render_ticket(job)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(include_pdf,)) as pool:
+            yield from pool.map(_render_ticket, jobs, chunksize=self.chunksize)
+
+    @staticmethod
+    def _write(archive: Optional[zipfile.ZipFile], output_path: str, name: str,
+               content: bytes) -> Optional[str]:
+        """Store one file; returns its path on disk, or None inside an archive"""
+        if archive is not None:
+            archive.writestr(name, content)
+            return None
+
+        path = os.path.join(output_path, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Issue QR codes and PDF tickets in bulk")
+    parser.add_argument('--ids', type=int, nargs='*', help='Booking IDs (default: all matching --status)')
+    parser.add_argument('--status', default='pending')
+    parser.add_argument('--files', action='store_true', help='Write a directory instead of a zip')
+    parser.add_argument('--no-pdf', action='store_true')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--output')
+    parser.add_argument('--expires', type=datetime.fromisoformat,
+                        help="Expiry for every ticket, YYYY-MM-DD[ HH:MM] (default: each booking's check-in deadline)")
+    args = parser.parse_args()
+
+    issuer = BatchTicketIssuer(workers=args.workers)
+    rows = issuer.load_bookings(args.ids, args.status)
+    summary = issuer.issue(rows, output='files' if args.files else 'zip',
+                           output_path=args.output, include_pdf=not args.no_pdf,
+                           expires_at=args.expires)
+    print(f"✓ Issued {summary['issued']}/{summary['requested']} tickets "
+          f"in {summary['seconds']}s ({summary['per_second']}/s) -> {summary['output']}")
+    for failure in summary['failed']:
+        print(f"✗ Booking {failure['booking_id']}: {failure['error']}")
@@ -0,0 +1,227 @@
+"""Gate-Station Booking Lookup Cache"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Optional, Set
+
+from database.db_manager import get_db_manager
+
+
+ENRICHED_BOOKING_QUERY = """
+    SELECT b.*, u.name, u.email, u.phone, v.vehicle_number, v.vehicle_type,
+           ps.slot_number, ps.floor, ps.section
+    FROM bookings b
+    JOIN users u ON b.user_id = u.user_id
+    JOIN vehicles v ON b.vehicle_id = v.vehicle_id
+    JOIN parking_slots ps ON b.slot_id = ps.slot_id
+"""
+
+
+class BookingLookupCache:
+    """
+    Read-through cache of enriched booking records for QR scans
+
+    Records are keyed by booking_id with a ticket_number -> booking_id side
+    index. The cache is warmed with every pending and active booking and
+    reads through to the database on a miss.
+
+    It holds its own connection, so PRAGMA data_version changes whenever any
+    other connection (this app's DatabaseManager, the web app, a gate
+    service) commits. Most of those commits don't touch bookings (job queue,
+    artifact sweeps, rollup watermarks), so the next lookup first checks
+    analytics_dirty_log. Each of its rows starts at the entry day of a
+    changed booking, and only live bookings that entered on those days are
+    reloaded. A full warm() happens only if the log was pruned past the
+    cache's position or too many days changed at once. Edits to users,
+    vehicles or slots alone don't reach the cached copies; refresh() does.
+    Callers that change a booking's status can call invalidate()/refresh()
+    right away so the following scan stays memory-only.
+    """
+
+    def __init__(self, db_path: str = None, max_size: int = 20000, max_dirty_days: int = 31):
+        self.db_path = db_path or get_db_manager().db_path
+        self.max_size = max_size
+        self.max_dirty_days = max_dirty_days
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+
+        self._by_id: "OrderedDict[int, Dict]" = OrderedDict()
+        self._ticket_index: Dict[str, int] = {}
+        self._data_version = None
+        self._seq = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.partial_reloads = 0
+        self.last_reload_ms = 0.0
+
+    def _current_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _seq_range(self):
+        """(oldest, newest) dirty-log sequence still in the table"""
+        row = self._conn.execute(
+            "SELECT COALESCE(MIN(seq), 0), COALESCE(MAX(seq), 0) FROM analytics_dirty_log").fetchone()
+        return row[0], row[1]
+
+    def warm(self):
+        """(Re)load every pending and active booking"""
+        with self._lock:
+            start = time.perf_counter()
+            version = self._current_version()
+            _, seq = self._seq_range()
+            rows = self._conn.execute(
+                ENRICHED_BOOKING_QUERY + " WHERE b.booking_status IN ('pending', 'active')"
+            ).fetchall()
+
+            self._by_id.clear()
+            self._ticket_index.clear()
+            for row in rows:
+                self._store(dict(row))
+
+            self._data_version = version
+            self._seq = seq
+            self.reloads += 1
+            self.last_reload_ms = (time.perf_counter() - start) * 1000
+
+    refresh = warm
+
+    def _check_external_writes(self):
+        if self._data_version is None:
+            self.warm()
+            return
+        version = self._current_version()
+        if version == self._data_version:
+            return
+        self._data_version = version
+
+        first, last = self._seq_range()
+        if last == self._seq:
+            return
+        if first > self._seq + 1:
+            # The rollup pruned entries this cache never saw
+            self.warm()
+            return
+
+        days = {row[0] for row in self._conn.execute(
+            "SELECT DISTINCT day_from FROM analytics_dirty_log WHERE seq > ? AND seq <= ?",
+            (self._seq, last))}
+        if not days:
+            self._seq = last
+            return
+        if len(days) > self.max_dirty_days:
+            self.warm()
+            return
+        self._reload_days(days)
+        self._seq = last
+
+    def _reload_days(self, days: Set[str]):
+        """Replace cached bookings that entered on `days` with their live rows"""
+        start = time.perf_counter()
+        ranges = [(day, (date.fromisoformat(day) + timedelta(days=1)).isoformat()) for day in sorted(days)]
+        rows = self._conn.execute(
+            ENRICHED_BOOKING_QUERY + " WHERE b.booking_status IN ('pending', 'active') AND ("
+            + " OR ".join("(b.entry_time >= ? AND b.entry_time < ?)" for _ in ranges) + ")",
+            [bound for pair in ranges for bound in pair]
+        ).fetchall()
+
+        # Bookings on those days that are no longer live (or were deleted)
+        for booking_id, record in list(self._by_id.items()):
+            if str(record['entry_time'])[:10] in days:
+                self.invalidate(booking_id)
+        for row in rows:
+            self._store(dict(row))
+
+        self.partial_reloads += 1
+        self.last_reload_ms = (time.perf_counter() - start) * 1000
+
+    def _store(self, record: Dict):
+        booking_id = record['booking_id']
+        self._by_id[booking_id] = record
+        self._by_id.move_to_end(booking_id)
+        self._ticket_index[record['ticket_number']] = booking_id
+
+        while len(self._by_id) > self.max_size:
+            _, evicted = self._by_id.popitem(last=False)
+            self._ticket_index.pop(evicted['ticket_number'], None)
+
+    def _load(self, where: str, params: tuple) -> Optional[Dict]:
+        row = self._conn.execute(ENRICHED_BOOKING_QUERY + where, params).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        self._store(record)
+        return record
+
+    def get_by_booking(self, booking_id: int, ticket_number: str = None) -> Optional[Dict]:
+        """
+        Enriched booking by id; if `ticket_number` is given it must match too
+
+        Returns:
+            dict: A copy of the cached record, or None
+        """
+        with self._lock:
+            self._check_external_writes()
+            record = self._by_id.get(booking_id)
+            if record is not None:
+                self.hits += 1
+                self._by_id.move_to_end(booking_id)
+            else:
+                self.misses += 1
+                record = self._load(" WHERE b.booking_id = ?", (booking_id,))
+
+            if record is None or (ticket_number and record['ticket_number'] != ticket_number):
+                return None
+            return dict(record)
+
+    def get_by_ticket(self, ticket_number: str) -> Optional[Dict]:
+        with self._lock:
+            self._check_external_writes()
+            booking_id = self._ticket_index.get(ticket_number)
+            if booking_id is not None and booking_id in self._by_id:
+                self.hits += 1
+                self._by_id.move_to_end(booking_id)
+                return dict(self._by_id[booking_id])
+
+            self.misses += 1
+            record = self._load(" WHERE b.ticket_number = ?", (ticket_number,))
+            return dict(record) if record else None
+
+    def invalidate(self, booking_id: int):
+        """Drop one booking, e.g. right after its status changed"""
+        with self._lock:
+            record = self._by_id.pop(booking_id, None)
+            if record:
+                self._ticket_index.pop(record['ticket_number'], None)
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._ticket_index.clear()
+            self._data_version = None
+            self._seq = 0
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._by_id),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'reloads': self.reloads,
+            'partial_reloads': self.partial_reloads,
+            'last_reload_ms': round(self.last_reload_ms, 2),
+        }
+
+
+_cache_instance: Optional[BookingLookupCache] = None
+
+def get_booking_cache() -> BookingLookupCache:
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = BookingLookupCache()
+    return _cache_instance
@@ -0,0 +1,272 @@
+"""Memoized Chart Rendering with Preview/Print Quality and Parallel Dashboards"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+
+# Bump when a chart's look changes so fingerprints roll over
+CHART_TEMPLATE_VERSION = 1
+
+QUALITY_DPI = {'preview': 72, 'print': 300}
+
+DASHBOARD_CHARTS = ('revenue', 'occupancy', 'peak_hours', 'vehicle_type')
+
+
+# ---------------------------------------------------------------------------
+# Drawing: pure functions of (data, params), safe to run in worker processes
+# ---------------------------------------------------------------------------
+
+def _draw_revenue(data, params):
+    days = params.get('days', 7)
+    fig = plt.figure(figsize=(10, 6))
+    plt.plot([row['date'] for row in data], [row['revenue'] or 0 for row in data],
+             marker='o', linewidth=2, markersize=8)
+    plt.title(f'Revenue Trend - Last {days} Days', fontsize=16, fontweight='bold')
+    plt.xlabel('Date', fontsize=12)
+    plt.ylabel('Revenue (₹)', fontsize=12)
+    plt.grid(True, alpha=0.3)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    return fig
+
+
+def _draw_occupancy(data, params):
+    labels = ['Occupied', 'Available', 'Reserved', 'Maintenance']
+    colors = ['#ff6b6b', '#51cf66', '#ffd43b', '#868e96']
+    fig = plt.figure(figsize=(10, 8))
+    plt.pie(data, explode=(0.1, 0, 0, 0), labels=labels, colors=colors,
+            autopct='%1.1f%%', shadow=True, startangle=90)
+    plt.title('Current Parking Occupancy', fontsize=16, fontweight='bold')
+    plt.axis('equal')
+    return fig
+
+
+def _draw_peak_hours(data, params):
+    rows = sorted(data, key=lambda row: row['hour'])
+    fig = plt.figure(figsize=(12, 6))
+    plt.bar([row['hour'] for row in rows], [row['bookings'] for row in rows],
+            color='#339af0', alpha=0.8)
+    plt.title('Peak Parking Hours Analysis', fontsize=16, fontweight='bold')
+    plt.xlabel('Hour of Day', fontsize=12)
+    plt.ylabel('Number of Bookings', fontsize=12)
+    plt.xticks(range(0, 24))
+    plt.grid(True, alpha=0.3, axis='y')
+    plt.tight_layout()
+    return fig
+
+
+def _draw_vehicle_type(data, params):
+    fig = plt.figure(figsize=(10, 6))
+    plt.bar([row['vehicle_type'] for row in data], [row['count'] for row in data],
+            color=['#845ef7', '#20c997', '#ff6b6b'])
+    plt.title('Vehicle Type Distribution', fontsize=16, fontweight='bold')
+    plt.xlabel('Vehicle Type', fontsize=12)
+    plt.ylabel('Number of Bookings', fontsize=12)
+    plt.grid(True, alpha=0.3, axis='y')
+    plt.tight_layout()
+    return fig
+
+
+DRAWERS = {
+    'revenue': _draw_revenue,
+    'occupancy': _draw_occupancy,
+    'peak_hours': _draw_peak_hours,
+    'vehicle_type': _draw_vehicle_type,
+}
+
+
+def render_png(chart: str, data, params: Dict, dpi: int) -> bytes:
+    """Draw one chart and return PNG bytes"""
+    fig = DRAWERS[chart](data, params)
+    buffer = io.BytesIO()
+    # No Software tag, so identical data always gives identical bytes
+    fig.savefig(buffer, format='png', dpi=dpi, metadata={'Software': None})
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _init_worker():
+    matplotlib.use('Agg')
+
+
+def _render_job(job) -> bytes:
+    return render_png(*job)
+
+
+# ---------------------------------------------------------------------------
+
+class ChartService:
+    """
+    Render analytics charts only when their data changes
+
+    Each chart's input data is loaded (cheap, from the rollups) and hashed
+    together with its parameters and resolution; a matching fingerprint
+    returns the previously rendered file. Misses are drawn at preview
+    (72 dpi) or print (300 dpi) resolution, and a whole dashboard's misses
+    are drawn in parallel on a process pool.
+    """
+
+    def __init__(self, analytics=None, workers: int = None, max_entries: int = 128):
+        self._analytics = analytics
+        self.workers = workers or min(len(DASHBOARD_CHARTS), os.cpu_count() or 1)
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.last_dashboard_ms = 0.0
+
+    @property
+    def analytics(self):
+        if self._analytics is None:
+            from models.analytics import AnalyticsManager
+            self._analytics = AnalyticsManager()
+        return self._analytics
+
+    def load_data(self, chart: str, params: Dict):
+        """Input data for a chart, or None when there is nothing to plot"""
+        if chart == 'revenue':
+            data = self.analytics.get_daily_revenue(params.get('days', 7))
+        elif chart == 'occupancy':
+            stats = self.analytics.db.get_slot_statistics()
+            data = [stats.get(key, 0) for key in ('occupied', 'available', 'reserved', 'maintenance')]
+        elif chart == 'peak_hours':
+            data = self.analytics.get_peak_hours()
+        elif chart == 'vehicle_type':
+            data = self.analytics.get_vehicle_distribution()
+        else:
+            raise ValueError(f"Unknown chart: {chart}")
+        return data or None
+
+    @staticmethod
+    def fingerprint(chart: str, params: Dict, data, dpi: int) -> str:
+        content = json.dumps([chart, params, data, dpi, CHART_TEMPLATE_VERSION],
+                             sort_keys=True, default=str)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            path = self._cache.get(key)
+            if path and os.path.exists(path):
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return path
+            self._cache.pop(key, None)
+            self.misses += 1
+            return None
+
+    def _store(self, key: str, png: bytes) -> str:
+        from models.artifact_store import get_artifact_store
+
+        path = get_artifact_store().put(png, 'chart', 'png')
+        with self._lock:
+            self._cache[key] = path
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return path
+
+    def render(self, chart: str, params: Dict = None, quality: str = 'print') -> Optional[str]:
+        """
+        Path of the chart's PNG, rendering only if its data changed
+
+        Args:
+            chart: One of DRAWERS
+            params: Chart options, e.g. {'days': 7} for revenue
+            quality: 'preview' or 'print'
+        """
+        params = params or {}
+        dpi = QUALITY_DPI[quality]
+        data = self.load_data(chart, params)
+        if data is None:
+            return None
+
+        key = self.fingerprint(chart, params, data, dpi)
+        return self._lookup(key) or self._store(key, render_png(chart, data, params, dpi))
+
+    def render_dashboard(self, quality: str = 'preview', params: Dict[str, Dict] = None,
+                         workers: int = None) -> Dict[str, Optional[str]]:
+        """
+        Render every dashboard chart, drawing the changed ones concurrently
+
+        Data is loaded here (one DB connection); worker processes only draw.
+
+        Returns:
+            dict: chart name -> PNG path (None when the chart has no data)
+        """
+        started = time.perf_counter()
+        params = params or {}
+        dpi = QUALITY_DPI[quality]
+        results: Dict[str, Optional[str]] = dict.fromkeys(DASHBOARD_CHARTS)
+        pending = []
+
+        for chart in DASHBOARD_CHARTS:
+            chart_params = params.get(chart, {})
+            data = self.load_data(chart, chart_params)
+            if data is None:
+                continue
+            key = self.fingerprint(chart, chart_params, data, dpi)
+            path = self._lookup(key)
+            if path:
+                results[chart] = path
+            else:
+                pending.append((chart, key, (chart, data, chart_params, dpi)))
+
+        workers = workers or self.workers
+        if len(pending) > 1 and workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                     initializer=_init_worker) as pool:
+                images = list(pool.map(_render_job, [job for _, _, job in pending]))
+        else:
+            images = [_render_job(job) for _, _, job in pending]
+
+        for (chart, key, _), png in zip(pending, images):
+            results[chart] = self._store(key, png)
+
+        self.last_dashboard_ms = (time.perf_counter() - started) * 1000
+        return results
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'last_dashboard_ms': round(self.last_dashboard_ms, 2),
+        }
+
+
+_service_instance: Optional[ChartService] = None
+
+def get_chart_service() -> ChartService:
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = ChartService()
+    return _service_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render dashboard charts")
+    parser.add_argument('--quality', choices=sorted(QUALITY_DPI), default='preview')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    service = get_chart_service()
+    for attempt in ('cold', 'warm'):
+        paths = service.render_dashboard(args.quality, workers=args.workers)
+        print(f"{attempt}: {service.last_dashboard_ms:.0f}ms")
+    for chart, path in paths.items():
+        print(f"  {chart}: {path}")
+    print(service.get_stats())
@@ -0,0 +1,265 @@
+"""Signup Cohorts, Retention, Visit Frequency and Lifetime Value"""
+
+import argparse
+import csv
+import os
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from database.db_manager import get_db_manager
+
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'outputs', 'reports')
+
+# Period index as an integer, computed by SQLite: months since year 0, or
+# Monday-based weeks since the epoch
+PERIOD_SQL = {
+    'month': "(CAST(strftime('%Y', {col}) AS INTEGER) * 12 + CAST(strftime('%m', {col}) AS INTEGER) - 1)",
+    'week': "CAST((julianday({col}) - 2440587.5 + 3) / 7 AS INTEGER)",
+}
+
+# Visits are stays that actually happened
+VISIT_STATUSES = ('active', 'completed')
+
+FREQUENCY_BUCKETS = ((1, 1), (2, 3), (4, 7), (8, None))
+
+
+def current_period(period: str) -> int:
+    """Index of the period containing now, matching PERIOD_SQL"""
+    now = datetime.now()
+    if period == 'month':
+        return now.year * 12 + now.month - 1
+    return ((now - datetime(1970, 1, 1)).days + 3) // 7
+
+
+def period_label(index: int, period: str) -> str:
+    if period == 'month':
+        return f"{index // 12:04d}-{index % 12 + 1:02d}"
+    return str(np.datetime64(int(index) * 7 - 3, 'D'))
+
+
+class CohortAnalytics:
+    """
+    Cohort tables for customers grouped by signup month or week
+
+    Three grouped queries (users, visits per user-period, net payments per
+    user-period) are joined in NumPy, so the cost does not depend on the
+    number of users beyond the rows those queries return. Results are
+    cached per period until bookings, users or payments change.
+    """
+
+    def __init__(self):
+        self.db = get_db_manager()
+        self._cache: Dict[Tuple, Tuple[Tuple, Dict]] = {}
+
+    def _version(self) -> Tuple:
+        from models.analytics_rollup import get_analytics_rollup
+
+        users = self.db.fetch_one("SELECT COUNT(*), COALESCE(MAX(user_id), 0) FROM users")
+        payments = self.db.fetch_one(
+            "SELECT COUNT(*), COALESCE(MAX(payment_id), 0), TOTAL(refund_amount) FROM payments")
+        return (get_analytics_rollup().current_seq(), tuple(users), tuple(payments),
+                datetime.now().strftime('%Y-%m-%d'))
+
+    def _load(self, period: str) -> Tuple[np.ndarray, ...]:
+        signup = PERIOD_SQL[period].format(col='created_at')
+        users = self.db.fetch_all(f"""
+            SELECT user_id, {signup} AS cohort FROM users
+            WHERE user_type = 'customer' AND created_at IS NOT NULL
+            ORDER BY user_id
+        """)
+
+        visited = PERIOD_SQL[period].format(col='COALESCE(checkin_time, entry_time)')
+        visits = self.db.fetch_all(f"""
+            SELECT user_id, {visited} AS period, COUNT(*) AS visits
+            FROM bookings
+            WHERE booking_status IN ({','.join('?' * len(VISIT_STATUSES))})
+            GROUP BY user_id, period
+            HAVING period IS NOT NULL
+        """, VISIT_STATUSES)
+
+        paid = PERIOD_SQL[period].format(col='p.payment_time')
+        revenue = self.db.fetch_all(f"""
+            SELECT b.user_id, {paid} AS period,
+                   SUM(p.amount - COALESCE(p.refund_amount, 0)) AS revenue
+            FROM payments p JOIN bookings b ON p.booking_id = b.booking_id
+            GROUP BY b.user_id, period
+            HAVING period IS NOT NULL
+        """)
+
+        def columns(rows, dtypes):
+            if not rows:
+                return [np.empty(0, dtype=dtype) for dtype in dtypes]
+            return [np.array(values, dtype=dtype) for values, dtype in zip(zip(*rows), dtypes)]
+
+        user_ids, cohorts = columns(users, (np.int64, np.int64))
+        visit_users, visit_periods, visit_counts = columns(visits, (np.int64, np.int64, np.int64))
+        pay_users, pay_periods, pay_amounts = columns(revenue, (np.int64, np.int64, np.float64))
+        return (user_ids, cohorts, visit_users, visit_periods, visit_counts,
+                pay_users, pay_periods, pay_amounts)
+
+    def compute(self, period: str = 'month', max_offset: int = 12, refresh: bool = False) -> Dict:
+        """
+        Cohort report, served from cache while the underlying data is unchanged
+
+        Args:
+            period: 'month' or 'week'
+            max_offset: Longest retention/LTV curve, in periods since signup
+            refresh: Ignore the cache
+
+        Returns:
+            dict: 'cohorts' (one row per signup period with users, retention
+                  and cumulative LTV curves, repeat rate and visit frequency)
+                  and 'summary' across all customers
+        """
+        if period not in PERIOD_SQL:
+            raise ValueError(f"period must be one of {sorted(PERIOD_SQL)}")
+
+        key = (period, max_offset)
+        version = self._version()
+        cached = self._cache.get(key)
+        if cached and cached[0] == version and not refresh:
+            return cached[1]
+
+        (user_ids, cohorts, visit_users, visit_periods, visit_counts,
+         pay_users, pay_periods, pay_amounts) = self._load(period)
+        current = current_period(period)
+
+        def locate(users: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            """Row of each user in user_ids, and whether it is a known customer"""
+            pos = np.searchsorted(user_ids, users)
+            known = pos < len(user_ids)
+            known[known] = user_ids[pos[known]] == users[known]
+            return pos, known
+
+        vpos, vknown = locate(visit_users)
+        vpos, visit_periods, visit_counts = vpos[vknown], visit_periods[vknown], visit_counts[vknown]
+        ppos, pknown = locate(pay_users)
+        ppos, pay_periods, pay_amounts = ppos[pknown], pay_periods[pknown], pay_amounts[pknown]
+
+        user_visits = np.bincount(vpos, weights=visit_counts, minlength=len(user_ids))
+        user_revenue = np.bincount(ppos, weights=pay_amounts, minlength=len(user_ids))
+
+        cohort_keys, cohort_of_user = np.unique(cohorts, return_inverse=True)
+        n_cohorts, width = len(cohort_keys), max_offset + 1
+
+        def per_cohort(weights: np.ndarray) -> np.ndarray:
+            return np.bincount(cohort_of_user, weights=weights, minlength=n_cohorts)
+
+        sizes = per_cohort(None)
+        visitors = per_cohort(user_visits > 0)
+        repeaters = per_cohort(user_visits >= 2)
+        visit_totals = per_cohort(user_visits)
+        revenue_totals = per_cohort(user_revenue)
+
+        # (cohort, periods since signup) grids. Activity before the recorded
+        # signup (imported accounts) counts as period 0; each user is counted
+        # once per period.
+        visit_offsets = np.maximum(visit_periods - cohorts[vpos], 0)
+        in_range = visit_offsets < width
+        active_pairs = np.unique(vpos[in_range] * width + visit_offsets[in_range])
+        active = np.zeros((n_cohorts, width))
+        np.add.at(active, (cohort_of_user[active_pairs // width], active_pairs % width), 1)
+
+        pay_offsets = np.maximum(pay_periods - cohorts[ppos], 0)
+        in_range = pay_offsets < width
+        revenue = np.zeros((n_cohorts, width))
+        np.add.at(revenue, (cohort_of_user[ppos[in_range]], pay_offsets[in_range]), pay_amounts[in_range])
+        cumulative = np.cumsum(revenue, axis=1)
+
+        rows = []
+        for c, cohort in enumerate(cohort_keys.tolist()):
+            size = sizes[c]
+            # Curves stop at the current period; later offsets haven't happened yet
+            observed = max(1, min(width, int(current - cohort) + 1))
+            rows.append({
+                'cohort': period_label(cohort, period),
+                'users': int(size),
+                'visitors': int(visitors[c]),
+                'repeat_rate': round(float(repeaters[c] / size * 100), 1),
+                'visits_per_user': round(float(visit_totals[c] / size), 2),
+                'ltv': round(float(revenue_totals[c] / size), 2),
+                'retention': np.round(active[c, :observed] / size * 100, 1).tolist(),
+                'cumulative_ltv': np.round(cumulative[c, :observed] / size, 2).tolist(),
+            })
+
+        total_users = len(user_ids)
+        frequency = []
+        for low, high in FREQUENCY_BUCKETS:
+            in_bucket = (user_visits >= low) if high is None else (user_visits >= low) & (user_visits <= high)
+            frequency.append({'visits': f"{low}+" if high is None else (f"{low}" if low == high else f"{low}-{high}"),
+                              'users': int(in_bucket.sum())})
+        paying = user_revenue > 0
+
+        result = {
+            'period': period,
+            'cohorts': rows,
+            'summary': {
+                'users': total_users,
+                'visitors': int((user_visits > 0).sum()),
+                'repeat_rate': round(float((user_visits >= 2).sum()) / total_users * 100, 1) if total_users else 0.0,
+                'ltv': round(float(user_revenue.sum()) / total_users, 2) if total_users else 0.0,
+                'ltv_paying': round(float(user_revenue[paying].mean()), 2) if paying.any() else 0.0,
+                'visit_frequency': frequency,
+            },
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self._cache[key] = (version, result)
+        return result
+
+    def export_csv(self, period: str = 'month', path: str = None, max_offset: int = 12) -> Optional[str]:
+        """
+        Write the cohort table in long form: one row per cohort and period offset
+
+        Returns:
+            str: Path of the CSV file, or None if there are no customers
+        """
+        report = self.compute(period, max_offset)
+        if not report['cohorts']:
+            return None
+
+        if path is None:
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            path = os.path.join(REPORT_DIR, f"cohorts_{period}_{stamp}.csv")
+
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['cohort', 'users', 'repeat_rate', 'ltv', f'{period}s_since_signup',
+                             'retention_pct', 'cumulative_ltv'])
+            for row in report['cohorts']:
+                for offset, (retention, ltv) in enumerate(zip(row['retention'], row['cumulative_ltv'])):
+                    writer.writerow([row['cohort'], row['users'], row['repeat_rate'], row['ltv'],
+                                     offset, retention, ltv])
+        return path
+
+
+_cohort_instance: Optional[CohortAnalytics] = None
+
+def get_cohort_analytics() -> CohortAnalytics:
+    global _cohort_instance
+    if _cohort_instance is None:
+        _cohort_instance = CohortAnalytics()
+    return _cohort_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Customer cohorts, retention and LTV")
+    parser.add_argument('--period', choices=sorted(PERIOD_SQL), default='month')
+    parser.add_argument('--max-offset', type=int, default=12)
+    parser.add_argument('--export', action='store_true', help='Write the table to CSV')
+    args = parser.parse_args()
+
+    cohorts = get_cohort_analytics()
+    if args.export:
+        print(f"✓ Cohorts exported to {cohorts.export_csv(args.period, max_offset=args.max_offset)}")
+    else:
+        report = cohorts.compute(args.period, args.max_offset)
+        for row in report['cohorts']:
+            curve = ' '.join(f"{value:5.1f}" for value in row['retention'])
+            print(f"{row['cohort']:>10}  {row['users']:>5}  repeat {row['repeat_rate']:5.1f}%  "
+                  f"LTV ₹{row['ltv']:>9,.2f}  | {curve}")
+        print(report['summary'])
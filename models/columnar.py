@@ -0,0 +1,372 @@
+"""Chunked Columnar Reads and Incremental Aggregations over Booking History"""
+
+import argparse
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from database.db_manager import get_db_manager
+
+
+NULL_INT = -1
+NULL_EPOCH = np.iinfo(np.int64).min
+
+
+def _epoch(column: str, utc: bool = False) -> str:
+    # SQLite parses the timestamp in C; NULL/unparseable become NULL_EPOCH.
+    # UTC columns are shifted to local time so they subtract from the others.
+    modifier = ", 'localtime'" if utc else ''
+    return f"COALESCE(CAST(strftime('%s', {column}{modifier}) AS INTEGER), {NULL_EPOCH})"
+
+
+# Column -> (SQL expression, kind). Kinds map to numpy dtypes:
+#   int -> int64 (NULL_INT), epoch -> int64 seconds (NULL_EPOCH),
+#   float -> float64 (NaN), category -> int16 codes into a vocabulary
+BOOKING_COLUMNS = {
+    'booking_id': ('b.booking_id', 'int'),
+    'user_id': (f'COALESCE(b.user_id, {NULL_INT})', 'int'),
+    'slot_id': (f'COALESCE(b.slot_id, {NULL_INT})', 'int'),
+    # entry_time is stored in UTC (see occupancy.STORAGE_TIMEZONES)
+    'entry': (_epoch('b.entry_time', utc=True), 'epoch'),
+    'exit': (_epoch('b.exit_time'), 'epoch'),
+    'checkin': (_epoch('b.checkin_time'), 'epoch'),
+    'checkout': (_epoch('b.checkout_time'), 'epoch'),
+    'duration_hours': ('b.duration_hours', 'float'),
+    'total_amount': ('b.total_amount', 'float'),
+    'forfeited': ('COALESCE(b.forfeited, 0)', 'int'),
+    'paid': ('(SELECT TOTAL(p.amount) FROM payments p WHERE p.booking_id = b.booking_id)', 'float'),
+    'refunded': ('(SELECT TOTAL(p.refund_amount) FROM payments p WHERE p.booking_id = b.booking_id)', 'float'),
+    'booking_status': ('b.booking_status', 'category'),
+    'payment_status': ('b.payment_status', 'category'),
+    'vehicle_type': ('v.vehicle_type', 'category'),
+}
+
+PERIODS = {'day': 'D', 'week': 'W', 'month': 'M', 'year': 'Y'}
+
+
+class Vocabulary:
+    """Stable string -> small int codes, grown as new values appear"""
+
+    def __init__(self):
+        self.codes: Dict[Optional[str], int] = {}
+        self.values: List[Optional[str]] = []
+
+    def encode(self, values: Sequence[Optional[str]]) -> np.ndarray:
+        codes = self.codes
+        for value in set(values) - codes.keys():
+            codes[value] = len(self.values)
+            self.values.append(value)
+        return np.fromiter((codes[value] for value in values), dtype=np.int16, count=len(values))
+
+    def code(self, value: str) -> int:
+        """Code of `value`, or -1 if it has not been seen (matches nothing)"""
+        return self.codes.get(value, -1)
+
+
+class ColumnarReader:
+    """
+    Stream bookings as dicts of typed NumPy arrays, `chunk_size` rows at a time
+
+    Rows go from the SQLite cursor straight into column arrays; no per-row
+    dict or DataFrame is built, and at most one chunk is alive at once.
+    """
+
+    def __init__(self, db_path: str = None, chunk_size: int = 50000):
+        self.db_path = db_path or get_db_manager().db_path
+        self.chunk_size = chunk_size
+        self.conn = sqlite3.connect(self.db_path)
+        self.vocab: Dict[str, Vocabulary] = {}
+
+    def close(self):
+        self.conn.close()
+
+    def iter_chunks(self, columns: Sequence[str] = None, start_date: str = None,
+                    end_date: str = None) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Yield column chunks for bookings entered in [start_date, end_date]
+
+        Category columns come back as codes; see `self.vocab[column]`.
+        """
+        columns = list(columns or BOOKING_COLUMNS)
+        unknown = [c for c in columns if c not in BOOKING_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+
+        query = f"""
+            SELECT {', '.join(BOOKING_COLUMNS[c][0] for c in columns)}
+            FROM bookings b
+            LEFT JOIN vehicles v ON b.vehicle_id = v.vehicle_id
+        """
+        conditions, params = [], []
+        if start_date:
+            conditions.append("b.entry_time >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("b.entry_time < ?")
+            params.append((datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        kinds = [BOOKING_COLUMNS[c][1] for c in columns]
+        for column, kind in zip(columns, kinds):
+            if kind == 'category':
+                self.vocab.setdefault(column, Vocabulary())
+
+        cursor = self.conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                count = len(rows)
+                chunk = {}
+                for column, kind, values in zip(columns, kinds, zip(*rows)):
+                    if kind in ('int', 'epoch'):
+                        chunk[column] = np.fromiter(values, dtype=np.int64, count=count)
+                    elif kind == 'float':
+                        chunk[column] = np.array(values, dtype=np.float64)
+                    else:
+                        chunk[column] = self.vocab[column].encode(values)
+                del rows
+                yield chunk
+        finally:
+            cursor.close()
+
+
+# ---------------------------------------------------------------------------
+# Incremental aggregators: update() once per chunk, result() at the end.
+# State is sized by the number of periods/bins/users, never by bookings.
+# ---------------------------------------------------------------------------
+
+def _period_index(epochs: np.ndarray, period: str) -> np.ndarray:
+    return epochs.astype('datetime64[s]').astype(f'datetime64[{PERIODS[period]}]').astype(np.int64)
+
+
+def _period_label(index: int, period: str) -> str:
+    value = np.datetime64(int(index), PERIODS[period])
+    if period == 'week':
+        # numpy weeks start on Thursday (the epoch); label by that date
+        return str(value.astype('datetime64[D]'))
+    return str(value)
+
+
+def _stay_end(chunk: Dict[str, np.ndarray]) -> np.ndarray:
+    """exit_time, or checkout_time for desk/gate checkouts that never set it"""
+    return np.where(chunk['exit'] != NULL_EPOCH, chunk['exit'], chunk['checkout'])
+
+
+class RevenueByPeriod:
+    """Completed bookings, revenue and parked hours per day/week/month/year of exit"""
+
+    columns = ('exit', 'checkout', 'total_amount', 'duration_hours', 'booking_status')
+
+    def __init__(self, reader: ColumnarReader, period: str = 'month'):
+        if period not in PERIODS:
+            raise ValueError(f"period must be one of {sorted(PERIODS)}")
+        self.reader = reader
+        self.period = period
+        self.totals: Dict[int, np.ndarray] = {}
+
+    def update(self, chunk: Dict[str, np.ndarray]):
+        completed = chunk['booking_status'] == self.reader.vocab['booking_status'].code('completed')
+        ended = _stay_end(chunk)
+        mask = completed & (ended != NULL_EPOCH)
+        if not mask.any():
+            return
+
+        keys, inverse = np.unique(_period_index(ended[mask], self.period), return_inverse=True)
+        bookings = np.bincount(inverse, minlength=len(keys))
+        revenue = np.bincount(inverse, weights=np.nan_to_num(chunk['total_amount'][mask]), minlength=len(keys))
+        hours = np.bincount(inverse, weights=np.nan_to_num(chunk['duration_hours'][mask]), minlength=len(keys))
+
+        for i, key in enumerate(keys.tolist()):
+            row = np.array([bookings[i], revenue[i], hours[i]])
+            if key in self.totals:
+                self.totals[key] += row
+            else:
+                self.totals[key] = row
+
+    def result(self) -> List[Dict]:
+        return [{
+            'period': _period_label(key, self.period),
+            'bookings': int(values[0]),
+            'revenue': round(float(values[1]), 2),
+            'hours': round(float(values[2]), 2),
+        } for key, values in sorted(self.totals.items())]
+
+
+class DurationDistribution:
+    """Stay lengths: per-minute histogram up to `max_hours`, so quantiles are exact to the minute"""
+
+    columns = ('entry', 'exit', 'checkout', 'duration_hours', 'booking_status')
+
+    def __init__(self, reader: ColumnarReader, max_hours: int = 48,
+                 edges: Sequence[float] = (0, 0.5, 1, 2, 3, 4, 6, 8, 12, 24)):
+        self.reader = reader
+        self.max_minutes = max_hours * 60
+        self.minutes = np.zeros(self.max_minutes + 1, dtype=np.int64)  # last bin = overflow
+        self.edges = list(edges)
+        self.count = 0
+        self.total_hours = 0.0
+        self.max_hours_seen = 0.0
+
+    def update(self, chunk: Dict[str, np.ndarray]):
+        completed = chunk['booking_status'] == self.reader.vocab['booking_status'].code('completed')
+        hours = chunk['duration_hours'][completed]
+        # Fall back to exit - entry where the duration was never stored
+        entry, exit_ = chunk['entry'][completed], _stay_end(chunk)[completed]
+        derive = np.isnan(hours) & (entry != NULL_EPOCH) & (exit_ != NULL_EPOCH)
+        hours = hours.copy()
+        hours[derive] = (exit_[derive] - entry[derive]) / 3600
+        hours = hours[~np.isnan(hours) & (hours >= 0)]
+        if not len(hours):
+            return
+
+        minutes = np.minimum((hours * 60).astype(np.int64), self.max_minutes)
+        self.minutes += np.bincount(minutes, minlength=self.max_minutes + 1)
+        self.count += len(hours)
+        self.total_hours += float(hours.sum())
+        self.max_hours_seen = max(self.max_hours_seen, float(hours.max()))
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        minute = int(np.searchsorted(np.cumsum(self.minutes), q * self.count, side='left'))
+        return round(minute / 60, 2)
+
+    def result(self) -> Dict:
+        minute_edges = [int(edge * 60) for edge in self.edges] + [self.max_minutes + 1]
+        cumulative = np.concatenate([[0], np.cumsum(self.minutes)])
+        buckets = []
+        for i, edge in enumerate(self.edges):
+            label = f"{edge}-{self.edges[i + 1]}h" if i + 1 < len(self.edges) else f"{edge}h+"
+            buckets.append({'range': label,
+                            'count': int(cumulative[minute_edges[i + 1]] - cumulative[minute_edges[i]])})
+        return {
+            'count': self.count,
+            'mean_hours': round(self.total_hours / self.count, 2) if self.count else None,
+            'median_hours': self.quantile(0.5),
+            'p90_hours': self.quantile(0.9),
+            'max_hours': round(self.max_hours_seen, 2),
+            'histogram': buckets,
+        }
+
+
+class UserCohorts:
+    """
+    Users grouped by the month of their first booking, with monthly activity
+
+    Keeps one first-month per user and one packed (user, month) key per
+    active user-month, merged chunk by chunk.
+    """
+
+    columns = ('user_id', 'entry')
+
+    def __init__(self, reader: ColumnarReader = None):
+        self.first_month: Dict[int, int] = {}
+        self.active = np.empty(0, dtype=np.int64)
+
+    def update(self, chunk: Dict[str, np.ndarray]):
+        valid = (chunk['user_id'] != NULL_INT) & (chunk['entry'] != NULL_EPOCH)
+        users = chunk['user_id'][valid]
+        months = _period_index(chunk['entry'][valid], 'month')
+        if not len(users):
+            return
+
+        # Earliest month per user within the chunk, then merge
+        order = np.lexsort((months, users))
+        users, months = users[order], months[order]
+        first = np.concatenate([[True], users[1:] != users[:-1]])
+        for user, month in zip(users[first].tolist(), months[first].tolist()):
+            if month < self.first_month.get(user, month + 1):
+                self.first_month[user] = month
+
+        self.active = np.union1d(self.active, (users << 20) | months)
+
+    def result(self) -> List[Dict]:
+        """One row per cohort: size and active users by months since joining"""
+        users = self.active >> 20
+        months = self.active & ((1 << 20) - 1)
+        cohorts = np.fromiter((self.first_month[u] for u in users.tolist()), dtype=np.int64, count=len(users))
+        offsets = months - cohorts
+
+        rows = []
+        for cohort in np.unique(cohorts).tolist():
+            in_cohort = cohorts == cohort
+            active = np.bincount(offsets[in_cohort])
+            rows.append({
+                'cohort': _period_label(cohort, 'month'),
+                'users': int(active[0]),
+                'active_by_month': active.tolist(),
+            })
+        return rows
+
+
+AGGREGATORS = {
+    'revenue': RevenueByPeriod,
+    'durations': DurationDistribution,
+    'cohorts': UserCohorts,
+}
+
+
+def run_aggregations(aggregators: Dict[str, object], reader: ColumnarReader,
+                     start_date: str = None, end_date: str = None) -> Dict:
+    """
+    Feed every aggregator from a single streaming pass
+
+    Returns:
+        dict: each aggregator's result by name, plus 'stats' (rows, chunks, seconds)
+    """
+    columns = sorted({c for agg in aggregators.values() for c in agg.columns})
+    started = time.perf_counter()
+    rows = chunks = 0
+    for chunk in reader.iter_chunks(columns, start_date, end_date):
+        for aggregator in aggregators.values():
+            aggregator.update(chunk)
+        rows += len(next(iter(chunk.values())))
+        chunks += 1
+
+    results = {name: aggregator.result() for name, aggregator in aggregators.items()}
+    results['stats'] = {'rows': rows, 'chunks': chunks,
+                        'seconds': round(time.perf_counter() - started, 3)}
+    return results
+
+
+def history_summary(period: str = 'month', start_date: str = None, end_date: str = None,
+                    db_path: str = None, chunk_size: int = 50000) -> Dict:
+    """Revenue by period, duration distribution and user cohorts in one pass"""
+    reader = ColumnarReader(db_path, chunk_size)
+    try:
+        aggregators = {
+            'revenue': RevenueByPeriod(reader, period),
+            'durations': DurationDistribution(reader),
+            'cohorts': UserCohorts(reader),
+        }
+        return run_aggregations(aggregators, reader, start_date, end_date)
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream booking history through columnar aggregations")
+    parser.add_argument('--period', choices=sorted(PERIODS), default='month')
+    parser.add_argument('--start', help='First entry date, YYYY-MM-DD')
+    parser.add_argument('--end', help='Last entry date, YYYY-MM-DD')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    summary = history_summary(args.period, args.start, args.end, chunk_size=args.chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+
+    for row in summary['revenue']:
+        print(f"{row['period']:>12}  {row['bookings']:>7}  ₹{row['revenue']:>12,.2f}  {row['hours']:>9,.1f}h")
+    print(summary['durations'])
+    print(f"{len(summary['cohorts'])} cohorts")
+    stats = summary['stats']
+    print(f"✓ {stats['rows']} rows in {stats['chunks']} chunks, {stats['seconds']}s, "
+          f"peak {peak / 1e6:.1f} MB")
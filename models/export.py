@@ -0,0 +1,279 @@
+"""Streaming Bookings Export to CSV, Gzip CSV and Parquet"""
+
+import argparse
+import csv
+import gzip
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from database.db_manager import get_db_manager
+
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'outputs', 'reports')
+
+# Output column -> SQL expression
+EXPORT_COLUMNS = {
+    'booking_id': 'b.booking_id',
+    'ticket_number': 'b.ticket_number',
+    'booking_date': 'b.booking_date',
+    'entry_time': 'b.entry_time',
+    'exit_time': 'b.exit_time',
+    'duration_hours': 'b.duration_hours',
+    'total_amount': 'b.total_amount',
+    'payment_status': 'b.payment_status',
+    'booking_status': 'b.booking_status',
+    'user_name': 'u.name',
+    'email': 'u.email',
+    'phone': 'u.phone',
+    'vehicle_number': 'v.vehicle_number',
+    'vehicle_type': 'v.vehicle_type',
+    'slot_number': 's.slot_number',
+    'floor': 's.floor',
+    'section': 's.section',
+}
+
+# What export_bookings_to_csv has always written
+DEFAULT_COLUMNS = [name for name in EXPORT_COLUMNS if name != 'booking_id']
+
+FORMATS = {'csv': '.csv', 'csv.gz': '.csv.gz', 'parquet': '.parquet'}
+
+INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_bookings_booking_date ON bookings(booking_date)"
+
+
+class BookingExporter:
+    """
+    Export joined booking rows without materializing them
+
+    Rows are pulled from a parameterized range query with fetchmany and
+    written chunk by chunk, so memory stays flat however long the history
+    is. Parquet output needs pyarrow and is written one row group per chunk.
+
+    Incremental exports keep two watermarks per name: the highest booking_id
+    written and the analytics_dirty_log seq they are current with. Bookings
+    that changed since then (the rollup triggers log their entry day) are
+    written again, so a consumer should upsert on ticket_number/booking_id.
+    Pending bookings have no entry day yet and are only written once.
+    """
+
+    def __init__(self, db_path: str = None, chunk_size: int = 5000):
+        self.db_path = db_path or get_db_manager().db_path
+        self.chunk_size = chunk_size
+        # The rollup's triggers maintain the dirty log incremental exports follow
+        from models.analytics_rollup import get_analytics_rollup
+        get_analytics_rollup()
+
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute(INDEX_SQL)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS analytics_watermarks (name TEXT PRIMARY KEY, value TEXT)
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _get_value(self, key: str) -> Optional[int]:
+        row = self.conn.execute("SELECT value FROM analytics_watermarks WHERE name = ?",
+                                (key,)).fetchone()
+        return int(row[0]) if row else None
+
+    def get_watermark(self, name: str) -> int:
+        return self._get_value(f"export:{name}") or 0
+
+    def _set_watermark(self, name: str, value: int, seq: int):
+        # dirty_seq:* also keeps the rollup from pruning log entries this export still needs
+        self.conn.executemany("""
+            INSERT INTO analytics_watermarks (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = excluded.value
+        """, [(f"export:{name}", str(value)), (f"dirty_seq:export:{name}", str(seq))])
+        self.conn.commit()
+
+    def _changed_since(self, name: str):
+        """
+        (after_id, seq_from, seq_to) for an incremental export
+
+        seq_from is None when there is nothing to re-export: a first run, or a
+        log already pruned past this export, where everything is written again.
+        """
+        seq_to = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM analytics_dirty_log").fetchone()[0]
+        seq_from = self._get_value(f"dirty_seq:export:{name}")
+        if seq_from is None:
+            return self.get_watermark(name), None, seq_to
+        oldest = self.conn.execute("SELECT MIN(seq) FROM analytics_dirty_log").fetchone()[0]
+        if oldest is not None and oldest > seq_from + 1:
+            print(f"⚠ Dirty log pruned past export '{name}', exporting everything")
+            return 0, None, seq_to
+        return self.get_watermark(name), seq_from, seq_to
+
+    def iter_chunks(self, columns: Sequence[str], start_date: str = None, end_date: str = None,
+                    after_id: int = None, seq_range: tuple = None) -> Iterator[List[tuple]]:
+        """
+        Yield lists of row tuples, `chunk_size` at a time
+
+        With after_id, only newer bookings are selected, plus those whose
+        entry day was logged in analytics_dirty_log within seq_range
+        (exclusive start, inclusive end). booking_id is always selected last
+        so callers can track the watermark.
+        """
+        select = ', '.join(f"{EXPORT_COLUMNS[c]} AS {c}" for c in columns)
+        query = f"""
+            SELECT {select}, b.booking_id AS _booking_id
+            FROM bookings b
+            JOIN users u ON b.user_id = u.user_id
+            JOIN vehicles v ON b.vehicle_id = v.vehicle_id
+            JOIN parking_slots s ON b.slot_id = s.slot_id
+        """
+        conditions, params = [], []
+        if start_date:
+            conditions.append("b.booking_date >= ?")
+            params.append(start_date)
+        if end_date:
+            # Inclusive end date; a half-open range keeps the index usable
+            conditions.append("b.booking_date < ?")
+            params.append((datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+        if after_id is not None and seq_range and seq_range[0] < seq_range[1]:
+            conditions.append("""(b.booking_id > ? OR DATE(b.entry_time) IN (
+                SELECT day_from FROM analytics_dirty_log WHERE seq > ? AND seq <= ?))""")
+            params.extend([after_id, *seq_range])
+        elif after_id is not None:
+            conditions.append("b.booking_id > ?")
+            params.append(after_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY b.booking_id" if after_id is not None else " ORDER BY b.booking_date DESC, b.booking_id DESC"
+
+        cursor = self.conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def export(self, path: str = None, fmt: str = 'csv', columns: Sequence[str] = None,
+               start_date: str = None, end_date: str = None,
+               incremental: str = None) -> Optional[Dict]:
+        """
+        Stream bookings to a file
+
+        Args:
+            path: Output file (default outputs/reports/bookings_report_<stamp><ext>)
+            fmt: 'csv', 'csv.gz' or 'parquet'
+            columns: Subset of EXPORT_COLUMNS (default: the classic report columns)
+            start_date, end_date: Inclusive booking_date range, YYYY-MM-DD
+            incremental: Watermark name; only bookings added or changed since
+                         the last export under that name are written. The
+                         watermark advances once the file is complete, and
+                         never on a date-limited run, which would skip
+                         changes outside its range
+
+        Returns:
+            dict: path, rows, seconds and rows_per_sec, or None if nothing matched
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {sorted(FORMATS)}")
+        columns = list(columns or DEFAULT_COLUMNS)
+        unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+
+        if path is None:
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            path = os.path.join(REPORT_DIR, f"bookings_report_{stamp}{FORMATS[fmt]}")
+
+        after_id, seq_range = None, None
+        if incremental:
+            after_id, seq_from, seq_to = self._changed_since(incremental)
+            seq_range = (seq_from, seq_to) if seq_from is not None else None
+        chunks = self.iter_chunks(columns, start_date, end_date, after_id, seq_range)
+
+        started = time.perf_counter()
+        writer = self._parquet_writer if fmt == 'parquet' else self._csv_writer
+        rows, max_id = writer(path, columns, chunks, compress=(fmt == 'csv.gz'))
+        elapsed = time.perf_counter() - started
+
+        if incremental and not (start_date or end_date):
+            self._set_watermark(incremental, max(max_id, after_id), seq_to)
+
+        if rows == 0:
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+
+        return {
+            'path': path,
+            'rows': rows,
+            'seconds': round(elapsed, 3),
+            'rows_per_sec': round(rows / elapsed, 1) if elapsed else 0.0,
+        }
+
+    @staticmethod
+    def _csv_writer(path: str, columns: List[str], chunks, compress: bool = False):
+        rows, max_id = 0, 0
+        opener = gzip.open if compress else open
+        with opener(path, 'wt', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for chunk in chunks:
+                writer.writerows(row[:-1] for row in chunk)
+                rows += len(chunk)
+                max_id = max(max_id, max(row[-1] for row in chunk))
+        return rows, max_id
+
+    @staticmethod
+    def _parquet_writer(path: str, columns: List[str], chunks, compress: bool = False):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+        rows, max_id = 0, 0
+        writer = None
+        try:
+            for chunk in chunks:
+                values = list(zip(*chunk))
+                table = pa.table({name: pa.array(values[i]) for i, name in enumerate(columns)})
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                elif table.schema != writer.schema:
+                    # A column that was all-NULL in the first chunk is typed later
+                    table = table.cast(writer.schema, safe=False)
+                writer.write_table(table)
+                rows += len(chunk)
+                max_id = max(max_id, max(values[-1]))
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows, max_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export bookings")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--output')
+    parser.add_argument('--columns', nargs='*', choices=list(EXPORT_COLUMNS))
+    parser.add_argument('--start', help='First booking_date, YYYY-MM-DD')
+    parser.add_argument('--end', help='Last booking_date, YYYY-MM-DD')
+    parser.add_argument('--since', metavar='NAME', help='Only bookings added or changed since the last export NAME')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    exporter = BookingExporter(chunk_size=args.chunk_size)
+    try:
+        result = exporter.export(args.output, args.format, args.columns, args.start, args.end, args.since)
+    finally:
+        exporter.close()
+
+    if result:
+        print(f"✓ Exported {result['rows']} rows in {result['seconds']}s "
+              f"({result['rows_per_sec']} rows/s) -> {result['path']}")
+    else:
+        print("No bookings to export")
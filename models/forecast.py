@@ -0,0 +1,303 @@
+"""Next-Day Occupancy and Arrival Forecasts per Floor and Vehicle Type"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.occupancy import get_occupancy_timeline
+
+
+HOUR = 3600
+EPOCH = datetime(1970, 1, 1)
+WEEK_HOURS = 168
+TARGETS = ('occupancy', 'arrivals')
+
+# Epoch 0 was a Thursday; shift so hour-of-week 0 is Monday 00:00
+_MONDAY_OFFSET_HOURS = 72
+
+
+def hour_of_week(epoch_hours: np.ndarray) -> np.ndarray:
+    return (epoch_hours + _MONDAY_OFFSET_HOURS) % WEEK_HOURS
+
+
+def _floor_hour(value: datetime = None) -> int:
+    """Epoch hour of a naive local time, on the timeline's strftime('%s') scale"""
+    return int(((value or datetime.now()) - EPOCH).total_seconds() // HOUR)
+
+
+class DemandForecaster:
+    """
+    Seasonal-baseline forecaster over the occupancy timeline
+
+    For every group and target the state is a 168-slot hour-of-week
+    baseline (an exponentially weighted average of that hour across past
+    weeks) plus a short ring of recent residuals. A forecast is the baseline
+    for each future hour plus the recent mean residual, damped with the
+    horizon. Each completed hour is folded in with one vectorised update, so
+    refitting costs only the hours since the last fit.
+    """
+
+    def __init__(self, group_by: Sequence[str] = ('floor', 'vehicle_type'), weeks: int = 8,
+                 alpha: float = 0.3, trend_hours: int = 6, damping: float = 0.85):
+        self.timeline = get_occupancy_timeline()
+        self.group_by = list(group_by)
+        self.weeks = weeks
+        self.alpha = alpha
+        self.trend_hours = trend_hours
+        self.damping = damping
+
+        self.keys: List[Tuple] = []
+        self.capacity = np.empty(0)
+        self.baseline = np.empty((0, len(TARGETS), WEEK_HOURS))
+        self.seen = np.zeros(WEEK_HOURS, dtype=bool)
+        self.residuals = np.empty((0, len(TARGETS), trend_hours))
+        self.residual_count = 0
+        self.fitted_through: Optional[int] = None  # first epoch hour not yet consumed
+        self.last_fit = {'hours': 0, 'ms': 0.0, 'full': False}
+        self._forecast_cache: Dict[Tuple, List[Dict]] = {}
+
+    # -- data --------------------------------------------------------------
+
+    def load_actuals(self, first_hour: int, last_hour: int) -> Tuple[List[Tuple], np.ndarray, np.ndarray]:
+        """
+        Hourly actuals for [first_hour, last_hour) in epoch hours
+
+        Returns:
+            tuple: (group keys, capacity per group, array of shape
+                    (groups, len(TARGETS), hours))
+        """
+        start = EPOCH + timedelta(hours=first_hour)
+        end = EPOCH + timedelta(hours=last_hour)
+        df = self.timeline.series(start, end, HOUR, self.group_by)
+
+        hours = last_hour - first_hour
+        grouped = df.groupby(self.group_by, sort=True) if self.group_by else [((), df)]
+        keys, capacity, actuals = [], [], []
+        for key, frame in grouped:
+            key = key if isinstance(key, tuple) else (key,)
+            keys.append(tuple(value.item() if hasattr(value, 'item') else value for value in key))
+            capacity.append(frame['capacity'].iloc[0])
+            actuals.append(np.stack([frame['avg_occupied'].to_numpy(float)[:hours],
+                                     frame['arrivals'].to_numpy(float)[:hours]]))
+        return keys, np.array(capacity, dtype=float), np.array(actuals).reshape(len(keys), len(TARGETS), hours)
+
+    # -- fitting -----------------------------------------------------------
+
+    def _reset(self, keys: List[Tuple], capacity: np.ndarray):
+        self.keys = keys
+        self.capacity = capacity
+        self.baseline = np.zeros((len(keys), len(TARGETS), WEEK_HOURS))
+        self.seen = np.zeros(WEEK_HOURS, dtype=bool)
+        self.residuals = np.zeros((len(keys), len(TARGETS), self.trend_hours))
+        self.residual_count = 0
+
+    def consume(self, actuals: np.ndarray, first_hour: int):
+        """Fold consecutive hourly actuals (groups x targets x hours) into the model"""
+        slots = hour_of_week(np.arange(first_hour, first_hour + actuals.shape[2]))
+        for i, slot in enumerate(slots.tolist()):
+            observed = actuals[:, :, i]
+            if self.seen[slot]:
+                self.residuals[:, :, self.residual_count % self.trend_hours] = \
+                    observed - self.baseline[:, :, slot]
+                self.residual_count += 1
+                self.baseline[:, :, slot] += self.alpha * (observed - self.baseline[:, :, slot])
+            else:
+                self.baseline[:, :, slot] = observed
+                self.seen[slot] = True
+        self.fitted_through = first_hour + actuals.shape[2]
+        self._forecast_cache.clear()
+
+    def fit(self, end: datetime = None):
+        """Fit from scratch on the `weeks` weeks of complete hours before `end`"""
+        started = time.perf_counter()
+        last_hour = _floor_hour(end)
+        first_hour = last_hour - self.weeks * WEEK_HOURS
+        keys, capacity, actuals = self.load_actuals(first_hour, last_hour)
+        self._reset(keys, capacity)
+        self.consume(actuals, first_hour)
+        self.last_fit = {'hours': actuals.shape[2], 'ms': (time.perf_counter() - started) * 1000,
+                         'full': True}
+
+    def refit(self, now: datetime = None):
+        """
+        Fold in the hours completed since the last fit
+
+        A full fit happens the first time, after a long gap, or when a new
+        floor/vehicle type appears.
+        """
+        last_hour = _floor_hour(now)
+        if self.fitted_through is None or last_hour - self.fitted_through > self.weeks * WEEK_HOURS:
+            return self.fit(now)
+        if last_hour <= self.fitted_through:
+            return
+
+        started = time.perf_counter()
+        first_hour = self.fitted_through
+        keys, capacity, actuals = self.load_actuals(first_hour, last_hour)
+        if keys != self.keys:
+            return self.fit(now)
+        self.capacity = capacity
+        self.consume(actuals, first_hour)
+        self.last_fit = {'hours': actuals.shape[2], 'ms': (time.perf_counter() - started) * 1000,
+                         'full': False}
+
+    # -- forecasting -------------------------------------------------------
+
+    def predict(self, hours: int = 24) -> np.ndarray:
+        """Forecast array (groups x targets x hours) starting at fitted_through"""
+        slots = hour_of_week(np.arange(self.fitted_through, self.fitted_through + hours))
+        filled = min(self.residual_count, self.trend_hours)
+        level = self.residuals[:, :, :filled].mean(axis=2) if filled else np.zeros(self.baseline.shape[:2])
+        decay = self.damping ** np.arange(1, hours + 1)
+
+        predicted = self.baseline[:, :, slots] + level[:, :, None] * decay
+        predicted = np.maximum(predicted, 0.0)
+        predicted[:, 0, :] = np.minimum(predicted[:, 0, :], self.capacity[:, None])
+        return predicted
+
+    def forecast(self, hours: int = 24, now: datetime = None) -> List[Dict]:
+        """
+        Hourly forecasts per group for the next `hours` hours, served from memory
+
+        The model refits incrementally whenever an hour has completed.
+
+        Returns:
+            list: one dict per group and hour with time, the group columns,
+                  occupancy, occupancy_rate (percent) and arrivals
+        """
+        self.refit(now)
+        cache_key = (self.fitted_through, hours)
+        cached = self._forecast_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        predicted = self.predict(hours)
+        times = [(EPOCH + timedelta(hours=self.fitted_through + h)).strftime('%Y-%m-%d %H:%M')
+                 for h in range(hours)]
+        rows = []
+        for g, key in enumerate(self.keys):
+            capacity = float(self.capacity[g])
+            for h, label in enumerate(times):
+                occupancy = float(predicted[g, 0, h])
+                row = {'time': label}
+                row.update(zip(self.group_by, key))
+                row.update({
+                    'occupancy': round(occupancy, 2),
+                    'occupancy_rate': round(occupancy / capacity * 100, 1) if capacity else 0.0,
+                    'arrivals': round(float(predicted[g, 1, h]), 2),
+                })
+                rows.append(row)
+
+        self._forecast_cache = {cache_key: rows}
+        return rows
+
+    # -- evaluation --------------------------------------------------------
+
+    def backtest(self, days: int = 7, horizon: int = 24, end: datetime = None) -> Dict:
+        """
+        Replay the last `days` days: forecast `horizon` hours, fold in a day, repeat
+
+        Actuals are loaded once and fed through consume(), exactly as hourly
+        refits would see them. A seasonal-naive forecast (same hour last
+        week) is scored alongside for reference.
+
+        Returns:
+            dict: per target MAE, RMSE and WAPE (percent) for the model and
+                  the naive baseline, plus fit_ms and mean refit_ms
+        """
+        last_hour = _floor_hour(end)
+        test_start = last_hour - days * 24
+        first_hour = test_start - self.weeks * WEEK_HOURS
+        keys, capacity, actuals = self.load_actuals(first_hour, last_hour)
+        history = test_start - first_hour
+
+        started = time.perf_counter()
+        self._reset(keys, capacity)
+        self.consume(actuals[:, :, :history], first_hour)
+        fit_ms = (time.perf_counter() - started) * 1000
+
+        errors = {target: {'model': [], 'naive': [], 'actual': []} for target in TARGETS}
+        refit_ms = []
+        for origin in range(test_start, last_hour - horizon + 1, 24):
+            offset = origin - first_hour
+            predicted = self.predict(horizon)
+            observed = actuals[:, :, offset:offset + horizon]
+            naive = actuals[:, :, offset - WEEK_HOURS:offset - WEEK_HOURS + horizon]
+            for t, target in enumerate(TARGETS):
+                errors[target]['model'].append((predicted[:, t] - observed[:, t]).ravel())
+                errors[target]['naive'].append((naive[:, t] - observed[:, t]).ravel())
+                errors[target]['actual'].append(observed[:, t].ravel())
+
+            started = time.perf_counter()
+            self.consume(actuals[:, :, offset:offset + 24], origin)
+            refit_ms.append((time.perf_counter() - started) * 1000)
+
+        def score(diff: np.ndarray, actual: np.ndarray) -> Dict:
+            total = np.abs(actual).sum()
+            return {
+                'mae': round(float(np.abs(diff).mean()), 3),
+                'rmse': round(float(np.sqrt((diff ** 2).mean())), 3),
+                'wape': round(float(np.abs(diff).sum() / total * 100), 1) if total else None,
+            }
+
+        metrics = {}
+        for target, parts in errors.items():
+            actual = np.concatenate(parts['actual'])
+            metrics[target] = {
+                'model': score(np.concatenate(parts['model']), actual),
+                'naive': score(np.concatenate(parts['naive']), actual),
+            }
+
+        # The replay moved the state; start clean on the next forecast()
+        self.fitted_through = None
+        return {
+            'groups': len(keys),
+            'days': days,
+            'horizon': horizon,
+            'metrics': metrics,
+            'fit_ms': round(fit_ms, 2),
+            'refit_ms': round(float(np.mean(refit_ms)), 3) if refit_ms else 0.0,
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            'groups': len(self.keys),
+            'fitted_through': (EPOCH + timedelta(hours=self.fitted_through)).isoformat()
+            if self.fitted_through is not None else None,
+            'last_fit_hours': self.last_fit['hours'],
+            'last_fit_ms': round(self.last_fit['ms'], 2),
+            'last_fit_full': self.last_fit['full'],
+        }
+
+
+_forecaster_instance: Optional[DemandForecaster] = None
+
+def get_demand_forecaster() -> DemandForecaster:
+    global _forecaster_instance
+    if _forecaster_instance is None:
+        _forecaster_instance = DemandForecaster()
+    return _forecaster_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast occupancy and arrivals")
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--end', help='Pretend "now" is this time, e.g. 2025-12-20 18:00')
+    parser.add_argument('--backtest', type=int, metavar='DAYS', help='Backtest over the last DAYS days')
+    parser.add_argument('--weeks', type=int, default=8)
+    args = parser.parse_args()
+
+    end = datetime.fromisoformat(args.end) if args.end else None
+    forecaster = DemandForecaster(weeks=args.weeks)
+    if args.backtest:
+        result = forecaster.backtest(args.backtest, args.hours, end)
+        for target, scores in result['metrics'].items():
+            print(f"{target:>10}  model {scores['model']}  naive {scores['naive']}")
+        print(f"{result['groups']} groups, fit {result['fit_ms']}ms, refit {result['refit_ms']}ms per day")
+    else:
+        for row in forecaster.forecast(args.hours, end):
+            print(row)
+        print(forecaster.get_stats())
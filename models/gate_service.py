@@ -0,0 +1,353 @@
+"""Automatic ANPR Gate Check-in/Check-out"""
+
+import sqlite3
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, List, Callable
+from database.db_manager import get_db_manager
+from utils.plate_index import get_plate_index
+
+
+class GateService:
+    """
+    Headless gate controller: plate read -> vehicle -> booking -> barrier
+
+    A plate must be read `min_confirmations` times within
+    `confirm_window_seconds` before the gate acts, and a vehicle that was
+    just processed is ignored for `cooldown_seconds` so a car waiting under
+    the camera is not checked in twice.
+
+    With an `offline_verifier` (an OfflineGateVerifier for the same mode),
+    a database error does not stop the gate: the booking is checked against
+    the verifier's snapshot and journaled, and the journal is synced once
+    the database answers again.
+    """
+
+    def __init__(self, mode: str = 'entry', detector=None, plate_index=None,
+                 min_confirmations: int = 2, cooldown_seconds: float = 30.0,
+                 max_distance: float = 1.5, open_barrier: Callable = None,
+                 confirm_window_seconds: float = 10.0, offline_verifier=None,
+                 history_size: int = 1000):
+        if mode not in ('entry', 'exit'):
+            raise ValueError("mode must be 'entry' or 'exit'")
+        if offline_verifier is not None and offline_verifier.mode != mode:
+            raise ValueError("offline_verifier must use the same mode as the gate")
+
+        self.mode = mode
+        self.db = get_db_manager()
+        self.detector = detector
+        self.plate_index = plate_index or get_plate_index()
+        self.min_confirmations = min_confirmations
+        self.cooldown_seconds = cooldown_seconds
+        self.confirm_window_seconds = confirm_window_seconds
+        self.max_distance = max_distance
+        self.open_barrier = open_barrier
+        self.offline_verifier = offline_verifier
+        self.listeners: List[Callable] = []
+
+        self.events = deque(maxlen=history_size)   # most recent gate events
+        self._reads: Dict = {}    # key -> (count, first_seen)
+        self._recent: Dict = {}   # key -> time the gate last acted on it
+        self._last_prune = time.monotonic()
+
+    def _get_detector(self):
+        if self.detector is None:
+            from utils.license_plate_detector import LicensePlateDetector
+            # No read cache: a near-match could act on another car's plate
+            self.detector = LicensePlateDetector(cache_size=0)
+        return self.detector
+
+    def process_frame(self, frame, captured_at: float = None) -> Optional[Dict]:
+        """Run plate detection on a frame and act on confirmed reads"""
+        captured_at = captured_at or time.perf_counter()
+        plate_text, _ = self._get_detector().detect_from_frame(frame)
+        detect_ms = (time.perf_counter() - captured_at) * 1000
+
+        if not plate_text:
+            return None
+
+        return self.handle_plate(plate_text, started_at=captured_at, detect_ms=detect_ms)
+
+    def handle_plate(self, plate_text: str, started_at: float = None,
+                     detect_ms: float = 0.0) -> Optional[Dict]:
+        """
+        Resolve a plate reading and check the matching booking in or out
+
+        Returns:
+            dict: Gate event, or None while the read is still unconfirmed
+                  or the vehicle is cooling down
+        """
+        started_at = started_at or time.perf_counter()
+        now = time.monotonic()
+
+        t0 = time.perf_counter()
+        vehicle = self.plate_index.best_match(plate_text, max_distance=self.max_distance)
+        match_ms = (time.perf_counter() - t0) * 1000
+
+        self._prune(now)
+        key = vehicle['vehicle_id'] if vehicle else plate_text
+        last_seen = self._recent.get(key)
+        if last_seen is not None and now - last_seen < self.cooldown_seconds:
+            return None
+
+        # A read older than the window no longer confirms anything
+        count, first_seen = self._reads.get(key, (0, now))
+        if now - first_seen > self.confirm_window_seconds:
+            count, first_seen = 0, now
+        count += 1
+        self._reads[key] = (count, first_seen)
+        if count < self.min_confirmations:
+            return None
+        self._reads.pop(key, None)
+        self._recent[key] = now
+
+        event = {
+            'mode': self.mode,
+            'plate_read': plate_text,
+            'vehicle_id': vehicle['vehicle_id'] if vehicle else None,
+            'vehicle_number': vehicle['vehicle_number'] if vehicle else None,
+            'match_distance': vehicle['distance'] if vehicle else None,
+            'booking_id': None,
+            'ticket_number': None,
+            'action': 'rejected',
+            'reason': None,
+            'barrier_opened': False,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+        t0 = time.perf_counter()
+        if vehicle is None:
+            event['reason'] = 'Unregistered vehicle'
+            self._log_event(event)
+        else:
+            try:
+                self._sync_offline()
+                self._apply_booking(vehicle, event)
+                if event['action'] == 'checkout':
+                    from models.artifact_store import get_artifact_store
+                    get_artifact_store().release('booking', event['booking_id'])
+            except sqlite3.Error as e:
+                if self.offline_verifier is None:
+                    event['action'] = 'error'
+                    event['reason'] = str(e)
+                else:
+                    self._apply_offline(vehicle, event)
+            except Exception as e:
+                event['action'] = 'error'
+                event['reason'] = str(e)
+        db_ms = (time.perf_counter() - t0) * 1000
+
+        if event['action'] in ('checkin', 'checkout'):
+            if self.open_barrier:
+                self.open_barrier(event)
+            event['barrier_opened'] = True
+
+        event['timings_ms'] = {
+            'detect': round(detect_ms, 2),
+            'match': round(match_ms, 2),
+            'db': round(db_ms, 2),
+            'total': round((time.perf_counter() - started_at) * 1000, 2),
+        }
+        self.events.append(event)
+
+        for listener in self.listeners:
+            listener(event)
+
+        return event
+
+    def _prune(self, now: float):
+        """Drop expired partial reads and cooldowns, at most once per window"""
+        if now - self._last_prune < self.confirm_window_seconds:
+            return
+        self._last_prune = now
+        self._reads = {key: read for key, read in self._reads.items()
+                       if now - read[1] <= self.confirm_window_seconds}
+        self._recent = {key: seen for key, seen in self._recent.items()
+                        if now - seen < self.cooldown_seconds}
+
+    def _apply_booking(self, vehicle: Dict, event: Dict):
+        """Look up the vehicle's live booking and update it in one transaction"""
+        with self.db.transaction() as cursor:
+            cursor.execute("""
+                SELECT booking_id, ticket_number, user_id, slot_id, booking_status,
+                       checkin_deadline, checkin_time
+                FROM bookings
+                WHERE vehicle_id = ? AND booking_status IN ('pending', 'active')
+                ORDER BY booking_id DESC
+                LIMIT 1
+            """, (vehicle['vehicle_id'],))
+            booking = cursor.fetchone()
+
+            if booking:
+                event['booking_id'] = booking['booking_id']
+                event['ticket_number'] = booking['ticket_number']
+
+            if self.mode == 'entry':
+                self._check_in(cursor, booking, event)
+            else:
+                self._check_out(cursor, booking, event)
+
+            self._insert_log(cursor, event, booking['user_id'] if booking else None)
+
+    def _apply_offline(self, vehicle: Dict, event: Dict):
+        """Check the vehicle against the offline snapshot while the database is down"""
+        self.offline_verifier.reload()
+        result = self.offline_verifier.verify_vehicle(vehicle['vehicle_id'])
+        event['booking_id'] = result['booking_id']
+        event['offline'] = True
+        if result['accepted']:
+            event['action'] = result['action']
+        else:
+            event['reason'] = result['reason']
+
+    def _sync_offline(self):
+        """Replay offline events before touching the database again"""
+        if self.offline_verifier is not None and self.offline_verifier.has_pending():
+            synced = self.offline_verifier.sync(self.db)
+            print(f"✓ Synced offline gate events: {synced}")
+
+    def _check_in(self, cursor, booking, event: Dict):
+        if not booking or booking['booking_status'] != 'pending':
+            event['reason'] = 'No pending booking for vehicle'
+            return
+
+        deadline = booking['checkin_deadline']
+        if deadline:
+            deadline = datetime.fromisoformat(deadline) if isinstance(deadline, str) else deadline
+            # Convert UTC to local time if timezone is present
+            if deadline.tzinfo is not None:
+                deadline = deadline.astimezone().replace(tzinfo=None)
+            if datetime.now() > deadline:
+                event['reason'] = 'Check-in deadline passed'
+                return
+
+        cursor.execute("""
+            UPDATE bookings
+            SET booking_status = 'active', checkin_time = ?
+            WHERE booking_id = ? AND booking_status = 'pending'
+        """, (datetime.now().isoformat(), booking['booking_id']))
+        if cursor.rowcount != 1:
+            event['reason'] = 'Booking changed during check-in'
+            return
+
+        cursor.execute("UPDATE parking_slots SET status = 'occupied' WHERE slot_id = ?",
+                       (booking['slot_id'],))
+        event['action'] = 'checkin'
+
+    def _check_out(self, cursor, booking, event: Dict):
+        if not booking or booking['booking_status'] != 'active':
+            event['reason'] = 'No active booking for vehicle'
+            return
+
+        cursor.execute("""
+            UPDATE bookings
+            SET booking_status = 'completed', checkout_time = ?
+            WHERE booking_id = ? AND booking_status = 'active'
+        """, (datetime.now().isoformat(), booking['booking_id']))
+        if cursor.rowcount != 1:
+            event['reason'] = 'Booking changed during check-out'
+            return
+
+        cursor.execute("UPDATE parking_slots SET status = 'available' WHERE slot_id = ?",
+                       (booking['slot_id'],))
+        event['action'] = 'checkout'
+
+    def _insert_log(self, cursor, event: Dict, user_id: int = None):
+        description = (f"{event['action']} plate={event['plate_read']} "
+                       f"vehicle={event['vehicle_number']} ticket={event['ticket_number']}")
+        if event['reason']:
+            description += f" reason={event['reason']}"
+        cursor.execute("""
+            INSERT INTO system_logs (event_type, user_id, description)
+            VALUES (?, ?, ?)
+        """, (f"gate_{self.mode}", user_id, description))
+
+    def _log_event(self, event: Dict):
+        try:
+            with self.db.transaction() as cursor:
+                self._insert_log(cursor, event)
+        except Exception as e:
+            print(f"Gate log error: {e}")
+
+    def run(self, source=0, frame_skip: int = 3, max_events: int = None,
+            max_frames: int = None) -> List[Dict]:
+        """
+        Process a camera or a recorded video file until it ends
+
+        Args:
+            source: Camera index or path to a video file
+            frame_skip: Run detection on every Nth frame
+            max_events: Stop after this many gate events
+            max_frames: Stop after this many frames
+
+        Returns:
+            list: Gate events produced during the run
+        """
+        import cv2
+
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            print(f"Error: Could not open video source {source}")
+            return []
+
+        produced = []
+        frame_count = 0
+
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                frame_count += 1
+                if max_frames and frame_count > max_frames:
+                    break
+                if frame_count % frame_skip:
+                    continue
+
+                event = self.process_frame(frame, captured_at=time.perf_counter())
+                if event:
+                    produced.append(event)
+                    print(f"[{event['mode']}] {event['action']:<9} "
+                          f"{event['vehicle_number'] or event['plate_read']} "
+                          f"{event['timings_ms']['total']:.0f} ms"
+                          f"{' - ' + event['reason'] if event['reason'] else ''}")
+                    if max_events and len(produced) >= max_events:
+                        break
+        finally:
+            cap.release()
+
+        return produced
+
+    def get_timing_summary(self) -> Dict:
+        """Latency summary over the recent barrier-opening events kept in `events`"""
+        totals = sorted(e['timings_ms']['total'] for e in self.events if e['barrier_opened'])
+        if not totals:
+            return {'events': 0}
+
+        return {
+            'events': len(totals),
+            'avg_ms': round(sum(totals) / len(totals), 2),
+            'p50_ms': totals[len(totals) // 2],
+            'p95_ms': totals[min(len(totals) - 1, int(len(totals) * 0.95))],
+            'max_ms': totals[-1],
+            'under_1s': sum(1 for t in totals if t < 1000),
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m models.gate_service <video_file|camera_index> [entry|exit] [snapshot]")
+        sys.exit(1)
+
+    source = int(sys.argv[1]) if sys.argv[1].isdigit() else sys.argv[1]
+    mode = sys.argv[2] if len(sys.argv) > 2 else 'entry'
+    verifier = None
+    if len(sys.argv) > 3:
+        from models.gate_snapshot import OfflineGateVerifier
+        verifier = OfflineGateVerifier(sys.argv[3], mode)
+    gate = GateService(mode=mode, offline_verifier=verifier)
+    gate.run(source)
+    print(gate.get_timing_summary())
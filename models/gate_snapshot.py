@@ -0,0 +1,539 @@
+"""Offline Gate Verification Snapshots"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from database.db_manager import get_db_manager
+from utils.qr_payload import get_secret, parse_booking_qr, QRPayloadError
+
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'outputs', 'gate_snapshots')
+
+SNAPSHOT_MAGIC = b'PKSNAP'
+SNAPSHOT_FORMAT = 2   # 2 added vehicle ids; format 1 files still load
+
+# magic, format, version, created_at, count, bloom bits, bloom hashes, gate id
+_HEADER = struct.Struct('>6sHQdIIB32s')
+
+STATUS_CODES = {'pending': 0, 'active': 1}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+
+def ticket_hash(ticket_number: str) -> int:
+    """
+    Keyed 64-bit hash of a ticket number
+
+    Keyed with the QR signing secret, so a copied snapshot file cannot be
+    used to enumerate or confirm ticket numbers.
+    """
+    digest = hashlib.blake2b(ticket_number.encode('utf-8'), digest_size=8,
+                             key=get_secret()[:64]).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def _to_epoch(value) -> int:
+    if not value:
+        return 0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return int(value.timestamp())
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit hashes using double hashing"""
+
+    def __init__(self, capacity: int = 1000, error_rate: float = 0.001,
+                 num_bits: int = None, num_hashes: int = None, bits: np.ndarray = None):
+        capacity = max(1, capacity)
+        self.num_bits = num_bits or max(64, int(math.ceil(-capacity * math.log(error_rate) /
+                                                          math.log(2) ** 2)))
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        h1 = (hashes & 0xFFFFFFFF).astype(np.uint64)
+        h2 = (hashes >> np.uint64(32)).astype(np.uint64) | np.uint64(1)
+        rounds = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + rounds[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def add_many(self, hashes: np.ndarray):
+        positions = self._positions(np.asarray(hashes, dtype=np.uint64)).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         (1 << (positions & np.uint64(7))).astype(np.uint8))
+
+    def __contains__(self, value: int) -> bool:
+        h1, h2 = value & 0xFFFFFFFF, (value >> 32) | 1
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % self.num_bits
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class GateSnapshot:
+    """
+    In-memory set of valid tickets for one gate
+
+    Arrays are parallel and sorted by ticket hash, so a lookup is a Bloom
+    check followed by one binary search. Lookups by vehicle (for plate-read
+    gates) scan the vehicle id array.
+    """
+
+    def __init__(self, gate_id: str, version: int, created_at: float, bloom: BloomFilter,
+                 hashes: np.ndarray, booking_ids: np.ndarray, statuses: np.ndarray,
+                 deadlines: np.ndarray, vehicle_ids: np.ndarray = None):
+        self.gate_id = gate_id
+        self.version = version
+        self.created_at = created_at
+        self.bloom = bloom
+        self.hashes = hashes
+        self.booking_ids = booking_ids
+        self.statuses = statuses
+        self.deadlines = deadlines
+        self.vehicle_ids = vehicle_ids if vehicle_ids is not None else np.zeros(len(hashes), dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @classmethod
+    def from_rows(cls, gate_id: str, rows: List[Dict], error_rate: float = 0.001) -> 'GateSnapshot':
+        hashes = np.array([ticket_hash(r['ticket_number']) for r in rows], dtype=np.uint64)
+        order = np.argsort(hashes)
+
+        bloom = BloomFilter(capacity=len(rows), error_rate=error_rate)
+        if len(rows):
+            bloom.add_many(hashes)
+
+        return cls(
+            gate_id=gate_id,
+            version=time.time_ns() // 1000,
+            created_at=time.time(),
+            bloom=bloom,
+            hashes=hashes[order],
+            booking_ids=np.array([r['booking_id'] for r in rows], dtype=np.uint32)[order],
+            statuses=np.array([STATUS_CODES[r['booking_status']] for r in rows], dtype=np.uint8)[order],
+            deadlines=np.array([_to_epoch(r['checkin_deadline']) for r in rows], dtype=np.uint32)[order],
+            vehicle_ids=np.array([r['vehicle_id'] for r in rows], dtype=np.uint32)[order],
+        )
+
+    def lookup(self, ticket_number: str) -> Optional[Dict]:
+        value = ticket_hash(ticket_number)
+        if value not in self.bloom:
+            return None
+
+        index = int(np.searchsorted(self.hashes, np.uint64(value)))
+        if index >= len(self.hashes) or self.hashes[index] != value:
+            return None
+
+        return self._entry(index)
+
+    def lookup_vehicle(self, vehicle_id: int) -> Optional[Dict]:
+        """The vehicle's newest pending/active booking, like the gate's database query"""
+        matches = np.flatnonzero(self.vehicle_ids == vehicle_id)
+        if not len(matches):
+            return None
+        return self._entry(int(matches[np.argmax(self.booking_ids[matches])]))
+
+    def _entry(self, index: int) -> Dict:
+        return {
+            'booking_id': int(self.booking_ids[index]),
+            'status': STATUS_NAMES[int(self.statuses[index])],
+            'checkin_deadline': int(self.deadlines[index]) or None,
+        }
+
+    def save(self, path: str):
+        """Write atomically so a gate never loads a half-written snapshot"""
+        header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, self.version, self.created_at,
+                              len(self.hashes), self.bloom.num_bits, self.bloom.num_hashes,
+                              self.gate_id.encode('utf-8')[:32])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            for array in (self.bloom.bits, self.hashes, self.booking_ids,
+                          self.statuses, self.deadlines, self.vehicle_ids):
+                f.write(array.astype(array.dtype.newbyteorder('>')).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'GateSnapshot':
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        magic, fmt, version, created_at, count, num_bits, num_hashes, gate_id = \
+            _HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or fmt not in (1, SNAPSHOT_FORMAT):
+            raise ValueError(f"Not a gate snapshot (format {fmt}): {path}")
+
+        offset = _HEADER.size
+
+        def take(dtype, n):
+            nonlocal offset
+            array = np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder('>'),
+                                  count=n, offset=offset)
+            offset += array.nbytes
+            return array.astype(dtype)
+
+        bits = take(np.uint8, (num_bits + 7) // 8)
+        return cls(
+            gate_id=gate_id.rstrip(b'\0').decode('utf-8'),
+            version=version,
+            created_at=created_at,
+            bloom=BloomFilter(num_bits=num_bits, num_hashes=num_hashes, bits=bits),
+            hashes=take(np.uint64, count),
+            booking_ids=take(np.uint32, count),
+            statuses=take(np.uint8, count),
+            deadlines=take(np.uint32, count),
+            vehicle_ids=take(np.uint32, count) if fmt >= 2 else None,
+        )
+
+
+class SnapshotExporter:
+    """
+    Build snapshot files of pending/active tickets from the main database
+
+    Holds its own connection so run_periodic() can export from a background
+    thread.
+    """
+
+    def __init__(self, output_dir: str = None, error_rate: float = 0.001, db_path: str = None):
+        self.db_path = db_path or get_db_manager().db_path
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.output_dir = output_dir or SNAPSHOT_DIR
+        self.error_rate = error_rate
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def snapshot_path(self, gate_id: str) -> str:
+        return os.path.join(self.output_dir, f"gate_{gate_id}.snap")
+
+    def build(self, gate_id: str) -> GateSnapshot:
+        rows = self.conn.execute("""
+            SELECT booking_id, ticket_number, vehicle_id, booking_status, checkin_deadline
+            FROM bookings
+            WHERE booking_status IN ('pending', 'active')
+        """).fetchall()
+        return GateSnapshot.from_rows(gate_id, [dict(r) for r in rows], self.error_rate)
+
+    def export(self, gate_id: str) -> str:
+        snapshot = self.build(gate_id)
+        path = self.snapshot_path(gate_id)
+        snapshot.save(path)
+        return path
+
+    def run_periodic(self, gate_ids: List[str], interval: float = 60.0,
+                     stop_event: threading.Event = None) -> threading.Thread:
+        """Re-export every gate's snapshot every `interval` seconds in a background thread"""
+        stop_event = stop_event or threading.Event()
+
+        def loop():
+            while not stop_event.is_set():
+                for gate_id in gate_ids:
+                    try:
+                        self.export(gate_id)
+                    except Exception as e:
+                        print(f"Snapshot export error for gate {gate_id}: {e}")
+                stop_event.wait(interval)
+
+        thread = threading.Thread(target=loop, name='gate-snapshot-exporter', daemon=True)
+        thread.stop_event = stop_event
+        thread.start()
+        return thread
+
+
+class OfflineGateVerifier:
+    """
+    Verify scanned QR codes against a local snapshot, without the database
+
+    Accepted scans are appended to a JSON-lines journal and their new status
+    is remembered locally, so a ticket cannot be used twice before the next
+    snapshot. sync() replays unsynced journal entries into the database.
+    A local status is only dropped once a snapshot built after the scan (and
+    after its sync, when this verifier did the sync) has been loaded.
+    """
+
+    def __init__(self, snapshot_path: str, mode: str = 'entry', journal_path: str = None):
+        if mode not in ('entry', 'exit'):
+            raise ValueError("mode must be 'entry' or 'exit'")
+
+        self.snapshot_path = snapshot_path
+        self.mode = mode
+        self.journal_path = journal_path or f"{os.path.splitext(snapshot_path)[0]}_{mode}.journal"
+        self.snapshot: Optional[GateSnapshot] = None
+        self._snapshot_mtime = None
+        self._local_status: Dict[int, str] = {}
+        self._local_times: Dict[int, float] = {}   # booking_id -> last scan or sync
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> bool:
+        """Load the snapshot file if it changed on disk; True if a new one was loaded"""
+        try:
+            mtime = os.path.getmtime(self.snapshot_path)
+        except OSError:
+            return False
+        if mtime == self._snapshot_mtime:
+            return False
+
+        snapshot = GateSnapshot.load(self.snapshot_path)
+        with self._lock:
+            if self.snapshot is None or snapshot.version > self.snapshot.version:
+                self.snapshot = snapshot
+                # Synced events are only reflected in snapshots built after them
+                unsynced = self._pending_booking_ids()
+                keep = {k for k in self._local_status
+                        if k in unsynced or self._local_times.get(k, 0) >= snapshot.created_at}
+                self._local_status = {k: v for k, v in self._local_status.items() if k in keep}
+                self._local_times = {k: v for k, v in self._local_times.items() if k in keep}
+            self._snapshot_mtime = mtime
+        return True
+
+    def verify(self, qr_text: str, now: float = None) -> Dict:
+        """
+        Check a scanned QR and, if accepted, journal the check-in/out
+
+        Returns:
+            dict: {'accepted', 'reason', 'booking_id', 'ticket', 'action', 'verify_us'}
+        """
+        started = time.perf_counter()
+        now = now or time.time()
+        result = {'accepted': False, 'reason': None, 'booking_id': None,
+                  'ticket': None, 'action': None}
+
+        try:
+            ticket = parse_booking_qr(qr_text, now=now, check_expiry=self.mode == 'entry')
+        except QRPayloadError as e:
+            result['reason'] = str(e)
+            return self._finish(result, started)
+
+        result['ticket'] = ticket['ticket']
+        with self._lock:
+            if self.snapshot is None:
+                result['reason'] = 'No snapshot loaded'
+                return self._finish(result, started)
+
+            entry = self.snapshot.lookup(ticket['ticket'])
+            if entry is None or entry['booking_id'] != ticket['booking_id']:
+                result['reason'] = 'Ticket not valid at this gate'
+                return self._finish(result, started)
+
+            self._decide(entry, result, now)
+
+        if result['accepted']:
+            self._journal_result(result, now)
+        return self._finish(result, started)
+
+    def verify_vehicle(self, vehicle_id: int, now: float = None) -> Dict:
+        """Like verify(), for a plate-read gate that already resolved the vehicle"""
+        started = time.perf_counter()
+        now = now or time.time()
+        result = {'accepted': False, 'reason': None, 'booking_id': None,
+                  'ticket': None, 'action': None}
+
+        with self._lock:
+            if self.snapshot is None:
+                result['reason'] = 'No snapshot loaded'
+                return self._finish(result, started)
+
+            entry = self.snapshot.lookup_vehicle(vehicle_id)
+            if entry is None:
+                result['reason'] = 'No live booking for vehicle'
+                return self._finish(result, started)
+
+            self._decide(entry, result, now)
+
+        if result['accepted']:
+            self._journal_result(result, now)
+        return self._finish(result, started)
+
+    def _decide(self, entry: Dict, result: Dict, now: float):
+        """Accept or reject one snapshot entry for this gate's mode; caller holds the lock"""
+        booking_id = entry['booking_id']
+        result['booking_id'] = booking_id
+        status = self._local_status.get(booking_id, entry['status'])
+
+        if self.mode == 'entry':
+            if status != 'pending':
+                result['reason'] = f"Booking is {status}, not pending"
+            elif entry['checkin_deadline'] and now > entry['checkin_deadline']:
+                result['reason'] = 'Check-in deadline passed'
+            else:
+                result.update(accepted=True, action='checkin')
+                self._local_status[booking_id] = 'active'
+                self._local_times[booking_id] = now
+        else:
+            if status != 'active':
+                result['reason'] = f"Booking is {status}, not active"
+            else:
+                result.update(accepted=True, action='checkout')
+                self._local_status[booking_id] = 'completed'
+                self._local_times[booking_id] = now
+
+    def _journal_result(self, result: Dict, now: float):
+        self._journal({
+            'event_id': uuid.uuid4().hex,
+            'booking_id': result['booking_id'],
+            'action': result['action'],
+            'gate_id': self.snapshot.gate_id,
+            'snapshot_version': self.snapshot.version,
+            'timestamp': datetime.fromtimestamp(now).isoformat(),
+        })
+
+    @staticmethod
+    def _finish(result: Dict, started: float) -> Dict:
+        result['verify_us'] = round((time.perf_counter() - started) * 1e6, 1)
+        return result
+
+    def _journal(self, event: Dict):
+        with open(self.journal_path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+    def _offset_path(self) -> str:
+        return f"{self.journal_path}.synced"
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self._offset_path()) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _pending_events(self) -> List[Dict]:
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._read_offset())
+            return [json.loads(line) for line in f.read().splitlines() if line.strip()]
+
+    def has_pending(self) -> bool:
+        """True while the journal holds events sync() has not applied yet"""
+        try:
+            return os.path.getsize(self.journal_path) > self._read_offset()
+        except OSError:
+            return False
+
+    def _pending_booking_ids(self) -> set:
+        return {event['booking_id'] for event in self._pending_events()}
+
+    def sync(self, db=None, batch_size: int = 200) -> Dict:
+        """
+        Apply unsynced journal events to the database in batches
+
+        Each batch is one transaction. Events whose booking changed in the
+        meantime (e.g. cancelled, or checked in at another gate) are counted
+        as conflicts and left untouched.
+        """
+        db = db or get_db_manager()
+        offset = self._read_offset()
+        if not os.path.exists(self.journal_path):
+            return {'applied': 0, 'conflicts': 0}
+
+        with open(self.journal_path, 'rb') as f:
+            f.seek(offset)
+            lines = f.read().splitlines(keepends=True)
+
+        applied = conflicts = 0
+        for start in range(0, len(lines), batch_size):
+            batch = lines[start:start + batch_size]
+            synced_ids, completed = [], []
+            with db.transaction() as cursor:
+                for line in batch:
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if self._apply_event(cursor, event):
+                        applied += 1
+                        synced_ids.append(event['booking_id'])
+                        if event['action'] != 'checkin':
+                            completed.append(event['booking_id'])
+                    else:
+                        conflicts += 1
+            synced_at = time.time()
+            with self._lock:
+                for booking_id in self._local_times.keys() & set(synced_ids):
+                    self._local_times[booking_id] = synced_at
+            if completed:
+                from models.artifact_store import get_artifact_store
+                store = get_artifact_store()
+                for booking_id in completed:
+                    store.release('booking', booking_id)
+            offset += sum(len(line) for line in batch)
+            with open(self._offset_path(), 'w') as f:
+                f.write(str(offset))
+
+        return {'applied': applied, 'conflicts': conflicts}
+
+    @staticmethod
+    def _apply_event(cursor, event: Dict) -> bool:
+        if event['action'] == 'checkin':
+            cursor.execute("""
+                UPDATE bookings SET booking_status = 'active', checkin_time = ?
+                WHERE booking_id = ? AND booking_status = 'pending'
+            """, (event['timestamp'], event['booking_id']))
+            slot_status = 'occupied'
+        else:
+            cursor.execute("""
+                UPDATE bookings SET booking_status = 'completed', checkout_time = ?
+                WHERE booking_id = ? AND booking_status = 'active'
+            """, (event['timestamp'], event['booking_id']))
+            slot_status = 'available'
+
+        if cursor.rowcount != 1:
+            return False
+
+        cursor.execute("""
+            UPDATE parking_slots SET status = ?
+            WHERE slot_id = (SELECT slot_id FROM bookings WHERE booking_id = ?)
+        """, (slot_status, event['booking_id']))
+        cursor.execute("""
+            INSERT INTO system_logs (event_type, user_id, description)
+            VALUES (?, (SELECT user_id FROM bookings WHERE booking_id = ?), ?)
+        """, (f"gate_offline_{event['action']}", event['booking_id'],
+              f"{event['action']} booking={event['booking_id']} gate={event['gate_id']} "
+              f"at={event['timestamp']} event={event['event_id']}"))
+        return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline gate snapshots")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    exp = sub.add_parser('export', help='Write snapshot files for gates')
+    exp.add_argument('gates', nargs='+')
+    exp.add_argument('--interval', type=float, help='Keep re-exporting every N seconds')
+
+    ver = sub.add_parser('verify', help='Verify a QR payload against a snapshot')
+    ver.add_argument('snapshot')
+    ver.add_argument('qr_data')
+    ver.add_argument('--mode', default='entry', choices=['entry', 'exit'])
+
+    syn = sub.add_parser('sync', help='Replay a gate journal into the database')
+    syn.add_argument('snapshot')
+    syn.add_argument('--mode', default='entry', choices=['entry', 'exit'])
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        exporter = SnapshotExporter()
+        if args.interval:
+            exporter.run_periodic(args.gates, args.interval).join()
+        for gate in args.gates:
+            print(f"✓ Snapshot written: {exporter.export(gate)}")
+    elif args.command == 'verify':
+        print(json.dumps(OfflineGateVerifier(args.snapshot, args.mode).verify(args.qr_data), indent=2))
+    else:
+        print(OfflineGateVerifier(args.snapshot, args.mode).sync())
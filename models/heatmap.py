@@ -0,0 +1,230 @@
+"""Day-of-Week x Hour Heatmaps in a Configurable Local Timezone"""
+
+import argparse
+import io
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from database.db_manager import get_db_manager
+from models.occupancy import STORAGE_TIMEZONES, sweep
+
+
+DAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+METRICS = ('arrivals', 'departures', 'occupancy')
+
+DEFAULT_TIMEZONE = os.environ.get('PARKING_TIMEZONE', 'local')
+
+_OFFSET_SUFFIX = r'(?:Z|[+-]\d{2}:?\d{2})$'
+
+
+def _resolve_tz(name: str):
+    return datetime.now().astimezone().tzinfo if name in (None, 'local') else name
+
+
+def _epoch_seconds(values) -> np.ndarray:
+    """Whole seconds since the epoch, independent of the datetime resolution"""
+    return np.asarray((values - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1), dtype=np.int64)
+
+
+def to_utc(values: pd.Series, storage_tz: str) -> pd.Series:
+    """
+    Parse mixed ISO timestamp strings to UTC
+
+    Strings carrying an offset are honoured as-is; naive strings are taken
+    to be in `storage_tz`.
+    """
+    values = values.astype('string')
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+
+    aware = values.str.contains(_OFFSET_SUFFIX, regex=True, na=False)
+    if aware.any():
+        result[aware] = pd.to_datetime(values[aware], format='ISO8601', utc=True)
+
+    naive = values.notna() & ~aware
+    if naive.any():
+        parsed = pd.to_datetime(values[naive], format='ISO8601', errors='coerce')
+        result[naive] = parsed.dt.tz_localize(_resolve_tz(storage_tz), ambiguous='NaT',
+                                              nonexistent='shift_forward').dt.tz_convert('UTC')
+    return result
+
+
+class HeatmapAnalytics:
+    """
+    Arrival, departure and occupancy matrices by weekday and time of day
+
+    Timestamps are parsed in bulk with pandas, normalised to UTC according
+    to STORAGE_TIMEZONES and bucketed in the display timezone, so DST and
+    the UTC/local mix in the bookings table don't skew the hours. Occupancy
+    reuses the occupancy sweep over bins aligned to local time.
+    """
+
+    def __init__(self, tz: str = None, storage_timezones: Dict[str, str] = None):
+        self.db = get_db_manager()
+        self.tz = tz or DEFAULT_TIMEZONE
+        self.storage_timezones = storage_timezones or STORAGE_TIMEZONES
+        self._chart_cache: Dict[Tuple, str] = {}
+
+    def _load(self, start_utc: pd.Timestamp) -> pd.DataFrame:
+        # Plain column reads only; a generous text prefilter keeps old history out
+        cutoff = (start_utc - timedelta(days=2)).strftime('%Y-%m-%d')
+        rows = self.db.fetch_all("""
+            SELECT entry_time, checkin_time, exit_time, checkout_time, booking_status
+            FROM bookings
+            WHERE booking_status IN ('active', 'completed')
+            AND (exit_time IS NULL OR exit_time >= ? OR checkout_time >= ?)
+        """, (cutoff, cutoff))
+        frame = pd.DataFrame([dict(row) for row in rows],
+                             columns=['entry_time', 'checkin_time', 'exit_time',
+                                      'checkout_time', 'booking_status'])
+
+        parsed = {column: to_utc(frame[column], self.storage_timezones.get(column, 'UTC'))
+                  for column in ('entry_time', 'checkin_time', 'exit_time', 'checkout_time')}
+        return pd.DataFrame({
+            'arrival': parsed['checkin_time'].fillna(parsed['entry_time']),
+            'departure': parsed['checkout_time'].fillna(parsed['exit_time']),
+        })
+
+    def compute(self, weeks: int = 12, bins_per_hour: int = 1,
+                end: datetime = None) -> Dict:
+        """
+        Build 7 x (24 * bins_per_hour) matrices over the last `weeks` weeks
+
+        Returns:
+            dict: 'arrivals' and 'departures' (average count per cell per
+                  week), 'occupancy' (average occupied slots), plus 'tz',
+                  'bins_per_hour', 'start', 'end'
+        """
+        if bins_per_hour not in (1, 2, 3, 4, 6, 12):
+            raise ValueError("bins_per_hour must divide 60 minutes evenly (1, 2, 3, 4, 6 or 12)")
+
+        tz = _resolve_tz(self.tz)
+        if end is None:
+            end_local = pd.Timestamp.now(tz=tz)
+        else:
+            end_ts = pd.Timestamp(end)
+            end_local = end_ts.tz_localize(tz) if end_ts.tzinfo is None else end_ts.tz_convert(tz)
+        end_local = end_local.floor(f'{60 // bins_per_hour}min')
+        start_local = (end_local - pd.Timedelta(weeks=weeks)).normalize()
+
+        cols = 24 * bins_per_hour
+        intervals = self._load(start_local.tz_convert('UTC'))
+
+        def bucket(times: pd.Series) -> np.ndarray:
+            local = times.dropna().dt.tz_convert(tz)
+            local = local[(local >= start_local) & (local < end_local)]
+            cells = local.dt.dayofweek.to_numpy() * cols + \
+                local.dt.hour.to_numpy() * bins_per_hour + local.dt.minute.to_numpy() * bins_per_hour // 60
+            return np.bincount(cells, minlength=7 * cols).reshape(7, cols).astype(float)
+
+        # Bins follow the local clock, so DST days simply have 23 or 25 of them
+        edges_local = pd.date_range(start_local, end_local, freq=f'{60 // bins_per_hour}min')
+        edges = _epoch_seconds(edges_local.tz_convert('UTC'))
+
+        # Stays still open run until now
+        valid = intervals['arrival'].notna()
+        starts = _epoch_seconds(intervals.loc[valid, 'arrival'])
+        ends = _epoch_seconds(intervals.loc[valid, 'departure'].fillna(pd.Timestamp.now(tz='UTC')))
+        keep = ends > starts
+        average, _ = sweep(starts[keep], ends[keep], edges)
+
+        cell = (edges_local[:-1].dayofweek * cols + edges_local[:-1].hour * bins_per_hour +
+                edges_local[:-1].minute * bins_per_hour // 60).to_numpy()
+        samples = np.bincount(cell, minlength=7 * cols).reshape(7, cols)
+        occupied = np.bincount(cell, weights=average, minlength=7 * cols).reshape(7, cols)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            occupancy = np.where(samples > 0, occupied / samples, 0.0)
+            arrivals = np.where(samples > 0, bucket(intervals['arrival']) / np.maximum(samples, 1), 0.0)
+            departures = np.where(samples > 0, bucket(intervals['departure']) / np.maximum(samples, 1), 0.0)
+
+        return {
+            'arrivals': np.round(arrivals, 3),
+            'departures': np.round(departures, 3),
+            'occupancy': np.round(occupancy, 3),
+            'tz': str(tz),
+            'bins_per_hour': bins_per_hour,
+            'start': start_local.isoformat(),
+            'end': end_local.isoformat(),
+        }
+
+    def _fingerprint(self) -> Tuple:
+        """Changes whenever bookings change (rollup dirty log) or the hour rolls over"""
+        from models.analytics_rollup import get_analytics_rollup
+        return get_analytics_rollup().current_seq(), datetime.now().strftime('%Y-%m-%d %H')
+
+    def generate_chart(self, metric: str = 'occupancy', weeks: int = 12,
+                       bins_per_hour: int = 1) -> Optional[str]:
+        """
+        Render a heatmap PNG, reusing the last render while nothing has changed
+
+        Returns:
+            str: Path of the chart in the artifact store
+        """
+        from models.artifact_store import get_artifact_store
+
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}")
+
+        key = (metric, weeks, bins_per_hour, str(self.tz)) + self._fingerprint()
+        path = self._chart_cache.get(key)
+        if path and os.path.exists(path):
+            return path
+
+        data = self.compute(weeks, bins_per_hour)
+        matrix = data[metric]
+        cols = matrix.shape[1]
+
+        fig, ax = plt.subplots(figsize=(14, 5))
+        image = ax.imshow(matrix, aspect='auto', cmap='YlOrRd', interpolation='nearest')
+        ax.set_yticks(range(7), DAY_LABELS)
+        ax.set_xticks(range(0, cols, bins_per_hour * 2), [f"{h:02d}" for h in range(0, 24, 2)])
+        ax.set_xlabel(f'Hour of Day ({data["tz"]})', fontsize=12)
+        units = 'avg occupied slots' if metric == 'occupancy' else f'avg {metric} per week'
+        fig.colorbar(image, ax=ax, label=units)
+        ax.set_title(f'{metric.title()} by Weekday and Hour - Last {weeks} Weeks',
+                     fontsize=16, fontweight='bold')
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=150)
+        plt.close(fig)
+
+        path = get_artifact_store().put(buffer.getvalue(), 'chart', 'png')
+        self._chart_cache = {k: v for k, v in self._chart_cache.items() if k[-2:] == key[-2:]}
+        self._chart_cache[key] = path
+        return path
+
+
+_heatmap_instance: Optional[HeatmapAnalytics] = None
+
+def get_heatmap_analytics() -> HeatmapAnalytics:
+    global _heatmap_instance
+    if _heatmap_instance is None:
+        _heatmap_instance = HeatmapAnalytics()
+    return _heatmap_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weekday x hour booking heatmaps")
+    parser.add_argument('--metric', choices=METRICS, default='occupancy')
+    parser.add_argument('--weeks', type=int, default=12)
+    parser.add_argument('--bins-per-hour', type=int, default=1)
+    parser.add_argument('--tz', help='Display timezone, e.g. Asia/Kolkata (default: local)')
+    parser.add_argument('--chart', action='store_true', help='Render a PNG instead of printing')
+    args = parser.parse_args()
+
+    heatmaps = HeatmapAnalytics(tz=args.tz)
+    if args.chart:
+        print(f"✓ Heatmap saved at {heatmaps.generate_chart(args.metric, args.weeks, args.bins_per_hour)}")
+    else:
+        result = heatmaps.compute(args.weeks, args.bins_per_hour)
+        frame = pd.DataFrame(result[args.metric], index=DAY_LABELS)
+        print(f"{args.metric} ({result['tz']}, {result['start']} -> {result['end']})")
+        print(frame.to_string())
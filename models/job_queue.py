@@ -0,0 +1,411 @@
+"""SQLite-Backed Document Job Queue for QR, PDF and Chart Rendering"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from database.db_manager import get_db_manager
+
+
+JOBS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS document_jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_type TEXT NOT NULL,
+        params TEXT NOT NULL,
+        priority INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'done', 'failed')),
+        attempts INTEGER DEFAULT 0,
+        max_attempts INTEGER DEFAULT 3,
+        result TEXT,
+        error TEXT,
+        worker TEXT,
+        run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        heartbeat_at TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_document_jobs_claim
+        ON document_jobs(status, priority DESC, job_id);
+"""
+
+# Higher runs first
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _now(offset_seconds: float = 0) -> str:
+    return (datetime.now() + timedelta(seconds=offset_seconds)).strftime(TIMESTAMP_FORMAT)
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(JOBS_TABLE_SQL)
+    # Tables created before workers renewed their lease
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(document_jobs)")}
+    if 'heartbeat_at' not in columns:
+        conn.execute("ALTER TABLE document_jobs ADD COLUMN heartbeat_at TIMESTAMP")
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# Job handlers: take the job's params dict, return a JSON-serialisable result
+# ---------------------------------------------------------------------------
+
+def _chart_job(params: Dict) -> Dict:
+    from models.analytics import AnalyticsManager
+
+    charts = {
+        'revenue': lambda manager: manager.generate_revenue_chart(params.get('days', 7)),
+        'occupancy': lambda manager: manager.generate_occupancy_chart(),
+        'peak_hours': lambda manager: manager.generate_peak_hours_chart(),
+        'vehicle_type': lambda manager: manager.generate_vehicle_type_chart(),
+        'heatmap': lambda manager: manager.generate_heatmap_chart(params.get('metric', 'occupancy'),
+                                                                  params.get('weeks', 12)),
+    }
+    chart = params.get('chart')
+    if chart not in charts:
+        raise ValueError(f"Unknown chart: {chart}")
+
+    path = charts[chart](AnalyticsManager())
+    if not path:
+        raise RuntimeError(f"No data for {chart} chart")
+    return {'path': path}
+
+
+def _receipt_job(params: Dict) -> Dict:
+    from models.artifact_store import get_artifact_store
+    from utils.pdf_generator import PDFGenerator
+
+    bill = params['bill']
+    # Stamp the footer with the exit time so re-saving a receipt reuses the same file
+    pdf = PDFGenerator().render_parking_receipt(bill, None,
+                                                bill.get('generated_at') or bill.get('exit_time'))
+    path = get_artifact_store().put(pdf, 'receipt', 'pdf', ref=('ticket', bill['ticket_number']))
+    return {'path': path}
+
+
+def _qr_job(params: Dict) -> Dict:
+    from models.artifact_store import get_artifact_store
+    from utils.qr_payload import encode_booking_payload, error_correction_for
+    from utils.qr_renderer import get_qr_renderer
+
+    booking_id = params['booking_id']
+    qr_data = params.get('qr_data') or encode_booking_payload(booking_id, params['ticket_number'])
+    png = get_qr_renderer().get(booking_id, qr_data, 'png',
+                                error_correction=error_correction_for(qr_data))
+    path = get_artifact_store().put(png, 'qr', 'png', ref=('booking', booking_id))
+    return {'path': path, 'qr_data': qr_data}
+
+
+def _statement_job(params: Dict) -> Dict:
+    from models.statements import StatementGenerator
+
+    generator = StatementGenerator(get_db_manager().db_path)
+    try:
+        return generator.generate(params['user_id'], params['month'])
+    finally:
+        generator.close()
+
+
+JOB_HANDLERS: Dict[str, Callable[[Dict], Dict]] = {
+    'chart': _chart_job,
+    'receipt': _receipt_job,
+    'qr': _qr_job,
+    'statement': _statement_job,
+}
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+def _claim_next(conn: sqlite3.Connection, worker: str) -> Optional[Dict]:
+    """Atomically move the highest-priority due job to 'running'"""
+    row = conn.execute("""
+        UPDATE document_jobs
+        SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1
+        WHERE job_id = (
+            SELECT job_id FROM document_jobs
+            WHERE status = 'queued' AND run_after <= ?
+            ORDER BY priority DESC, job_id
+            LIMIT 1
+        )
+        RETURNING *
+    """, (worker, _now(), _now(), _now())).fetchone()
+    return dict(row) if row else None
+
+
+def _heartbeat(db_path: str, job: Dict, interval: float, stop: threading.Event):
+    """Renew a running job's lease until `stop` is set, so it is not requeued"""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        while not stop.wait(interval):
+            conn.execute("""
+                UPDATE document_jobs SET heartbeat_at = ?
+                WHERE job_id = ? AND worker = ? AND status = 'running'
+            """, (_now(), job['job_id'], job['worker']))
+    except sqlite3.Error as e:
+        print(f"Heartbeat for job {job['job_id']} stopped: {e}")
+    finally:
+        conn.close()
+
+
+def _finish(conn: sqlite3.Connection, job: Dict, result: Dict = None, error: str = None,
+            retry_delay: float = 5.0):
+    if error is None:
+        conn.execute("""
+            UPDATE document_jobs SET status = 'done', result = ?, error = NULL, finished_at = ?
+            WHERE job_id = ?
+        """, (json.dumps(result, default=str), _now(), job['job_id']))
+    elif job['attempts'] < job['max_attempts']:
+        # Exponential backoff: 5s, 10s, 20s, ...
+        delay = retry_delay * (2 ** (job['attempts'] - 1))
+        conn.execute("""
+            UPDATE document_jobs SET status = 'queued', error = ?, run_after = ?, worker = NULL
+            WHERE job_id = ?
+        """, (error, _now(delay), job['job_id']))
+    else:
+        conn.execute("""
+            UPDATE document_jobs SET status = 'failed', error = ?, finished_at = ?
+            WHERE job_id = ?
+        """, (error, _now(), job['job_id']))
+
+
+def _reset_db_manager(db_path: str):
+    """Give this process its own DatabaseManager on `db_path`"""
+    import database.db_manager as db_module
+    import models.artifact_store as artifact_module
+
+    # A forked child inherits the parent's connections; never share them
+    db_module._db_instance = db_module.DatabaseManager(db_path)
+    db_module._db_instance.connect()
+    artifact_module._store_instance = None
+
+
+def run_worker(db_path: str, stop_event=None, poll_interval: float = 0.25,
+               max_jobs: int = None, retry_delay: float = 5.0, lease_seconds: int = 300) -> int:
+    """
+    Claim and run jobs until `stop_event` is set (or `max_jobs` have run)
+
+    While a job runs, a thread renews its lease every third of
+    `lease_seconds`, so only jobs whose worker died are requeued.
+
+    Returns:
+        int: Number of jobs processed
+    """
+    _reset_db_manager(db_path)
+    conn = _connect(db_path)
+    worker = f"{os.getpid()}"
+    processed = 0
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            job = _claim_next(conn, worker)
+            if job is None:
+                if max_jobs is not None:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            handler = JOB_HANDLERS.get(job['job_type'])
+            beat_stop = threading.Event()
+            beat = threading.Thread(target=_heartbeat, args=(db_path, job, lease_seconds / 3, beat_stop),
+                                    name=f"job-{job['job_id']}-heartbeat", daemon=True)
+            beat.start()
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown job type: {job['job_type']}")
+                result = handler(json.loads(job['params']))
+                _finish(conn, job, result=result)
+            except Exception as e:
+                print(f"Job {job['job_id']} ({job['job_type']}) failed: {e}")
+                _finish(conn, job, error=f"{e}\n{traceback.format_exc(limit=3)}",
+                        retry_delay=retry_delay)
+            finally:
+                beat_stop.set()
+                beat.join()
+
+            processed += 1
+            if max_jobs is not None and processed >= max_jobs:
+                break
+    finally:
+        conn.close()
+
+    return processed
+
+
+# ---------------------------------------------------------------------------
+# Client side
+# ---------------------------------------------------------------------------
+
+class DocumentJobQueue:
+    """
+    Local job queue for document rendering, backed by the document_jobs table
+
+    Callers enqueue a job and get its id back immediately; worker processes
+    claim queued jobs by priority, retry failures with backoff and store a
+    JSON result (usually the output path) on the row. Any process with the
+    database file can enqueue or poll, so the desktop app and the web app
+    can share one set of workers.
+    """
+
+    def __init__(self, db_path: str = None, workers: int = 2, lease_seconds: int = 300):
+        self.db_path = db_path or get_db_manager().db_path
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self._conn = _connect(self.db_path)
+        self._processes: List[multiprocessing.Process] = []
+        self._stop_event = None
+
+    def enqueue(self, job_type: str, params: Dict = None, priority: int = PRIORITY_NORMAL,
+                max_attempts: int = 3) -> int:
+        """Queue a job and return its id"""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        cursor = self._conn.execute("""
+            INSERT INTO document_jobs (job_type, params, priority, max_attempts, run_after, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (job_type, json.dumps(params or {}, default=str), priority, max_attempts,
+              _now(), _now()))
+        return cursor.lastrowid
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        """Current state of a job, with params and result decoded"""
+        row = self._conn.execute("SELECT * FROM document_jobs WHERE job_id = ?",
+                                 (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    poll = get
+
+    def wait(self, job_id: int, timeout: float = 60.0, interval: float = 0.1) -> Optional[Dict]:
+        """Block until the job is done or failed; returns the job (or None on timeout)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in ('done', 'failed'):
+                return job
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(interval)
+
+    def start_workers(self, count: int = None):
+        """Spawn worker processes (no-op if they are already running)"""
+        self._processes = [p for p in self._processes if p.is_alive()]
+        if self._processes:
+            return
+
+        self.requeue_stale()
+        self._stop_event = multiprocessing.Event()
+        for _ in range(count or self.workers):
+            process = multiprocessing.Process(target=run_worker, args=(self.db_path, self._stop_event),
+                                              kwargs={'lease_seconds': self.lease_seconds}, daemon=True)
+            process.start()
+            self._processes.append(process)
+
+    def stop_workers(self, timeout: float = 5.0):
+        if self._stop_event is not None:
+            self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def requeue_stale(self) -> int:
+        """
+        Put 'running' jobs whose worker died (lease not renewed) back in the queue
+
+        Jobs that already used all their attempts are marked failed instead,
+        so a job that kills its worker is not retried forever.
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        stale = "status = 'running' AND COALESCE(heartbeat_at, started_at) < ?"
+        expired = _now(-self.lease_seconds)
+        self._conn.execute(f"""
+            UPDATE document_jobs
+            SET status = 'failed', finished_at = ?,
+                error = COALESCE(error || '\n', '') || 'Worker lost after ' || attempts || ' attempts'
+            WHERE {stale} AND attempts >= max_attempts
+        """, (_now(), expired))
+        cursor = self._conn.execute(f"""
+            UPDATE document_jobs SET status = 'queued', worker = NULL
+            WHERE {stale} AND attempts < max_attempts
+        """, (expired,))
+        return cursor.rowcount
+
+    def purge(self, older_than_days: int = 7) -> int:
+        """Delete finished jobs older than `older_than_days`"""
+        cursor = self._conn.execute("""
+            DELETE FROM document_jobs
+            WHERE status IN ('done', 'failed') AND finished_at < ?
+        """, (_now(-older_than_days * 86400),))
+        return cursor.rowcount
+
+    def get_stats(self) -> Dict:
+        counts = {row['status']: row['count'] for row in self._conn.execute(
+            "SELECT status, COUNT(*) AS count FROM document_jobs GROUP BY status")}
+        avg = self._conn.execute("""
+            SELECT AVG((julianday(finished_at) - julianday(created_at)) * 86400) AS seconds
+            FROM document_jobs WHERE status = 'done'
+        """).fetchone()['seconds']
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'avg_turnaround_seconds': round(avg, 2) if avg is not None else None,
+            'workers_alive': sum(1 for p in self._processes if p.is_alive()),
+        }
+
+
+_queue_instance: Optional[DocumentJobQueue] = None
+
+def get_job_queue() -> DocumentJobQueue:
+    global _queue_instance
+    if _queue_instance is None:
+        _queue_instance = DocumentJobQueue()
+    return _queue_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run document job workers")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--db')
+    parser.add_argument('--stats', action='store_true', help='Print queue counts and exit')
+    parser.add_argument('--purge', type=int, metavar='DAYS', help='Delete finished jobs older than DAYS')
+    args = parser.parse_args()
+
+    queue = DocumentJobQueue(db_path=args.db, workers=args.workers)
+    if args.purge is not None:
+        print(f"✓ Purged {queue.purge(args.purge)} jobs")
+    if args.stats or args.purge is not None:
+        print(queue.get_stats())
+    else:
+        queue.start_workers()
+        print(f"✓ {args.workers} workers running on {queue.db_path} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(5)
+                queue.requeue_stale()
+        except KeyboardInterrupt:
+            queue.stop_workers()
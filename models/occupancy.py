@@ -0,0 +1,348 @@
+"""Historical Occupancy Reconstruction from Booking Intervals"""
+
+import argparse
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from database.db_manager import get_db_manager
+
+
+GROUP_COLUMNS = ('floor', 'section', 'vehicle_type')
+
+# Zone of the naive timestamps each column holds. entry_time comes from
+# SQLite's CURRENT_TIMESTAMP or Django (both UTC); check-in/exit/checkout are
+# written by the desktop app with datetime.now(). 'local' is this machine's zone.
+STORAGE_TIMEZONES = {
+    'entry_time': 'UTC',
+    'checkin_time': 'local',
+    'exit_time': 'local',
+    'checkout_time': 'local',
+}
+
+
+def _epoch_sql(column: str) -> str:
+    """A stored timestamp as seconds on the naive local-time scale of the timeline"""
+    modifier = ", 'localtime'" if STORAGE_TIMEZONES[column] == 'UTC' else ''
+    return f"CAST(strftime('%s', b.{column}{modifier}) AS INTEGER)"
+
+
+# A stay starts at check-in (or entry) and ends at exit/checkout. Cancelled
+# bookings only count if the vehicle actually checked in. entry_day is the
+# raw DATE(entry_time) the rollup triggers log in analytics_dirty_log.
+INTERVAL_QUERY = f"""
+    SELECT b.booking_id, b.booking_status, b.duration_hours, DATE(b.entry_time) AS entry_day,
+           COALESCE({_epoch_sql('checkin_time')}, {_epoch_sql('entry_time')}) AS start_ts,
+           COALESCE({_epoch_sql('exit_time')}, {_epoch_sql('checkout_time')}) AS end_ts,
+           ps.floor, ps.section, ps.vehicle_type
+    FROM bookings b
+    JOIN parking_slots ps ON b.slot_id = ps.slot_id
+    WHERE (b.booking_status IN ('active', 'completed')
+           OR (b.booking_status = 'cancelled' AND b.checkin_time IS NOT NULL))
+"""
+
+# Intervals with no entry day; only reload() replaces them
+NO_DAY = -1
+
+OPEN_END = np.iinfo(np.int64).max
+
+
+def _to_epoch(value: Union[str, datetime]) -> int:
+    """Seconds for a naive local timestamp, on the same scale as SQLite's strftime('%s')"""
+    return int(pd.Timestamp(value).timestamp())
+
+
+def _now_epoch() -> int:
+    return _to_epoch(datetime.now())
+
+
+def _day_number(day: Optional[str]) -> int:
+    return int(np.datetime64(day, 'D').astype(np.int64)) if day else NO_DAY
+
+
+def sweep(starts: np.ndarray, ends: np.ndarray, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Average and peak concurrent intervals in each [edges[i], edges[i+1]) bin
+
+    Every interval becomes a +1 event at its start and a -1 event at its
+    end. After sorting, prefix sums give the level L(t) and its integral
+    F(t) = t * C(t) - S(t), so bin averages are (F(b) - F(a)) / (b - a)
+    for all bins at once.
+
+    Returns:
+        tuple: (average, peak) arrays of length len(edges) - 1
+    """
+    bins = len(edges) - 1
+    if len(starts) == 0 or bins <= 0:
+        return np.zeros(max(bins, 0)), np.zeros(max(bins, 0), dtype=np.int64)
+
+    times = np.concatenate([starts, ends])
+    signs = np.concatenate([np.ones(len(starts), dtype=np.int64),
+                            -np.ones(len(ends), dtype=np.int64)])
+    # Ends sort before starts at the same instant, so back-to-back stays don't overlap
+    order = np.lexsort((signs, times))
+    times, signs = times[order], signs[order]
+
+    levels = np.cumsum(signs)
+    weighted = np.cumsum(signs * times.astype(np.float64))
+
+    idx = np.searchsorted(times, edges, side='right')
+    level_at = np.where(idx > 0, levels[np.maximum(idx - 1, 0)], 0)
+    weighted_at = np.where(idx > 0, weighted[np.maximum(idx - 1, 0)], 0.0)
+    integral = edges.astype(np.float64) * level_at - weighted_at
+    average = np.diff(integral) / np.diff(edges)
+
+    # Peak: level entering the bin, or any level reached by an event inside it
+    peak = level_at[:-1].copy()
+    lo, hi = idx[:-1], np.searchsorted(times, edges[1:], side='left')
+    has_events = hi > lo
+    if has_events.any():
+        peak[has_events] = np.maximum(peak[has_events],
+                                      _segment_max(levels, lo[has_events], hi[has_events]))
+
+    return average, peak
+
+
+def _segment_max(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """max(values[lo[i]:hi[i]]) for non-empty, non-overlapping, ordered segments"""
+    bounds = np.empty(len(lo) * 2, dtype=np.int64)
+    bounds[0::2], bounds[1::2] = lo, hi
+    # reduceat needs indices < len(values); the tail segment is dropped below
+    reduced = np.maximum.reduceat(values, np.minimum(bounds, len(values) - 1))
+    result = reduced[0::2]
+    last = hi == len(values)
+    if last.any():
+        result[last] = [values[l:].max() for l in lo[last]]
+    return result
+
+
+class OccupancyTimeline:
+    """
+    Occupancy curves per floor, section and vehicle type from booking history
+
+    Intervals are kept in NumPy arrays, tagged with their booking's entry
+    day. The rollup triggers log every booking insert, update and delete to
+    analytics_dirty_log, starting at the booking's entry day. refresh()
+    re-reads only those days, so keeping the timeline current costs a
+    small query rather than a full reload.
+    """
+
+    def __init__(self, max_dirty_days: int = 62):
+        self.db = get_db_manager()
+        self.max_dirty_days = max_dirty_days
+        self._ids = np.empty(0, dtype=np.int64)
+        self._starts = np.empty(0, dtype=np.int64)
+        self._ends = np.empty(0, dtype=np.int64)
+        self._groups = np.empty(0, dtype=np.int64)
+        self._days = np.empty(0, dtype=np.int64)
+        self._group_keys: List[Tuple] = []
+        self._group_codes: Dict[Tuple, int] = {}
+        self._seq: Optional[int] = None
+        self.last_refresh = {'rows': 0, 'ms': 0.0, 'full': False}
+
+    def _code_for(self, key: Tuple) -> int:
+        code = self._group_codes.get(key)
+        if code is None:
+            code = self._group_codes[key] = len(self._group_keys)
+            self._group_keys.append(key)
+        return code
+
+    def _to_arrays(self, rows) -> Tuple[np.ndarray, ...]:
+        ids, starts, ends, groups, days = [], [], [], [], []
+        for row in rows:
+            if row['start_ts'] is None:
+                continue
+            end = row['end_ts']
+            if end is None:
+                if row['booking_status'] == 'active':
+                    end = OPEN_END
+                elif row['duration_hours']:
+                    end = row['start_ts'] + int(row['duration_hours'] * 3600)
+                else:
+                    continue
+            ids.append(row['booking_id'])
+            starts.append(row['start_ts'])
+            ends.append(end)
+            groups.append(self._code_for((row['floor'], row['section'], row['vehicle_type'])))
+            days.append(_day_number(row['entry_day']))
+
+        return (np.array(ids, dtype=np.int64), np.array(starts, dtype=np.int64),
+                np.array(ends, dtype=np.int64), np.array(groups, dtype=np.int64),
+                np.array(days, dtype=np.int64))
+
+    def reload(self):
+        """Rebuild every interval from the bookings table"""
+        started = time.perf_counter()
+        # Read the log position first: changes made during the load get re-read
+        _, seq = self._seq_range()
+        rows = self.db.fetch_all(INTERVAL_QUERY)
+        self._ids, self._starts, self._ends, self._groups, self._days = self._to_arrays(rows)
+        self._seq = seq
+        self.last_refresh = {'rows': len(rows), 'ms': (time.perf_counter() - started) * 1000,
+                             'full': True}
+
+    def _scalar(self, query: str) -> int:
+        return self.db.fetch_one(query)[0]
+
+    def _seq_range(self) -> Tuple[int, int]:
+        row = self.db.fetch_one(
+            "SELECT COALESCE(MIN(seq), 0), COALESCE(MAX(seq), 0) FROM analytics_dirty_log")
+        return (row[0], row[1]) if row else (0, 0)
+
+    def refresh(self):
+        """
+        Re-read the entry days of bookings changed since the last refresh
+
+        Falls back to reload() when the rollup has already pruned log entries
+        this timeline never saw, or when too many days changed at once.
+        """
+        if self._seq is None:
+            return self.reload()
+
+        started = time.perf_counter()
+        first, last = self._seq_range()
+        if last == self._seq:
+            self.last_refresh = {'rows': 0, 'ms': (time.perf_counter() - started) * 1000,
+                                 'full': False}
+            return
+        if first > self._seq + 1:
+            return self.reload()
+
+        days = sorted({row[0] for row in self.db.fetch_all(
+            "SELECT DISTINCT day_from FROM analytics_dirty_log WHERE seq > ? AND seq <= ?",
+            (self._seq, last))})
+        if len(days) > self.max_dirty_days:
+            return self.reload()
+
+        # Same raw-string bounds the triggers used for day_from
+        ranges = [(day, str(np.datetime64(day, 'D') + 1)) for day in days]
+        rows = self.db.fetch_all(
+            INTERVAL_QUERY + " AND (" + " OR ".join("(b.entry_time >= ? AND b.entry_time < ?)"
+                                                    for _ in ranges) + ")",
+            tuple(bound for pair in ranges for bound in pair)) if ranges else []
+
+        ids, starts, ends, groups, entry_days = self._to_arrays(rows)
+        keep = ~np.isin(self._days, [_day_number(day) for day in days])
+        self._ids = np.concatenate([self._ids[keep], ids])
+        self._starts = np.concatenate([self._starts[keep], starts])
+        self._ends = np.concatenate([self._ends[keep], ends])
+        self._groups = np.concatenate([self._groups[keep], groups])
+        self._days = np.concatenate([self._days[keep], entry_days])
+
+        self._seq = last
+        self.last_refresh = {'rows': len(rows), 'ms': (time.perf_counter() - started) * 1000,
+                             'full': False}
+
+    def capacity(self, group_by: Sequence[str] = ()) -> Dict[Tuple, int]:
+        """Number of slots per group"""
+        if not group_by:
+            return {(): self._scalar("SELECT COUNT(*) FROM parking_slots")}
+        columns = ', '.join(group_by)
+        return {tuple(row[:-1]): row[-1] for row in self.db.fetch_all(
+            f"SELECT {columns}, COUNT(*) FROM parking_slots GROUP BY {columns}")}
+
+    def series(self, start: Union[str, datetime], end: Union[str, datetime] = None,
+               resolution: Union[str, int] = '1h', group_by: Sequence[str] = (),
+               refresh: bool = True) -> pd.DataFrame:
+        """
+        Occupancy per time bin, optionally split by floor/section/vehicle_type
+
+        Args:
+            start, end: Window to reconstruct (end defaults to now)
+            resolution: Bin width, a pandas offset string ('15min', '1h', '1D') or seconds
+            group_by: Any of 'floor', 'section', 'vehicle_type'
+            refresh: Pick up new bookings first
+
+        Returns:
+            DataFrame: time, <group columns>, avg_occupied, peak_occupied,
+                       arrivals, capacity, occupancy_rate (avg / capacity, in percent)
+        """
+        unknown = set(group_by) - set(GROUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot group by {sorted(unknown)}; use {GROUP_COLUMNS}")
+        if refresh:
+            self.refresh()
+
+        step = int(resolution) if isinstance(resolution, (int, float)) \
+            else int(pd.to_timedelta(resolution).total_seconds())
+        t0 = _to_epoch(start)
+        t1 = _to_epoch(end) if end is not None else _now_epoch()
+        if step <= 0 or t1 <= t0:
+            raise ValueError("Need a positive resolution and end after start")
+        edges = np.arange(t0, t1 + step, step, dtype=np.int64)
+
+        # Only intervals overlapping the window matter; open stays end now
+        ends = np.where(self._ends == OPEN_END, _now_epoch(), self._ends)
+        in_window = (self._starts < edges[-1]) & (ends > edges[0])
+        starts, ends, groups = self._starts[in_window], ends[in_window], self._groups[in_window]
+
+        # Map every (floor, section, vehicle_type) code onto the requested grouping
+        positions = [GROUP_COLUMNS.index(column) for column in group_by]
+        codes_by_key: Dict[Tuple, List[int]] = {}
+        for code, key in enumerate(self._group_keys):
+            codes_by_key.setdefault(tuple(key[p] for p in positions), []).append(code)
+
+        capacities = self.capacity(group_by)
+        times = pd.to_datetime(edges[:-1], unit='s')
+
+        frames = []
+        for key, capacity in sorted(capacities.items(), key=lambda item: str(item[0])):
+            mask = np.isin(groups, codes_by_key.get(key, []))
+            average, peak = sweep(starts[mask], ends[mask], edges)
+            arriving = starts[mask]
+            arriving = arriving[(arriving >= edges[0]) & (arriving < edges[-1])]
+            frame = pd.DataFrame({'time': times})
+            for column, value in zip(group_by, key):
+                frame[column] = value
+            frame['avg_occupied'] = np.round(average, 3)
+            frame['peak_occupied'] = peak
+            frame['arrivals'] = np.bincount((arriving - edges[0]) // step, minlength=len(edges) - 1)
+            frame['capacity'] = capacity
+            frame['occupancy_rate'] = np.round(average / capacity * 100, 2) if capacity else 0.0
+            frames.append(frame)
+
+        return pd.concat(frames, ignore_index=True)
+
+    def get_stats(self) -> Dict:
+        return {
+            'intervals': int(len(self._ids)),
+            'open': int((self._ends == OPEN_END).sum()),
+            'groups': len(self._group_keys),
+            'last_refresh_rows': self.last_refresh['rows'],
+            'last_refresh_ms': round(self.last_refresh['ms'], 2),
+            'last_refresh_full': self.last_refresh['full'],
+        }
+
+
+_timeline_instance: Optional[OccupancyTimeline] = None
+
+def get_occupancy_timeline() -> OccupancyTimeline:
+    global _timeline_instance
+    if _timeline_instance is None:
+        _timeline_instance = OccupancyTimeline()
+    return _timeline_instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruct historical occupancy")
+    parser.add_argument('start', help='Window start, e.g. 2025-06-01')
+    parser.add_argument('end', nargs='?', help='Window end (default now)')
+    parser.add_argument('--resolution', default='1h')
+    parser.add_argument('--group-by', nargs='*', default=[], choices=GROUP_COLUMNS)
+    parser.add_argument('--output', help='Write the series to this CSV file')
+    args = parser.parse_args()
+
+    timeline = get_occupancy_timeline()
+    started = time.perf_counter()
+    df = timeline.series(args.start, args.end, args.resolution, args.group_by)
+    elapsed = time.perf_counter() - started
+
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"✓ Wrote {len(df)} rows to {args.output}")
+    else:
+        print(df.to_string(max_rows=40))
+    print(f"{timeline.get_stats()['intervals']} intervals in {elapsed:.2f}s")
@@ -0,0 +1,340 @@
+"""Monthly Account Statements"""
+
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+
+from database.db_manager import get_db_manager
+
+
+STATEMENT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'outputs', 'statements')
+
+BOOKING_COLUMNS = [('Date', 0), ('Ticket', 0.9), ('Slot', 2.75), ('Hours', 3.55),
+                   ('Status', 4.25), ('Amount (₹)', 5.35)]
+PAYMENT_COLUMNS = [('Paid At', 0), ('Transaction', 1.6), ('Method', 3.2),
+                   ('Refund (₹)', 4.25), ('Amount (₹)', 5.35)]
+
+
+def month_bounds(month: str) -> Tuple[str, str]:
+    """'2025-06' -> ('2025-06-01', '2025-07-01'), end exclusive"""
+    start = datetime.strptime(month, '%Y-%m').date()
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+class _PageWriter:
+    """Line-oriented canvas writer that starts new pages as it goes"""
+
+    LINE = 14
+    TOP = A4[1] - 0.75 * inch
+    BOTTOM = 0.75 * inch
+    LEFT = 0.75 * inch
+
+    def __init__(self, path: str, title: str):
+        self.canvas = canvas.Canvas(path, pagesize=A4, invariant=1)
+        self.title = title
+        self.page = 0
+        self.columns = None
+        self._new_page()
+
+    def _new_page(self):
+        if self.page:
+            self.canvas.showPage()
+        self.page += 1
+        self.y = self.TOP
+        self.canvas.setFont('Helvetica', 8)
+        self.canvas.setFillColor(colors.grey)
+        self.canvas.drawString(self.LEFT, self.BOTTOM - 20, self.title)
+        self.canvas.drawRightString(A4[0] - self.LEFT, self.BOTTOM - 20, f"Page {self.page}")
+        self.canvas.setFillColor(colors.black)
+        if self.columns:
+            self._column_header()
+
+    def _ensure(self, lines: int = 1):
+        if self.y - lines * self.LINE < self.BOTTOM:
+            self._new_page()
+
+    def text(self, value: str, font: str = 'Helvetica', size: int = 10, gap: float = 1.0):
+        self._ensure()
+        self.canvas.setFont(font, size)
+        self.canvas.drawString(self.LEFT, self.y, value)
+        self.y -= self.LINE * gap
+
+    def rule(self):
+        self._ensure()
+        self.canvas.line(self.LEFT, self.y + 4, A4[0] - self.LEFT, self.y + 4)
+        self.y -= 6
+
+    def set_columns(self, columns: Optional[List]):
+        self.columns = columns
+        if columns:
+            self._ensure(3)
+            self._column_header()
+
+    def _column_header(self):
+        self.row([name for name, _ in self.columns], font='Helvetica-Bold')
+        self.rule()
+
+    def row(self, values: List[str], font: str = 'Helvetica', size: int = 9):
+        self._ensure()
+        self.canvas.setFont(font, size)
+        last = len(self.columns) - 1
+        for i, ((_, x), value) in enumerate(zip(self.columns, values)):
+            if i == last:
+                self.canvas.drawRightString(A4[0] - self.LEFT, self.y, str(value))
+            else:
+                self.canvas.drawString(self.LEFT + x * inch, self.y, str(value))
+        self.y -= self.LINE
+
+    def space(self, lines: float = 1.0):
+        self.y -= self.LINE * lines
+
+    def save(self):
+        self.canvas.save()
+
+
+class StatementGenerator:
+    """
+    Stream one account's bookings and payments for a month into a PDF
+
+    Rows are pulled with fetchmany() and drawn straight onto the canvas,
+    so memory use does not grow with the number of bookings. Accounts with
+    more than one vehicle (fleets) get a subtotal per vehicle.
+    """
+
+    def __init__(self, db_path: str = None, output_dir: str = None, fetch_size: int = 500):
+        self.db_path = db_path or get_db_manager().db_path
+        self.output_dir = output_dir or STATEMENT_DIR
+        self.fetch_size = fetch_size
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+
+    def _stream(self, query: str, params: tuple):
+        cursor = self.conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def accounts_for_month(self, month: str) -> List[int]:
+        """User ids with any booking or payment in the month"""
+        start, end = month_bounds(month)
+        rows = self.conn.execute("""
+            SELECT user_id FROM bookings WHERE booking_date >= ? AND booking_date < ?
+            UNION
+            SELECT b.user_id FROM payments p JOIN bookings b ON p.booking_id = b.booking_id
+            WHERE p.payment_time >= ? AND p.payment_time < ?
+            ORDER BY 1
+        """, (start, end, start, end)).fetchall()
+        return [row[0] for row in rows]
+
+    def generate(self, user_id: int, month: str) -> Optional[Dict]:
+        """
+        Render the statement for one account
+
+        Returns:
+            dict: {'user_id', 'path', 'bookings', 'charges', 'payments'} or None
+                  if the user does not exist
+        """
+        start, end = month_bounds(month)
+        user = self.conn.execute("SELECT user_id, name, email, phone FROM users WHERE user_id = ?",
+                                 (user_id,)).fetchone()
+        if not user:
+            return None
+
+        vehicle_count = self.conn.execute("""
+            SELECT COUNT(DISTINCT vehicle_id) FROM bookings
+            WHERE user_id = ? AND booking_date >= ? AND booking_date < ?
+        """, (user_id, start, end)).fetchone()[0]
+
+        out_dir = os.path.join(self.output_dir, month)
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"statement_{user_id}_{month}.pdf")
+
+        writer = _PageWriter(path, f"Statement {month} - {user['name']} ({user['email']})")
+        writer.text("MONTHLY PARKING STATEMENT", font='Helvetica-Bold', size=16, gap=1.6)
+        writer.text(f"Account: {user['name']}  |  {user['email']}  |  {user['phone']}")
+        writer.text(f"Period: {start} to {end} (exclusive)")
+        writer.text(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", gap=1.5)
+
+        totals = self._write_bookings(writer, user_id, start, end, fleet=vehicle_count > 1)
+        paid, refunded = self._write_payments(writer, user_id, start, end)
+
+        writer.set_columns(None)
+        writer.space()
+        writer.rule()
+        writer.text("SUMMARY", font='Helvetica-Bold', size=12, gap=1.3)
+        writer.text(f"Bookings: {totals['count']}    Hours parked: {totals['hours']:.2f}    "
+                    f"Vehicles: {vehicle_count}")
+        writer.text(f"Charges: ₹{totals['amount']:.2f}    Payments: ₹{paid:.2f}    "
+                    f"Refunds: ₹{refunded:.2f}", font='Helvetica-Bold')
+        writer.save()
+
+        return {'user_id': user_id, 'path': path, 'bookings': totals['count'],
+                'charges': round(totals['amount'], 2), 'payments': round(paid, 2)}
+
+    def _write_bookings(self, writer: _PageWriter, user_id: int, start: str, end: str,
+                        fleet: bool) -> Dict:
+        totals = {'count': 0, 'hours': 0.0, 'amount': 0.0}
+        current_vehicle = None
+        subtotal = {'count': 0, 'hours': 0.0, 'amount': 0.0}
+
+        def close_vehicle():
+            if fleet and current_vehicle is not None:
+                writer.row(['', f"Subtotal {current_vehicle}", '', f"{subtotal['hours']:.2f}",
+                            f"{subtotal['count']} bookings", f"{subtotal['amount']:.2f}"],
+                           font='Helvetica-Bold')
+                writer.space(0.5)
+
+        writer.text("BOOKINGS", font='Helvetica-Bold', size=12, gap=1.3)
+        writer.set_columns(BOOKING_COLUMNS)
+
+        rows = self._stream("""
+            SELECT b.booking_date, b.ticket_number, b.duration_hours, b.total_amount,
+                   b.booking_status, v.vehicle_number, ps.slot_number
+            FROM bookings b
+            JOIN vehicles v ON b.vehicle_id = v.vehicle_id
+            JOIN parking_slots ps ON b.slot_id = ps.slot_id
+            WHERE b.user_id = ? AND b.booking_date >= ? AND b.booking_date < ?
+            ORDER BY v.vehicle_number, b.booking_date, b.booking_id
+        """, (user_id, start, end))
+
+        for row in rows:
+            if row['vehicle_number'] != current_vehicle:
+                close_vehicle()
+                current_vehicle = row['vehicle_number']
+                subtotal = {'count': 0, 'hours': 0.0, 'amount': 0.0}
+                if fleet:
+                    writer.row([f"Vehicle {current_vehicle}", '', '', '', '', ''],
+                               font='Helvetica-Bold')
+
+            hours = row['duration_hours'] or 0.0
+            amount = row['total_amount'] if row['booking_status'] != 'cancelled' else None
+            writer.row([row['booking_date'], row['ticket_number'], row['slot_number'],
+                        f"{hours:.2f}", row['booking_status'],
+                        f"{amount:.2f}" if amount is not None else '-'])
+
+            for bucket in (totals, subtotal):
+                bucket['count'] += 1
+                bucket['hours'] += hours
+                bucket['amount'] += amount or 0.0
+
+        close_vehicle()
+        if not totals['count']:
+            writer.row(['No bookings in this period', '', '', '', '', ''])
+        return totals
+
+    def _write_payments(self, writer: _PageWriter, user_id: int, start: str, end: str):
+        writer.set_columns(None)
+        writer.space()
+        writer.text("PAYMENTS", font='Helvetica-Bold', size=12, gap=1.3)
+        writer.set_columns(PAYMENT_COLUMNS)
+
+        rows = self._stream("""
+            SELECT p.payment_time, p.transaction_id, p.payment_method, p.amount, p.refund_amount
+            FROM payments p
+            JOIN bookings b ON p.booking_id = b.booking_id
+            WHERE b.user_id = ? AND p.payment_time >= ? AND p.payment_time < ?
+            ORDER BY p.payment_time, p.payment_id
+        """, (user_id, start, end))
+
+        paid = refunded = 0.0
+        count = 0
+        for row in rows:
+            writer.row([str(row['payment_time'])[:16], row['transaction_id'] or '-',
+                        row['payment_method'], f"{row['refund_amount'] or 0:.2f}",
+                        f"{row['amount']:.2f}"])
+            paid += row['amount'] or 0.0
+            refunded += row['refund_amount'] or 0.0
+            count += 1
+
+        if not count:
+            writer.row(['No payments in this period', '', '', '', ''])
+        return paid, refunded
+
+    def close(self):
+        self.conn.close()
+
+
+# One generator (and SQLite connection) per worker process
+_worker_generator: Optional[StatementGenerator] = None
+
+
+def _init_worker(db_path: str, output_dir: str, fetch_size: int):
+    global _worker_generator
+    _worker_generator = StatementGenerator(db_path, output_dir, fetch_size)
+
+
+def _generate_statement(job: Tuple[int, str]) -> Dict:
+    user_id, month = job
+    try:
+        return _worker_generator.generate(user_id, month) or {'user_id': user_id, 'error': 'No such user'}
+    except Exception as e:
+        return {'user_id': user_id, 'error': str(e)}
+
+
+def generate_month_statements(month: str, user_ids: List[int] = None, workers: int = None,
+                              db_path: str = None, output_dir: str = None,
+                              fetch_size: int = 500) -> Dict:
+    """
+    Generate statements for every active account in `month` on a process pool
+
+    Returns:
+        dict: {'month', 'statements', 'failed', 'seconds', 'per_second'}
+    """
+    started = time.perf_counter()
+    db_path = db_path or get_db_manager().db_path
+
+    if user_ids is None:
+        lister = StatementGenerator(db_path, output_dir)
+        user_ids = lister.accounts_for_month(month)
+        lister.close()
+
+    jobs = [(user_id, month) for user_id in user_ids]
+    init_args = (db_path, output_dir, fetch_size)
+
+    if workers == 1 or len(jobs) < 2:
+        _init_worker(*init_args)
+        results = [_generate_statement(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=init_args) as pool:
+            results = list(pool.map(_generate_statement, jobs, chunksize=4))
+
+    elapsed = time.perf_counter() - started
+    done = [r for r in results if 'error' not in r]
+    return {
+        'month': month,
+        'statements': done,
+        'failed': [r for r in results if 'error' in r],
+        'seconds': round(elapsed, 2),
+        'per_second': round(len(done) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate monthly account statements")
+    parser.add_argument('month', help='YYYY-MM')
+    parser.add_argument('--users', type=int, nargs='*')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    summary = generate_month_statements(args.month, args.users, args.workers)
+    print(f"✓ {len(summary['statements'])} statements for {args.month} in {summary['seconds']}s "
+          f"({summary['per_second']}/s) -> {os.path.join(STATEMENT_DIR, args.month)}")
+    for failure in summary['failed']:
+        print(f"✗ User {failure['user_id']}: {failure['error']}")
@@ -4,6 +4,7 @@ import hashlib
 import re
 from typing import Optional, Dict
 from database.db_manager import get_db_manager
+from utils.plate_index import get_plate_index
 
 
 class UserAuth:
@@ -138,6 +139,7 @@ class UserManager:
         )
         
         if vehicle_id:
+            get_plate_index().add(vehicle_id, vehicle_number, self.user_id, vehicle_type)
             return True, f"Vehicle {vehicle_number} added successfully"
         return False, "Failed to add vehicle"
     
@@ -169,6 +171,7 @@ class UserManager:
         )
         
         if success:
+            get_plate_index().remove(vehicle_id)
             return True, "Vehicle deleted successfully"
         return False, "Failed to delete vehicle"
     
@@ -0,0 +1,13 @@
+"""URL configuration for analytics API"""
+
+from django.urls import path
+from . import views
+
+app_name = 'analytics'
+
+urlpatterns = [
+    path('dashboard/', views.dashboard_api_view, name='dashboard'),
+    path('revenue/', views.revenue_api_view, name='revenue'),
+    path('occupancy/', views.occupancy_api_view, name='occupancy'),
+    path('heatmap/', views.heatmap_api_view, name='heatmap'),
+]
@@ -0,0 +1,242 @@
+"""JSON analytics endpoints for dashboards and wall displays"""
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import wraps
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_GET
+
+# Make the project root importable so models/ can be shared with the desktop app
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+
+CACHE_ENTRIES = 64
+
+OCCUPANCY_RESOLUTIONS = {'15min': 900, '30min': 1800, '1h': 3600, '1D': 86400}
+
+# All computation happens on one thread: the shared DatabaseManager connection
+# belongs to the thread that opened it, and pollers that all miss on a new
+# data version queue behind a single recomputation instead of repeating it.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analytics')
+_analytics = None
+
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def data_version(clock: str = '') -> str:
+    """
+    Cheap token that changes whenever the analytics could
+
+    Combines the rollup dirty-log sequence (bumped by triggers on every
+    booking insert/update/delete), the slot status counts and a caller
+    supplied clock bucket for windows that roll over with time.
+    """
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SELECT MAX(seq) FROM analytics_dirty_log")
+            seq = cursor.fetchone()[0] or 0
+        except DatabaseError:
+            # Rollup tables are created by the first computation
+            seq = None
+        cursor.execute("SELECT status, COUNT(*) FROM parking_slots GROUP BY status ORDER BY status")
+        slots = cursor.fetchall()
+
+    content = json.dumps([seq, slots, clock], default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:20]
+
+
+def _get_analytics():
+    global _analytics
+    if _analytics is None:
+        from models.analytics import AnalyticsManager
+        _analytics = AnalyticsManager()
+    return _analytics
+
+
+def _lookup(key: tuple, version: str):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry['version'] == version:
+            _cache.move_to_end(key)
+            return entry
+    return None
+
+
+def _build(key: tuple, version: str, compute):
+    """Runs on the analytics thread; a queued duplicate finds the fresh entry"""
+    entry = _lookup(key, version)
+    if entry:
+        return entry
+
+    started = time.perf_counter()
+    payload = compute(_get_analytics())
+    body = json.dumps(payload, default=str).encode('utf-8')
+    entry = {
+        'version': version,
+        'etag': f'W/"{version}"',
+        'last_modified': int(time.time()),
+        'body': body,
+        'compute_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+    with _cache_lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return entry
+
+
+def _not_modified(request, entry) -> bool:
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # Weak comparison: ignore the W/ prefix
+        return '*' in tags or entry['etag'][2:] in [tag.removeprefix('W/') for tag in tags]
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and since >= entry['last_modified']
+
+
+def _respond(request, name: str, params: dict, compute, clock: str = ''):
+    """Serve a cached JSON payload, recomputing only when the data version moved"""
+    version = data_version(clock)
+    key = (name,) + tuple(sorted(params.items()))
+
+    entry = _lookup(key, version)
+    if entry is None:
+        entry = _executor.submit(_build, key, version, compute).result()
+
+    if _not_modified(request, entry):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry['body'], content_type='application/json')
+        response['X-Compute-Time'] = f"{entry['compute_ms']}ms"
+
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    # Always revalidate; with the validators above that is a cheap 304
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def analytics_api(view):
+    """Allow staff sessions, or a display sending the configured bearer token"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = getattr(settings, 'ANALYTICS_API_TOKEN', '')
+        header = request.headers.get('Authorization', '')
+        if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token):
+            return view(request, *args, **kwargs)
+        if request.user.is_authenticated and request.user.is_staff:
+            return view(request, *args, **kwargs)
+        return JsonResponse({'error': 'Staff login or API token required'}, status=403)
+    return require_GET(wrapper)
+
+
+def _int_param(request, name: str, default: int, low: int, high: int) -> int:
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _bad_request(error: Exception):
+    return JsonResponse({'error': str(error)}, status=400)
+
+
+@analytics_api
+def dashboard_api_view(request):
+    """Same report the desktop dashboard shows"""
+    return _respond(request, 'dashboard', {},
+                    lambda analytics: analytics.generate_dashboard_report(),
+                    clock=datetime.now().strftime('%Y-%m-%d'))
+
+
+@analytics_api
+def revenue_api_view(request):
+    """Revenue totals and per-day breakdown over the last ?days= days"""
+    try:
+        days = _int_param(request, 'days', 30, 1, 3660)
+    except ValueError as e:
+        return _bad_request(e)
+
+    def compute(analytics):
+        return {
+            'days': days,
+            'stats': analytics.get_revenue_stats(days),
+            'daily': analytics.get_daily_revenue(days),
+        }
+
+    return _respond(request, 'revenue', {'days': days}, compute,
+                    clock=datetime.now().strftime('%Y-%m-%d'))
+
+
+@analytics_api
+def occupancy_api_view(request):
+    """Current slot occupancy plus history over the last ?hours= hours"""
+    from models.occupancy import GROUP_COLUMNS
+
+    try:
+        hours = _int_param(request, 'hours', 24, 1, 24 * 90)
+        resolution = request.GET.get('resolution', '1h')
+        if resolution not in OCCUPANCY_RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {', '.join(OCCUPANCY_RESOLUTIONS)}")
+        group_by = [column for column in request.GET.get('group_by', '').split(',') if column]
+        unknown = set(group_by) - set(GROUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"group_by must be among {', '.join(GROUP_COLUMNS)}")
+    except ValueError as e:
+        return _bad_request(e)
+
+    # Open stays keep growing, so the history changes every bin even without writes
+    clock = str(int(time.time()) // OCCUPANCY_RESOLUTIONS[resolution])
+
+    def compute(analytics):
+        start = (datetime.now() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+        return {
+            'current': analytics.get_occupancy_trends(),
+            'history': analytics.get_occupancy_history(start, None, resolution, group_by),
+        }
+
+    params = {'hours': hours, 'resolution': resolution, 'group_by': ','.join(group_by)}
+    return _respond(request, 'occupancy', params, compute, clock=clock)
+
+
+@analytics_api
+def heatmap_api_view(request):
+    """Weekday x hour arrivals, departures and occupancy over the last ?weeks= weeks"""
+    try:
+        weeks = _int_param(request, 'weeks', 12, 1, 104)
+        bins_per_hour = _int_param(request, 'bins_per_hour', 1, 1, 12)
+        if 60 % bins_per_hour:
+            raise ValueError("bins_per_hour must be one of 1, 2, 3, 4, 6, 12")
+        tz = request.GET.get('tz') or None
+        if tz:
+            ZoneInfo(tz)
+    except (ValueError, ZoneInfoNotFoundError) as e:
+        return _bad_request(e)
+
+    def compute(analytics):
+        return analytics.get_heatmap(weeks, bins_per_hour, tz)
+
+    params = {'weeks': weeks, 'bins_per_hour': bins_per_hour, 'tz': tz or ''}
+    return _respond(request, 'heatmap', params, compute,
+                    clock=datetime.now().strftime('%Y-%m-%d %H'))
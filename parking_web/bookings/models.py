@@ -4,7 +4,13 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
-import json
+import os
+import sys
+
+# Make the project root importable so utils/ can be shared with the desktop app
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 
 
 class ParkingSlot(models.Model):
@@ -66,22 +72,21 @@ class Booking(models.Model):
     def __str__(self):
         return f"{self.ticket_number} - {self.user.name}"
     
-    def generate_qr_data(self):
-        """Generate QR code data for this booking"""
-        import sys
-        import os
-        # Add parent directory to path to import utils
-        parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        if parent_dir not in sys.path:
-            sys.path.insert(0, parent_dir)
+    def generate_qr_data(self, save_to_disk=None):
+        """
+        Generate QR code data for this booking
         
+        The image itself is rendered on request by the qr_image view; a PNG is
+        only written under media/qrcodes when QR_SAVE_TO_DISK is enabled.
+        """
         from utils.qr_handler import QRHandler
         
-        # Create output directory if it doesn't exist
+        if save_to_disk is None:
+            save_to_disk = getattr(settings, 'QR_SAVE_TO_DISK', False)
+        
         output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media', 'qrcodes')
-        os.makedirs(output_dir, exist_ok=True)
         
-        handler = QRHandler(output_dir=output_dir)
+        handler = QRHandler(output_dir=output_dir, save_to_disk=save_to_disk)
         qr_data, qr_path = handler.generate_booking_qr(
             booking_id=self.booking_id,
             ticket_number=self.ticket_number,
@@ -89,6 +94,7 @@ class Booking(models.Model):
             vehicle_number=self.vehicle.vehicle_number,
             slot_number=self.slot.slot_number
         )
+        handler.renderer.invalidate(self.booking_id)
         
         self.qr_code_data = qr_data
         self.qr_code_path = qr_path
@@ -96,6 +102,17 @@ class Booking(models.Model):
         
         return qr_path
     
+    def render_qr(self, fmt='png'):
+        """Return this booking's QR image as bytes, rendered in memory"""
+        from utils.qr_renderer import get_qr_renderer
+        from utils.qr_payload import error_correction_for
+        
+        if not self.qr_code_data:
+            self.generate_qr_data()
+        
+        return get_qr_renderer().get(self.booking_id, self.qr_code_data, fmt,
+                                     error_correction=error_correction_for(self.qr_code_data))
+    
     def is_expired(self):
         """Check if booking has expired (30-min window)"""
         if self.booking_status != 'pending':
@@ -124,11 +141,13 @@ class Booking(models.Model):
     
     @staticmethod
     def get_by_qr(qr_data):
-        """Get booking by QR code data"""
+        """Get booking by QR code data (compact signed or legacy JSON)"""
+        from utils.qr_payload import parse_booking_qr
+        
         try:
-            qr_dict = json.loads(qr_data)
+            qr_dict = parse_booking_qr(qr_data)
             booking_id = qr_dict.get('booking_id')
-            return Booking.objects.get(booking_id=booking_id)
+            return Booking.objects.get(booking_id=booking_id, ticket_number=qr_dict.get('ticket'))
         except:
             return None
 
@@ -13,4 +13,6 @@ urlpatterns = [
     path('booking/<int:booking_id>/', views.booking_detail_view, name='booking_detail'),
     path('booking/<int:booking_id>/cancel/', views.cancel_booking_view, name='cancel_booking'),
     path('booking/<int:booking_id>/qr/', views.view_qr_view, name='view_qr'),
+    path('booking/<int:booking_id>/qr.<str:fmt>', views.qr_image_view, name='qr_image'),
+    path('booking/<int:booking_id>/receipt.pdf', views.receipt_view, name='receipt'),
 ]
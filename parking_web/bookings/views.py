@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, HttpResponseNotModified, Http404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import connection
@@ -272,7 +273,7 @@ def view_qr_view(request, booking_id):
     """View QR code for booking"""
     booking = get_object_or_404(Booking, booking_id=booking_id, user_id=request.user.user_id)
     
-    if not booking.qr_code_path:
+    if not booking.qr_code_data:
         booking.generate_qr_data()
     
     # Check if expired
@@ -289,3 +290,92 @@ def view_qr_view(request, booking_id):
         'time_remaining': int(time_remaining) if time_remaining else None,
     }
     return render(request, 'bookings/view_qr.html', context)
+
+
+@login_required
+def qr_image_view(request, booking_id, fmt):
+    """Serve a booking's QR code as PNG or SVG, rendered in memory"""
+    from utils.qr_renderer import CONTENT_TYPES, QRRenderer
+    
+    if fmt not in CONTENT_TYPES:
+        raise Http404("Unsupported QR format")
+    
+    booking = get_object_or_404(Booking, booking_id=booking_id, user_id=request.user.user_id)
+    if not booking.qr_code_data:
+        booking.generate_qr_data()
+    
+    # The image is a pure function of the payload, so its digest is a strong ETag
+    etag = f'"{QRRenderer.data_digest(booking.qr_code_data)}-{fmt}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(booking.render_qr(fmt), content_type=CONTENT_TYPES[fmt])
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+@login_required
+def receipt_view(request, booking_id):
+    """Stream a booking's PDF receipt, rendered in memory and cached by content hash"""
+    from utils.receipt_renderer import get_receipt_renderer, receipt_hash
+    
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT b.booking_id, b.ticket_number, b.booking_status, b.entry_time, b.checkin_time,
+                   b.exit_time, b.checkout_time, b.duration_hours, b.base_amount,
+                   b.surge_amount, b.total_amount, b.qr_code_data,
+                   ps.slot_number, ps.base_price_per_hour, v.vehicle_number
+            FROM bookings b
+            JOIN parking_slots ps ON b.slot_id = ps.slot_id
+            JOIN vehicles v ON b.vehicle_id = v.vehicle_id
+            WHERE b.booking_id = %s AND b.user_id = %s
+        """, [booking_id, request.user.user_id])
+        row = cursor.fetchone()
+    
+    if not row:
+        raise Http404("Booking not found")
+    
+    (booking_id, ticket_number, status, entry_time, checkin_time, exit_time, checkout_time,
+     duration_hours, base_amount, surge_amount, total_amount, qr_code_data,
+     slot_number, base_price, vehicle_number) = row
+    
+    entry = checkin_time or entry_time
+    exit_ = checkout_time or exit_time
+    if duration_hours is None and entry and exit_:
+        start = datetime.fromisoformat(str(entry)).replace(tzinfo=None)
+        end = datetime.fromisoformat(str(exit_)).replace(tzinfo=None)
+        duration_hours = round((end - start).total_seconds() / 3600, 2)
+    
+    bill = {
+        'booking_id': booking_id,
+        'ticket_number': ticket_number,
+        'vehicle_number': vehicle_number,
+        'slot_number': slot_number,
+        'entry_time': str(entry or 'N/A'),
+        'exit_time': str(exit_ or 'N/A'),
+        'duration_hours': duration_hours or 0,
+        'base_price': float(base_price or 0),
+        'base_amount': float(base_amount or 0),
+        'surge_amount': float(surge_amount or 0),
+        'total_amount': float(total_amount or 0),
+        # Stable footer so an unchanged booking keeps the same receipt hash
+        'generated_at': str(exit_ or entry or ''),
+    }
+    
+    # Only live bookings print their entry QR
+    qr_data = qr_code_data if status in ('pending', 'active') else None
+    
+    # The hash needs no rendering, so revalidation never builds a PDF
+    etag = f'"{receipt_hash(bill, qr_data)}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        _, pdf = get_receipt_renderer().get(bill, qr_data)
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="receipt_{ticket_number}.pdf"'
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'bookings',
     'payments',
     'vehicles',
+    'analytics',
 ]
 
 # Authentication backends
@@ -154,5 +155,11 @@ RAZORPAY_KEY_SECRET = 'your_secret_key'
 BOOKING_CHECKIN_WINDOW_MINUTES = 30
 PRICE_PER_HOUR = 20.00
 
+# QR images are rendered in memory by bookings:qr_image; set True to also keep PNGs in media/qrcodes
+QR_SAVE_TO_DISK = False
+
+# /api/analytics/ serves staff sessions; wall displays may send "Authorization: Bearer <token>" instead
+ANALYTICS_API_TOKEN = ''
+
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
@@ -14,6 +14,7 @@ urlpatterns = [
     path('bookings/', include('bookings.urls')),
     path('vehicles/', include('vehicles.urls')),
     path('payments/', include('payments.urls')),
+    path('api/analytics/', include('analytics.urls')),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,123 @@
+"""Per-Stage Timing and Counters for the License Plate Detector"""
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# Shared no-op context returned by the detector while instrumentation is off
+NULL_STAGE = nullcontext()
+
+DEFAULT_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000]
+
+
+class DetectorMetrics:
+    """
+    Rolling in-memory histograms of stage timings and per-frame counters
+
+    Every `stage()` timing and `observe()` value goes into a bounded window of
+    the most recent `window` samples per name. Stages timed once per frame
+    therefore cover the last `window` frames, while per-call series such as
+    `ocr_call_ms` (one sample per OCR attempt) cover far fewer. Per-frame
+    totals of every series are kept in `last_frame`, and if `log_path` is
+    given, one JSON line per frame is appended to it.
+    """
+
+    def __init__(self, window: int = 500, log_path: str = None):
+        self.window = window
+        self.log_path = log_path
+        self._series: Dict[str, deque] = {}
+        self._counters: Dict[str, int] = {}
+        self._frame: Optional[Dict] = None
+        self.last_frame: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{name}_ms", (time.perf_counter() - start) * 1000)
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = deque(maxlen=self.window)
+            series.append(value)
+            if self._frame is not None:
+                self._frame['values'][name] = self._frame['values'].get(name, 0) + value
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+            if self._frame is not None:
+                self._frame['counters'][name] = self._frame['counters'].get(name, 0) + amount
+
+    def begin_frame(self):
+        with self._lock:
+            self._frame = {'values': {}, 'counters': {}}
+        self.count('frames')
+
+    def end_frame(self, **fields):
+        with self._lock:
+            frame, self._frame = self._frame, None
+        if frame is None:
+            return
+
+        frame['timestamp'] = datetime.now().isoformat()
+        frame['values'] = {k: round(v, 3) for k, v in frame['values'].items()}
+        frame.update(fields)
+        self.last_frame = frame
+
+        if self.log_path:
+            try:
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(frame) + '\n')
+            except OSError as e:
+                print(f"Metrics log error: {e}")
+
+    def histogram(self, name: str, buckets: List[float] = None) -> Dict[str, int]:
+        """Bucket counts for one series, e.g. {'<=5': 3, '<=10': 12, '>2000': 0}"""
+        buckets = buckets or DEFAULT_BUCKETS_MS
+        with self._lock:
+            values = np.fromiter(self._series.get(name, ()), dtype=np.float64)
+
+        counts = np.histogram(values, bins=[-np.inf] + list(buckets) + [np.inf])[0]
+        labels = [f"<={b}" for b in buckets] + [f">{buckets[-1]}"]
+        return dict(zip(labels, counts.tolist()))
+
+    def snapshot(self) -> Dict:
+        """Summary statistics for every series plus lifetime counters"""
+        with self._lock:
+            series = {name: np.fromiter(values, dtype=np.float64)
+                      for name, values in self._series.items()}
+            counters = dict(self._counters)
+
+        stats = {}
+        for name, values in series.items():
+            if not len(values):
+                continue
+            stats[name] = {
+                'count': int(len(values)),
+                'mean': round(float(values.mean()), 3),
+                'p50': round(float(np.percentile(values, 50)), 3),
+                'p95': round(float(np.percentile(values, 95)), 3),
+                'max': round(float(values.max()), 3),
+            }
+
+        return {'series': stats, 'counters': counters}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+            self._frame = None
+            self.last_frame = None
@@ -6,18 +6,46 @@ import numpy as np
 import re
 from typing import Optional, Tuple
 import imutils
+from utils.detector_metrics import DetectorMetrics, NULL_STAGE
+from utils.plate_cache import PlateReadCache, perceptual_hash
 
 
 class LicensePlateDetector:
     """Detect and read license plates from images or camera"""
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 0, cache_max_distance: int = 6):
         # Set tesseract path (update this path based on installation)
         # Download from: https://github.com/UB-Mannheim/tesseract/wiki
         try:
             pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
         except:
             pass  # Will use system PATH
+        
+        # Instrumentation is off unless enable_metrics() is called
+        self.metrics = None
+        
+        # Opt-in: near-identical plate crops (e.g. a parked car filmed for
+        # hours) reuse the previous reading instead of running OCR again.
+        # Off by default, since a near-hash hit can return a different car's
+        # plate, which must never happen where a reading opens a barrier.
+        self.read_cache = PlateReadCache(cache_size, cache_max_distance) if cache_size else None
+        
+        # Share of OCR variants that agreed with the last returned reading
+        self.last_confidence = 0.0
+    
+    def enable_metrics(self, metrics: DetectorMetrics = None, window: int = 500,
+                       log_path: str = None) -> DetectorMetrics:
+        """Record per-stage timings and counters for every processed frame"""
+        self.metrics = metrics or DetectorMetrics(window=window, log_path=log_path)
+        return self.metrics
+    
+    def disable_metrics(self):
+        self.metrics = None
+    
+    def _stage(self, name):
+        if self.metrics is None:
+            return NULL_STAGE
+        return self.metrics.stage(name)
     
     def preprocess_image(self, image):
         """Preprocess image for better plate detection - multiple techniques"""
@@ -58,21 +86,43 @@ class LicensePlateDetector:
         if contour is None:
             return None
         
-        mask = np.zeros(image.shape[:2], dtype=np.uint8)
-        cv2.drawContours(mask, [contour], -1, 255, -1)
-        
-        x, y, w, h = cv2.boundingRect(contour)
-        plate_region = image[y:y+h, x:x+w]
-        plate_region = cv2.resize(plate_region, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
-        
-        gray_plate = cv2.cvtColor(plate_region, cv2.COLOR_BGR2GRAY)
+        with self._stage('plate_crop'):
+            mask = np.zeros(image.shape[:2], dtype=np.uint8)
+            cv2.drawContours(mask, [contour], -1, 255, -1)
+            
+            x, y, w, h = cv2.boundingRect(contour)
+            plate_region = image[y:y+h, x:x+w]
+            plate_region = cv2.resize(plate_region, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
+            gray_plate = cv2.cvtColor(plate_region, cv2.COLOR_BGR2GRAY)
+        
+        plate_hash = None
+        if self.read_cache is not None:
+            with self._stage('plate_hash'):
+                plate_hash = perceptual_hash(gray_plate)
+                cached = self.read_cache.get(plate_hash)
+            if cached is not None:
+                if self.metrics:
+                    self.metrics.count('cache_hits')
+                text, self.last_confidence = cached
+                return text
+            if self.metrics:
+                self.metrics.count('cache_misses')
+        
+        self.last_confidence = 0.0
         height, width = gray_plate.shape
         is_two_line = height > width * 0.4
         
         if is_two_line:
-            return self.extract_text_two_line(gray_plate)
+            text = self.extract_text_two_line(gray_plate)
         else:
-            return self.extract_text_single_line(gray_plate)
+            text = self.extract_text_single_line(gray_plate)
+        
+        # Failed reads are not cached: the cache has no TTL, so a single blurry
+        # frame would otherwise stop the same car from ever being OCR'd again
+        if plate_hash is not None and text:
+            self.read_cache.put(plate_hash, text, self.last_confidence)
+        
+        return text
     
     def extract_text_two_line(self, gray_plate):
         """Extract text from two-line license plates (4 chars top, 6 chars bottom)"""
@@ -92,22 +142,23 @@ class LicensePlateDetector:
         bottom_results = []
         
         for half, results_list in [(top_half, top_results), (bottom_half, bottom_results)]:
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(half)
-            _, thresh1 = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            bilateral = cv2.bilateralFilter(half, 9, 75, 75)
-            thresh2 = cv2.adaptiveThreshold(
-                bilateral, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 11, 2
-            )
-            
-            blur = cv2.GaussianBlur(half, (5, 5), 0)
-            _, thresh3 = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-            morph = cv2.morphologyEx(half, cv2.MORPH_CLOSE, kernel)
-            _, thresh4 = cv2.threshold(morph, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            with self._stage('thresholds'):
+                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+                enhanced = clahe.apply(half)
+                _, thresh1 = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                
+                bilateral = cv2.bilateralFilter(half, 9, 75, 75)
+                thresh2 = cv2.adaptiveThreshold(
+                    bilateral, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                    cv2.THRESH_BINARY, 11, 2
+                )
+                
+                blur = cv2.GaussianBlur(half, (5, 5), 0)
+                _, thresh3 = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                
+                kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+                morph = cv2.morphologyEx(half, cv2.MORPH_CLOSE, kernel)
+                _, thresh4 = cv2.threshold(morph, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
             
             configs = [
                 '--psm 7 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
@@ -117,12 +168,18 @@ class LicensePlateDetector:
             for thresh in [thresh1, thresh2, thresh3, thresh4]:
                 for config in configs:
                     try:
-                        text = pytesseract.image_to_string(thresh, config=config)
+                        with self._stage('ocr_call'):
+                            text = pytesseract.image_to_string(thresh, config=config)
                         text = self.clean_ocr_text(text)
                         if len(text) >= 2:  # At least 2 characters
                             results_list.append(text)
                     except:
+                        if self.metrics:
+                            self.metrics.count('ocr_errors')
                         continue
+                    finally:
+                        if self.metrics:
+                            self.metrics.count('candidates_tried')
         
         # Get most common result for each line
         from collections import Counter
@@ -131,17 +188,30 @@ class LicensePlateDetector:
         bottom_text = ""
         
         if top_results:
-            top_text = Counter(top_results).most_common(1)[0][0]
+            top_text, top_votes = Counter(top_results).most_common(1)[0]
+            if self.metrics:
+                self.metrics.observe('consensus_size', top_votes)
         
         if bottom_results:
-            bottom_text = Counter(bottom_results).most_common(1)[0][0]
+            bottom_text, bottom_votes = Counter(bottom_results).most_common(1)[0]
+            if self.metrics:
+                self.metrics.observe('consensus_size', bottom_votes)
         
         # Combine top and bottom
         combined = top_text + bottom_text
         
         if len(combined) >= 6:
             corrected = self.correct_ocr_errors(combined)
-            return corrected if self.validate_plate_format(corrected) else None
+            if self.validate_plate_format(corrected):
+                shares = []
+                if top_results:
+                    shares.append(top_votes / len(top_results))
+                if bottom_results:
+                    shares.append(bottom_votes / len(bottom_results))
+                self.last_confidence = round(sum(shares) / len(shares), 3)
+                return corrected
+            if self.metrics:
+                self.metrics.count('rejected_by_validation')
         
         return None
     
@@ -149,29 +219,30 @@ class LicensePlateDetector:
         """Extract text from single-line license plates"""
         results = []
         
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        enhanced = clahe.apply(gray_plate)
-        _, thresh1 = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        bilateral = cv2.bilateralFilter(gray_plate, 9, 75, 75)
-        thresh2 = cv2.adaptiveThreshold(
-            bilateral, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY, 11, 2
-        )
-        
-        blur = cv2.GaussianBlur(gray_plate, (5, 5), 0)
-        _, thresh3 = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        morph = cv2.morphologyEx(gray_plate, cv2.MORPH_CLOSE, kernel)
-        morph = cv2.morphologyEx(morph, cv2.MORPH_OPEN, kernel)
-        _, thresh4 = cv2.threshold(morph, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        _, thresh5 = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        
-        kernel_sharp = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-        sharpened = cv2.filter2D(gray_plate, -1, kernel_sharp)
-        _, thresh6 = cv2.threshold(sharpened, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        with self._stage('thresholds'):
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+            enhanced = clahe.apply(gray_plate)
+            _, thresh1 = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            
+            bilateral = cv2.bilateralFilter(gray_plate, 9, 75, 75)
+            thresh2 = cv2.adaptiveThreshold(
+                bilateral, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                cv2.THRESH_BINARY, 11, 2
+            )
+            
+            blur = cv2.GaussianBlur(gray_plate, (5, 5), 0)
+            _, thresh3 = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+            morph = cv2.morphologyEx(gray_plate, cv2.MORPH_CLOSE, kernel)
+            morph = cv2.morphologyEx(morph, cv2.MORPH_OPEN, kernel)
+            _, thresh4 = cv2.threshold(morph, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            
+            _, thresh5 = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            
+            kernel_sharp = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+            sharpened = cv2.filter2D(gray_plate, -1, kernel_sharp)
+            _, thresh6 = cv2.threshold(sharpened, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
         
         configs = [
             '--psm 7 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
@@ -182,23 +253,43 @@ class LicensePlateDetector:
         for thresh in [thresh1, thresh2, thresh3, thresh4, thresh5, thresh6]:
             for config in configs:
                 try:
-                    text = pytesseract.image_to_string(thresh, config=config)
+                    with self._stage('ocr_call'):
+                        text = pytesseract.image_to_string(thresh, config=config)
                     text = self.clean_ocr_text(text)
                     
                     if len(text) >= 6 and len(text) <= 15:
                         results.append(text)
                 except:
+                    if self.metrics:
+                        self.metrics.count('ocr_errors')
                     continue
+                finally:
+                    if self.metrics:
+                        self.metrics.count('candidates_tried')
         
         # Return most common result with OCR error correction
         if results:
             from collections import Counter
-            most_common = Counter(results).most_common(1)[0][0]
+            most_common, votes = Counter(results).most_common(1)[0]
+            if self.metrics:
+                self.metrics.observe('consensus_size', votes)
             corrected = self.correct_ocr_errors(most_common)
-            return corrected if self.validate_plate_format(corrected) else None
+            if self.validate_plate_format(corrected):
+                self.last_confidence = round(votes / len(results), 3)
+                return corrected
+            if self.metrics:
+                self.metrics.count('rejected_by_validation')
         
         return None
     
+    def get_cache_stats(self) -> dict:
+        """Hit-rate metrics for the plate read cache"""
+        if self.read_cache is None:
+            return {'enabled': False}
+        stats = self.read_cache.stats()
+        stats['enabled'] = True
+        return stats
+    
     def clean_ocr_text(self, text):
         """Clean OCR output"""
         text = text.strip().upper()
@@ -263,13 +354,30 @@ class LicensePlateDetector:
         Detect license plate from image frame with improved accuracy
         Returns: (plate_text, annotated_image) or (None, original_image)
         """
+        metrics = self.metrics
+        if metrics is None:
+            return self._detect_from_frame(frame)
+        
+        metrics.begin_frame()
+        with metrics.stage('total'):
+            plate_text, annotated = self._detect_from_frame(frame)
+        metrics.end_frame(plate=plate_text)
+        return plate_text, annotated
+    
+    def _detect_from_frame(self, frame: np.ndarray) -> Optional[Tuple[str, np.ndarray]]:
         try:
-            frame = imutils.resize(frame, width=600)
-            gray, edged, adaptive = self.preprocess_image(frame)
-            plate_contour = self.find_license_plate_contour(edged)
+            with self._stage('resize'):
+                frame = imutils.resize(frame, width=600)
+            with self._stage('preprocess'):
+                gray, edged, adaptive = self.preprocess_image(frame)
+            with self._stage('contour'):
+                plate_contour = self.find_license_plate_contour(edged)
             
             if plate_contour is not None:
-                plate_text = self.extract_text_from_plate(frame, plate_contour)
+                if self.metrics:
+                    self.metrics.count('plates_found')
+                with self._stage('extract'):
+                    plate_text = self.extract_text_from_plate(frame, plate_contour)
                 annotated = frame.copy()
                 cv2.drawContours(annotated, [plate_contour], -1, (0, 255, 0), 3)
                 
@@ -7,39 +7,71 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 from datetime import datetime
+import io
 import os
 
 
+# Styles are built once per process and shared by every document
+_BASE_STYLES = getSampleStyleSheet()
+
+RECEIPT_TITLE_STYLE = ParagraphStyle(
+    'ReceiptTitle',
+    parent=_BASE_STYLES['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#1e3a8a'),
+    spaceAfter=30,
+    alignment=TA_CENTER
+)
+
+RECEIPT_FOOTER_STYLE = ParagraphStyle(
+    'ReceiptFooter',
+    parent=_BASE_STYLES['Normal'],
+    fontSize=10,
+    alignment=TA_CENTER,
+    textColor=colors.grey
+)
+
+RECEIPT_TABLE_STYLE = TableStyle([
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 12),
+    ('FONT', (0, -1), (-1, -1), 'Helvetica-Bold', 14),
+    ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#1e3a8a')),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTSIZE', (0, -1), (-1, -1), 16),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('LINEABOVE', (0, -1), (-1, -1), 2, colors.black),
+])
+
+TICKET_TITLE_STYLE = ParagraphStyle(
+    'TicketTitle',
+    parent=_BASE_STYLES['Heading1'],
+    fontSize=22,
+    textColor=colors.HexColor('#1e3a8a'),
+    spaceAfter=20,
+    alignment=TA_CENTER
+)
+
+TICKET_TABLE_STYLE = TableStyle([
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 12),
+    ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 12),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+
 class PDFGenerator:
     
     def __init__(self):
         self.output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
                                       'outputs', 'tickets')
         os.makedirs(self.output_dir, exist_ok=True)
-        self.styles = getSampleStyleSheet()
+        self.styles = _BASE_STYLES
     
-    def generate_parking_receipt(self, bill_data: dict, qr_code_path: str = None) -> str:
-        """Generate PDF parking receipt"""
-        filename = f"receipt_{bill_data['ticket_number']}.pdf"
-        filepath = os.path.join(self.output_dir, filename)
-
-        doc = SimpleDocTemplate(filepath, pagesize=letter)
-        story = []
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1e3a8a'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
-        story.append(Paragraph("PARKING RECEIPT", title_style))
-        story.append(Spacer(1, 0.2*inch))
+    def _build_receipt_story(self, bill_data: dict, qr_image=None, generated_at: str = None) -> list:
+        story = [Paragraph("PARKING RECEIPT", RECEIPT_TITLE_STYLE), Spacer(1, 0.2*inch)]
         
-        if qr_code_path and os.path.exists(qr_code_path):
-            img = Image(qr_code_path, width=1.5*inch, height=1.5*inch)
-            story.append(img)
+        if qr_image is not None:
+            story.append(Image(qr_image, width=1.5*inch, height=1.5*inch))
             story.append(Spacer(1, 0.2*inch))
         
         data = [
@@ -58,33 +90,91 @@ class PDFGenerator:
         ]
         
         table = Table(data, colWidths=[3*inch, 3*inch])
-        table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 12),
-            ('FONT', (0, -1), (-1, -1), 'Helvetica-Bold', 14),
-            ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#1e3a8a')),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTSIZE', (0, -1), (-1, -1), 16),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('LINEABOVE', (0, -1), (-1, -1), 2, colors.black),
-        ]))
+        table.setStyle(RECEIPT_TABLE_STYLE)
         
         story.append(table)
         story.append(Spacer(1, 0.5*inch))
         
-        footer_style = ParagraphStyle(
-            parent=self.styles['Normal'],
-            fontSize=10,
-            alignment=TA_CENTER,
-            textColor=colors.grey
-        )
-        story.append(Paragraph("Thank you for using Smart Parking System!", footer_style))
-        story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 
-                              footer_style))
+        generated_at = generated_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        story.append(Paragraph("Thank you for using Smart Parking System!", RECEIPT_FOOTER_STYLE))
+        story.append(Paragraph(f"Generated: {generated_at}", RECEIPT_FOOTER_STYLE))
+        return story
+    
+    def generate_parking_receipt(self, bill_data: dict, qr_code_path: str = None) -> str:
+        """Generate PDF parking receipt"""
+        filename = f"receipt_{bill_data['ticket_number']}.pdf"
+        filepath = os.path.join(self.output_dir, filename)
         
-        doc.build(story)
+        qr_image = qr_code_path if qr_code_path and os.path.exists(qr_code_path) else None
+        doc = SimpleDocTemplate(filepath, pagesize=letter)
+        doc.build(self._build_receipt_story(bill_data, qr_image))
         return filepath
     
+    def render_parking_receipt(self, bill_data: dict, qr_png: bytes = None,
+                               generated_at: str = None) -> bytes:
+        """
+        Render a parking receipt straight to PDF bytes
+        
+        The document is built in invariant mode, so the same bill always
+        produces byte-identical output.
+        
+        Args:
+            bill_data: Same fields as generate_parking_receipt
+            qr_png: Optional PNG bytes of the booking QR
+            generated_at: Text for the footer timestamp (default now)
+        """
+        buffer = io.BytesIO()
+        qr_image = io.BytesIO(qr_png) if qr_png else None
+        doc = SimpleDocTemplate(buffer, pagesize=letter, invariant=1)
+        doc.build(self._build_receipt_story(bill_data, qr_image, generated_at))
+        return buffer.getvalue()
+    
+    def generate_booking_ticket(self, ticket_data: dict, qr_png: bytes = None, output=None):
+        """
+        Generate a pre-booking PDF ticket with its entry QR code
+        
+        Args:
+            ticket_data: Booking fields (ticket_number, name, vehicle_number, slot_number, ...)
+            qr_png: PNG bytes of the booking QR
+            output: File path or writable file object (default outputs/tickets)
+            
+        Returns:
+            The path or file object the PDF was written to
+        """
+        if output is None:
+            output = os.path.join(self.output_dir, f"ticket_{ticket_data['ticket_number']}.pdf")
+        
+        doc = SimpleDocTemplate(output, pagesize=A4)
+        story = []
+        
+        story.append(Paragraph("PARKING TICKET", TICKET_TITLE_STYLE))
+        
+        if qr_png:
+            story.append(Image(io.BytesIO(qr_png), width=2*inch, height=2*inch))
+            story.append(Spacer(1, 0.2*inch))
+        
+        location = ' - '.join(str(ticket_data[k]) for k in ('floor', 'section')
+                              if ticket_data.get(k) is not None)
+        data = [
+            ['Ticket Number:', ticket_data.get('ticket_number', 'N/A')],
+            ['Name:', ticket_data.get('name', 'N/A')],
+            ['Vehicle Number:', ticket_data.get('vehicle_number', 'N/A')],
+            ['Slot:', ticket_data.get('slot_number', 'N/A')],
+            ['Location:', location or 'N/A'],
+            ['Booked At:', str(ticket_data.get('booking_time') or 'N/A')],
+            ['Check-in By:', str(ticket_data.get('checkin_deadline') or 'N/A')],
+        ]
+        
+        table = Table(data, colWidths=[2.5*inch, 3.5*inch])
+        table.setStyle(TICKET_TABLE_STYLE)
+        story.append(table)
+        story.append(Spacer(1, 0.4*inch))
+        
+        story.append(Paragraph("Show this QR code at the entry gate", RECEIPT_FOOTER_STYLE))
+        
+        doc.build(story)
+        return output
+    
     def generate_monthly_report(self, user_data: dict, bookings: list) -> str:
         filename = f"monthly_report_{user_data['user_id']}_{datetime.now().strftime('%Y%m')}.pdf"
         report_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'outputs', 'reports')
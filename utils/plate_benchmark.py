@@ -0,0 +1,393 @@
+"""Synthetic License Plate Corpus and Accuracy/Latency Benchmark"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageEnhance
+
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'outputs', 'benchmarks')
+
+STATE_CODES = ['MH', 'KA', 'DL', 'TN', 'GJ', 'UP', 'RJ', 'KL', 'AP', 'TS', 'WB', 'HR', 'PB', 'MP']
+SERIES_LETTERS = 'ABCDEFGHJKLMNPRSTUVWXYZ'
+
+FONT_CANDIDATES = [
+    'DejaVuSans-Bold.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+    'arialbd.ttf',
+    'C:\\Windows\\Fonts\\arialbd.ttf',
+]
+
+
+def _load_font(size: int):
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Plain Levenshtein distance used for character error rate"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j - 1] + (ca != cb),
+                               previous[j] + 1,
+                               current[j - 1] + 1))
+        previous = current
+    return previous[-1]
+
+
+class SyntheticPlateGenerator:
+    """Render Indian-format plates on a synthetic scene with capture artifacts"""
+
+    def __init__(self, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+
+    def random_plate_text(self) -> str:
+        """e.g. MH12AB1234 or DL03CAF0042"""
+        rng = self.rng
+        state = rng.choice(STATE_CODES)
+        district = f"{rng.randint(1, 99):02d}"
+        series = ''.join(rng.choice(SERIES_LETTERS) for _ in range(rng.choice([1, 2, 2, 3])))
+        number = f"{rng.randint(1, 9999):04d}"
+        return f"{state}{district}{series}{number}"
+
+    def render_plate(self, text: str, two_line: bool = False) -> Image.Image:
+        """Draw a clean white plate with a black border"""
+        if two_line:
+            width, height = 340, 200
+            split = 4
+            lines = [text[:split], text[split:]]
+            font = _load_font(78)
+        else:
+            width, height = 520, 120
+            lines = [text]
+            font = _load_font(84)
+
+        plate = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(plate)
+        draw.rectangle([2, 2, width - 3, height - 3], outline='black', width=6)
+
+        # Shrink the font until the longest line fits inside the border
+        size = font.size
+        while size > 20:
+            widest = max(draw.textbbox((0, 0), line, font=font)[2] for line in lines)
+            if widest <= width - 40:
+                break
+            size -= 4
+            font = _load_font(size)
+
+        line_height = height / len(lines)
+        for i, line in enumerate(lines):
+            left, top, right, bottom = draw.textbbox((0, 0), line, font=font)
+            x = (width - (right - left)) / 2 - left
+            y = line_height * i + (line_height - (bottom - top)) / 2 - top
+            draw.text((x, y), line, fill='black', font=font)
+
+        return plate
+
+    def place_in_scene(self, plate: Image.Image) -> Image.Image:
+        """Put the plate on a car-like background at a random position"""
+        scene_w, scene_h = 800, 600
+        base = self.np_rng.integers(40, 110)
+        scene = np.full((scene_h, scene_w, 3), base, dtype=np.uint8)
+        scene += self.np_rng.integers(0, 20, size=scene.shape, dtype=np.uint8)
+        image = Image.fromarray(scene)
+
+        draw = ImageDraw.Draw(image)
+        body = tuple(int(c) for c in self.np_rng.integers(30, 200, size=3))
+        draw.rounded_rectangle([80, 150, 720, 560], radius=40, fill=body)
+
+        scale = self.rng.uniform(0.7, 1.05)
+        plate = plate.resize((int(plate.width * scale), int(plate.height * scale)))
+        x = self.rng.randint(120, max(121, 680 - plate.width))
+        y = self.rng.randint(300, max(301, 540 - plate.height))
+        image.paste(plate, (x, y))
+        return image
+
+    def apply_perspective(self, image: Image.Image, strength: float) -> Image.Image:
+        width, height = image.size
+        jitter = lambda: self.rng.uniform(-strength, strength)
+        corners = [
+            (jitter() * width, jitter() * height),
+            (width + jitter() * width, jitter() * height),
+            (width + jitter() * width, height + jitter() * height),
+            (jitter() * width, height + jitter() * height),
+        ]
+        coeffs = self._perspective_coefficients(
+            [(0, 0), (width, 0), (width, height), (0, height)], corners)
+        return image.transform(image.size, Image.Transform.PERSPECTIVE, coeffs,
+                               Image.Resampling.BICUBIC, fillcolor=(60, 60, 60))
+
+    @staticmethod
+    def _perspective_coefficients(dst, src):
+        matrix = []
+        for (x, y), (u, v) in zip(dst, src):
+            matrix.append([x, y, 1, 0, 0, 0, -u * x, -u * y])
+            matrix.append([0, 0, 0, x, y, 1, -v * x, -v * y])
+        a = np.array(matrix, dtype=np.float64)
+        b = np.array(src, dtype=np.float64).reshape(8)
+        return np.linalg.solve(a, b).tolist()
+
+    def apply_lighting(self, image: Image.Image, brightness: float, contrast: float) -> Image.Image:
+        image = ImageEnhance.Brightness(image).enhance(brightness)
+        image = ImageEnhance.Contrast(image).enhance(contrast)
+
+        # Directional gradient, as from a headlight or low sun
+        array = np.asarray(image).astype(np.float32)
+        gradient = np.linspace(self.rng.uniform(0.6, 1.0), self.rng.uniform(1.0, 1.3),
+                               array.shape[1], dtype=np.float32)
+        array *= gradient[None, :, None]
+        return Image.fromarray(np.clip(array, 0, 255).astype(np.uint8))
+
+    def apply_noise(self, image: Image.Image, sigma: float) -> Image.Image:
+        array = np.asarray(image).astype(np.float32)
+        array += self.np_rng.normal(0, sigma, size=array.shape)
+        return Image.fromarray(np.clip(array, 0, 255).astype(np.uint8))
+
+    def generate_sample(self, two_line: bool = None) -> Dict:
+        """Render one plate image and return it with its ground truth"""
+        if two_line is None:
+            two_line = self.rng.random() < 0.3
+
+        text = self.random_plate_text()
+        params = {
+            'two_line': two_line,
+            'perspective': round(self.rng.uniform(0.0, 0.06), 3),
+            'blur': round(self.rng.choice([0, 0, 0.6, 1.2, 2.0]), 2),
+            'noise': round(self.rng.choice([0, 4, 8, 14]), 1),
+            'brightness': round(self.rng.uniform(0.55, 1.35), 2),
+            'contrast': round(self.rng.uniform(0.6, 1.3), 2),
+        }
+
+        image = self.place_in_scene(self.render_plate(text, two_line))
+        if params['perspective']:
+            image = self.apply_perspective(image, params['perspective'])
+        if params['blur']:
+            image = image.filter(ImageFilter.GaussianBlur(params['blur']))
+        image = self.apply_lighting(image, params['brightness'], params['contrast'])
+        if params['noise']:
+            image = self.apply_noise(image, params['noise'])
+
+        return {'text': text, 'image': image, 'params': params}
+
+    def generate_corpus(self, count: int = 200, output_dir: str = None) -> str:
+        """
+        Write `count` plate images plus a manifest.json
+
+        Returns:
+            str: Path to the manifest
+        """
+        output_dir = output_dir or os.path.join(BENCHMARK_DIR, 'corpus')
+        os.makedirs(output_dir, exist_ok=True)
+
+        samples = []
+        for i in range(count):
+            sample = self.generate_sample()
+            filename = f"plate_{i:05d}.png"
+            sample['image'].save(os.path.join(output_dir, filename))
+            samples.append({'file': filename, 'text': sample['text'], 'params': sample['params']})
+
+        manifest_path = os.path.join(output_dir, 'manifest.json')
+        with open(manifest_path, 'w') as f:
+            json.dump({'count': count, 'samples': samples}, f, indent=2)
+
+        return manifest_path
+
+
+class PlateBenchmark:
+    """Run LicensePlateDetector over a corpus and score it"""
+
+    # 'detect' is the detector's own end-to-end time for the frame;
+    # the stages between load and detect are its internal breakdown
+    STAGES = ['load', 'resize', 'preprocess', 'contour', 'extract', 'detect']
+
+    def __init__(self, detector=None):
+        if detector is None:
+            from utils.license_plate_detector import LicensePlateDetector
+            # The read cache would hide OCR cost on look-alike samples
+            detector = LicensePlateDetector(cache_size=0)
+        self.detector = detector
+        self.metrics = detector.metrics or detector.enable_metrics()
+
+    def run_sample(self, image_path: str) -> Dict:
+        """Time one image through detect_from_frame, the same path the gate uses"""
+        import cv2
+
+        t = time.perf_counter()
+        image = cv2.imread(image_path)
+        load_ms = (time.perf_counter() - t) * 1000
+
+        text, _ = self.detector.detect_from_frame(image)
+        frame = self.metrics.last_frame or {'values': {}, 'counters': {}}
+        values = frame['values']
+
+        timings = {'load': round(load_ms, 3)}
+        for stage in self.STAGES[1:-1]:
+            timings[stage] = values.get(f'{stage}_ms', 0.0)
+        timings['detect'] = values.get('total_ms', 0.0)
+
+        return {
+            'prediction': text,
+            'plate_found': frame['counters'].get('plates_found', 0) > 0,
+            'timings_ms': timings,
+        }
+
+    def run(self, manifest_path: str = None, limit: int = None) -> Dict:
+        """
+        Benchmark every sample in a corpus manifest
+
+        Returns:
+            dict: Summary with accuracy, CER and per-stage latency percentiles,
+                  plus per-sample results
+        """
+        manifest_path = manifest_path or os.path.join(BENCHMARK_DIR, 'corpus', 'manifest.json')
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        corpus_dir = os.path.dirname(manifest_path)
+        samples = manifest['samples'][:limit] if limit else manifest['samples']
+        self.metrics.reset()
+
+        results = []
+        for sample in samples:
+            result = self.run_sample(os.path.join(corpus_dir, sample['file']))
+            truth = sample['text']
+            prediction = result['prediction'] or ''
+            result.update({
+                'file': sample['file'],
+                'truth': truth,
+                'correct': prediction == truth,
+                'char_errors': edit_distance(prediction, truth),
+                'two_line': sample['params'].get('two_line', False),
+            })
+            results.append(result)
+
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'commit': self._git_revision(),
+            'manifest': manifest_path,
+            'summary': self.summarize(results),
+            'detector_metrics': self.metrics.snapshot(),
+            'results': results,
+        }
+
+    def summarize(self, results: List[Dict]) -> Dict:
+        if not results:
+            return {'samples': 0}
+
+        total_chars = sum(len(r['truth']) for r in results)
+        summary = {
+            'samples': len(results),
+            'plate_found_rate': round(sum(r['plate_found'] for r in results) / len(results), 4),
+            'read_accuracy': round(sum(r['correct'] for r in results) / len(results), 4),
+            'char_error_rate': round(sum(r['char_errors'] for r in results) / max(total_chars, 1), 4),
+            'latency_ms': {},
+        }
+
+        for subset, name in [(False, 'single_line'), (True, 'two_line')]:
+            group = [r for r in results if r['two_line'] == subset]
+            if group:
+                summary[f'{name}_accuracy'] = round(sum(r['correct'] for r in group) / len(group), 4)
+
+        for stage in self.STAGES + ['total']:
+            if stage == 'total':
+                values = np.array([r['timings_ms']['load'] + r['timings_ms']['detect'] for r in results])
+            else:
+                values = np.array([r['timings_ms'][stage] for r in results])
+            summary['latency_ms'][stage] = {
+                'mean': round(float(values.mean()), 3),
+                'p50': round(float(np.percentile(values, 50)), 3),
+                'p95': round(float(np.percentile(values, 95)), 3),
+                'max': round(float(values.max()), 3),
+            }
+
+        return summary
+
+    def save(self, report: Dict, output_path: str = None) -> str:
+        if output_path is None:
+            os.makedirs(BENCHMARK_DIR, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            commit = report.get('commit') or 'nogit'
+            output_path = os.path.join(BENCHMARK_DIR, f'plate_benchmark_{stamp}_{commit}.json')
+
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return output_path
+
+    @staticmethod
+    def compare(baseline_path: str, candidate_path: str) -> Dict:
+        """Diff two saved reports (candidate minus baseline)"""
+        with open(baseline_path) as f:
+            baseline = json.load(f)['summary']
+        with open(candidate_path) as f:
+            candidate = json.load(f)['summary']
+
+        diff = {}
+        for key in ['read_accuracy', 'char_error_rate', 'plate_found_rate']:
+            diff[key] = round(candidate.get(key, 0) - baseline.get(key, 0), 4)
+        diff['latency_ms'] = {
+            stage: round(candidate['latency_ms'][stage]['mean'] - stats['mean'], 3)
+            for stage, stats in baseline.get('latency_ms', {}).items()
+            if stage in candidate.get('latency_ms', {})
+        }
+        return diff
+
+    @staticmethod
+    def _git_revision() -> Optional[str]:
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                  capture_output=True, text=True, timeout=5,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+        except Exception:
+            return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="License plate detector benchmark")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help='Render a synthetic plate corpus')
+    gen.add_argument('--count', type=int, default=200)
+    gen.add_argument('--seed', type=int, default=42)
+    gen.add_argument('--output-dir')
+
+    run = sub.add_parser('run', help='Benchmark the detector on a corpus')
+    run.add_argument('--manifest')
+    run.add_argument('--limit', type=int)
+    run.add_argument('--output')
+
+    cmp = sub.add_parser('compare', help='Compare two saved results')
+    cmp.add_argument('baseline')
+    cmp.add_argument('candidate')
+
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        path = SyntheticPlateGenerator(args.seed).generate_corpus(args.count, args.output_dir)
+        print(f"✓ Corpus written: {path}")
+    elif args.command == 'run':
+        bench = PlateBenchmark()
+        report = bench.run(args.manifest, args.limit)
+        path = bench.save(report, args.output)
+        print(json.dumps(report['summary'], indent=2))
+        print(f"✓ Results saved: {path}")
+    elif args.command == 'compare':
+        print(json.dumps(PlateBenchmark.compare(args.baseline, args.candidate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
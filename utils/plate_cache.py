@@ -0,0 +1,97 @@
+"""Perceptual-Hash Cache for Plate OCR Results"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict
+
+import cv2
+import numpy as np
+
+
+def perceptual_hash(gray_plate: np.ndarray, hash_size: int = 8) -> int:
+    """
+    64-bit DCT perceptual hash of a grayscale plate crop
+
+    The crop is normalized to 32x32 first, so the same plate seen at slightly
+    different scale, exposure or sensor noise hashes to nearby values.
+    """
+    size = hash_size * 4
+    small = cv2.resize(gray_plate, (size, size), interpolation=cv2.INTER_AREA)
+    small = cv2.equalizeHist(small)
+    dct = cv2.dct(np.float32(small))
+    low = dct[:hash_size, :hash_size].flatten()
+    bits = low > np.median(low[1:])
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+class PlateReadCache:
+    """
+    Bounded LRU of plate hash -> (text, confidence)
+
+    A lookup hits when a cached hash is within `max_distance` differing bits
+    of the query. Raise it to tolerate more variation between frames, lower it
+    to avoid reusing a reading for a different plate.
+    """
+
+    def __init__(self, max_size: int = 128, max_distance: int = 6):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[int, Tuple[Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, plate_hash: int) -> Optional[Tuple[Optional[str], float]]:
+        with self._lock:
+            key = plate_hash if plate_hash in self._entries else None
+
+            if key is None and self.max_distance > 0:
+                best = self.max_distance + 1
+                for cached_hash in self._entries:
+                    distance = (cached_hash ^ plate_hash).bit_count()
+                    if distance < best:
+                        key, best = cached_hash, distance
+                if key is not None:
+                    self.near_hits += 1
+
+            if key is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, plate_hash: int, text: Optional[str], confidence: float):
+        with self._lock:
+            self._entries[plate_hash] = (text, confidence)
+            self._entries.move_to_end(plate_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'max_distance': self.max_distance,
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
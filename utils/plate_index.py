@@ -0,0 +1,307 @@
+"""Fuzzy Vehicle Plate Matching for OCR Results"""
+
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+# Characters that OCR regularly mistakes for one another. Substituting inside
+# a group costs less than an arbitrary substitution, so "MH12AB1234" read as
+# "MH12A81234" is still a close match.
+CONFUSION_GROUPS = [
+    ('O', '0', 'D', 'Q'),
+    ('I', '1', 'L', 'T'),
+    ('B', '8'),
+    ('S', '5'),
+    ('Z', '2'),
+    ('G', '6'),
+    ('A', '4'),
+]
+
+CONFUSION_COST = 0.5
+SUBSTITUTION_COST = 1.0
+INDEL_COST = 1.0
+
+_CONFUSABLE = {}
+for _group in CONFUSION_GROUPS:
+    for _a in _group:
+        for _b in _group:
+            if _a != _b:
+                _CONFUSABLE[(_a, _b)] = CONFUSION_COST
+
+
+def normalize_plate(text: str) -> str:
+    """Normalize a plate string the same way vehicles are registered"""
+    if not text:
+        return ''
+    return re.sub(r'[^A-Z0-9]', '', text.upper())
+
+
+def ocr_distance(a: str, b: str) -> float:
+    """
+    Weighted edit distance that treats OCR look-alikes as cheap substitutions.
+
+    Substitution costs stay within [0.5, 1] and insert/delete cost 1, so the
+    distance is a metric and can back a BK-tree.
+    """
+    if a == b:
+        return 0.0
+    if not a:
+        return len(b) * INDEL_COST
+    if not b:
+        return len(a) * INDEL_COST
+
+    previous = [i * INDEL_COST for i in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [i * INDEL_COST]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                sub = previous[j - 1]
+            else:
+                sub = previous[j - 1] + _CONFUSABLE.get((ca, cb), SUBSTITUTION_COST)
+            current.append(min(sub,
+                               previous[j] + INDEL_COST,
+                               current[j - 1] + INDEL_COST))
+        previous = current
+
+    return previous[-1]
+
+
+class _BKNode:
+    __slots__ = ('plate', 'children')
+
+    def __init__(self, plate: str):
+        self.plate = plate
+        self.children = {}
+
+
+class PlateIndex:
+    """
+    In-memory BK-tree over registered vehicle numbers
+
+    Vehicles registered or deleted by another process (the web app, another
+    desk) are picked up by search(), which compares COUNT(*) and
+    MAX(vehicle_id) of the vehicles table at most every `refresh_seconds`.
+    New ids are inserted as a delta; any other change reloads the index.
+    Plates cannot be edited, so those two numbers cover every change the
+    index cares about.
+    """
+
+    def __init__(self, db=None, refresh_seconds: float = 2.0):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self._root = None
+        self._vehicles: Dict[str, Dict] = {}
+        self._by_id: Dict[int, str] = {}
+        self._tombstones = set()
+        self._loaded = False
+        self._state: Tuple[int, int] = (0, 0)
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._vehicles)
+
+    def _get_db(self):
+        if self.db is None:
+            from database.db_manager import get_db_manager
+            self.db = get_db_manager()
+        return self.db
+
+    def _table_state(self) -> Optional[Tuple[int, int]]:
+        row = self._get_db().fetch_one(
+            "SELECT COUNT(*) AS count, COALESCE(MAX(vehicle_id), 0) AS max_id FROM vehicles")
+        return (row['count'], row['max_id']) if row else None
+
+    def load(self):
+        """(Re)build the index from the vehicles table"""
+        state = self._table_state()
+        rows = self._get_db().get_all_vehicles()
+
+        with self._lock:
+            self._root = None
+            self._vehicles = {}
+            self._by_id = {}
+            self._tombstones = set()
+            for row in rows:
+                self._insert(dict(row))
+            self._state = state or (len(rows), 0)
+            self._checked_at = time.monotonic()
+            self._loaded = True
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Catch up with vehicles added or deleted elsewhere
+
+        Returns:
+            bool: True if the index changed
+        """
+        if not self._loaded:
+            self.load()
+            return True
+
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_seconds:
+            return False
+        self._checked_at = now
+
+        state = self._table_state()
+        if state is None or state == self._state:
+            return False
+
+        count, max_id = self._state
+        added = self._get_db().fetch_all("""
+            SELECT vehicle_id, user_id, vehicle_number, vehicle_type FROM vehicles
+            WHERE vehicle_id > ? ORDER BY vehicle_id
+        """, (max_id,))
+        if state[0] != count + len(added):
+            # Something was deleted as well; ids alone can't say what
+            self.load()
+            return True
+
+        with self._lock:
+            for row in added:
+                self._remove(row['vehicle_id'])
+                self._insert(dict(row))
+            self._state = state
+        return True
+
+    def add(self, vehicle_id: int, vehicle_number: str, user_id: int = None,
+            vehicle_type: str = None) -> bool:
+        """Add or update a vehicle. Before the first load this is a no-op."""
+        with self._lock:
+            if not self._loaded:
+                return False
+            self._remove(vehicle_id)
+            return self._insert({
+                'vehicle_id': vehicle_id,
+                'user_id': user_id,
+                'vehicle_number': vehicle_number,
+                'vehicle_type': vehicle_type,
+            })
+
+    def remove(self, vehicle_id: int) -> bool:
+        """Remove a vehicle. Before the first load this is a no-op."""
+        with self._lock:
+            if not self._loaded:
+                return False
+            removed = self._remove(vehicle_id)
+            if len(self._tombstones) > max(64, len(self._vehicles)):
+                self._rebuild()
+            return removed
+
+    def search(self, text: str, max_distance: float = 2.0, limit: int = 5) -> List[Dict]:
+        """
+        Find registered vehicles close to an OCR reading
+
+        Args:
+            text: Raw or corrected plate text
+            max_distance: Largest OCR-weighted edit distance to accept
+            limit: Maximum number of candidates
+
+        Returns:
+            list: Vehicle dicts with 'distance' and 'score', best match first
+        """
+        self.refresh()
+        query = normalize_plate(text)
+        if not query:
+            return []
+
+        with self._lock:
+            exact = self._vehicles.get(query)
+            if exact is not None and limit == 1:
+                return [self._candidate(exact, 0.0, query)]
+
+            matches = []
+            if self._root is not None:
+                stack = [self._root]
+                while stack:
+                    node = stack.pop()
+                    distance = ocr_distance(query, node.plate)
+                    if distance <= max_distance and node.plate not in self._tombstones:
+                        matches.append((distance, node.plate))
+
+                    low, high = distance - max_distance, distance + max_distance
+                    for child_distance, child in node.children.items():
+                        if low <= child_distance <= high:
+                            stack.append(child)
+
+            matches.sort()
+            return [self._candidate(self._vehicles[plate], distance, query)
+                    for distance, plate in matches[:limit]]
+
+    def best_match(self, text: str, max_distance: float = 1.5) -> Optional[Dict]:
+        """Return the single closest vehicle, or None if ambiguous or too far"""
+        candidates = self.search(text, max_distance=max_distance, limit=2)
+        if not candidates:
+            return None
+        if len(candidates) > 1 and candidates[0]['distance'] == candidates[1]['distance']:
+            return None
+        return candidates[0]
+
+    def _candidate(self, vehicle: Dict, distance: float, query: str) -> Dict:
+        result = dict(vehicle)
+        length = max(len(query), len(vehicle['plate']), 1)
+        result['distance'] = distance
+        result['score'] = round(max(0.0, 1.0 - distance / length), 3)
+        return result
+
+    def _insert(self, vehicle: Dict) -> bool:
+        plate = normalize_plate(vehicle.get('vehicle_number'))
+        if not plate:
+            return False
+
+        vehicle['plate'] = plate
+        self._vehicles[plate] = vehicle
+        if vehicle.get('vehicle_id') is not None:
+            self._by_id[vehicle['vehicle_id']] = plate
+
+        if plate in self._tombstones:
+            self._tombstones.discard(plate)
+            return True
+
+        if self._root is None:
+            self._root = _BKNode(plate)
+            return True
+
+        node = self._root
+        while True:
+            distance = ocr_distance(plate, node.plate)
+            if distance == 0:
+                return True
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _BKNode(plate)
+                return True
+            node = child
+
+    def _remove(self, vehicle_id: int) -> bool:
+        plate = self._by_id.pop(vehicle_id, None)
+        if plate is None:
+            return False
+        self._vehicles.pop(plate, None)
+        self._tombstones.add(plate)
+        return True
+
+    def _rebuild(self):
+        vehicles = list(self._vehicles.values())
+        self._root = None
+        self._vehicles = {}
+        self._by_id = {}
+        self._tombstones = set()
+        for vehicle in vehicles:
+            self._insert(vehicle)
+
+
+_index_instance = None
+
+def get_plate_index() -> PlateIndex:
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = PlateIndex()
+    return _index_instance
@@ -1,36 +1,46 @@
 """QR Code Generation and Scanning Utilities"""
 
-import qrcode
 import cv2
 from pyzbar.pyzbar import decode
 import json
-from PIL import Image
 import os
+import time
 from datetime import datetime
+from utils.qr_renderer import get_qr_renderer
+from utils.qr_scanner import QRScanner
+from utils.qr_payload import (encode_booking_payload, parse_booking_qr,
+                              error_correction_for, QRPayloadError, QRSecretError)
 
 
 class QRHandler:
     """Handle QR code generation and scanning for parking system"""
     
-    def __init__(self, output_dir="outputs/qrcodes"):
-        """Initialize QR handler with output directory"""
-        self.output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
-    
-    def generate_booking_qr(self, booking_id, ticket_number, user_id, vehicle_number, slot_number):
+    def __init__(self, output_dir="outputs/qrcodes", save_to_disk=True, compact=True):
         """
-        Generate QR code for a booking
+        Initialize QR handler
         
         Args:
-            booking_id: Unique booking ID
-            ticket_number: Ticket number
-            user_id: User ID
-            vehicle_number: Vehicle registration number
-            slot_number: Assigned slot number
-            
-        Returns:
-            tuple: (qr_data_string, qr_image_path)
+            output_dir: Directory for PNG files when save_to_disk is True
+            save_to_disk: Also write each generated QR as a PNG file
+            compact: Issue signed compact payloads instead of legacy JSON
         """
+        self.output_dir = output_dir
+        self.save_to_disk = save_to_disk
+        self.compact = compact
+        self.renderer = get_qr_renderer()
+        if save_to_disk:
+            os.makedirs(output_dir, exist_ok=True)
+    
+    def build_booking_payload(self, booking_id, ticket_number, user_id, vehicle_number, slot_number,
+                              expires_at=None):
+        """Build the string encoded in a booking QR"""
+        if self.compact:
+            try:
+                return encode_booking_payload(booking_id, ticket_number, expires_at)
+            except QRSecretError as e:
+                # Unsigned JSON is still checked against the database at the gate
+                print(f"✗ {e} - issuing legacy JSON QR for {ticket_number}")
+        
         qr_data = {
             "type": "parking_booking",
             "booking_id": booking_id,
@@ -41,25 +51,56 @@ class QRHandler:
             "timestamp": datetime.now().isoformat()
         }
         
-        qr_data_str = json.dumps(qr_data)
+        return json.dumps(qr_data)
+    
+    def generate_booking_qr(self, booking_id, ticket_number, user_id, vehicle_number, slot_number,
+                            expires_at=None):
+        """
+        Generate QR code for a booking
         
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
+        Args:
+            booking_id: Unique booking ID
+            ticket_number: Ticket number
+            user_id: User ID
+            vehicle_number: Vehicle registration number
+            slot_number: Assigned slot number
+            expires_at: When the ticket stops being accepted (compact payloads only)
+            
+        Returns:
+            tuple: (qr_data_string, qr_image_path) - path is None when
+                   the handler does not save to disk
+        """
+        qr_data_str = self.build_booking_payload(
+            booking_id, ticket_number, user_id, vehicle_number, slot_number, expires_at
         )
-        qr.add_data(qr_data_str)
-        qr.make(fit=True)
         
-        img = qr.make_image(fill_color="black", back_color="white")
+        if not self.save_to_disk:
+            return qr_data_str, None
+        
+        png = self.render_booking_qr(booking_id, qr_data_str, 'png')
         
         filename = f"booking_{booking_id}_{ticket_number}.png"
         filepath = os.path.join(self.output_dir, filename)
-        img.save(filepath)
+        with open(filepath, 'wb') as f:
+            f.write(png)
         
         return qr_data_str, filepath
     
+    def render_booking_qr(self, booking_id, qr_data_str, fmt='png'):
+        """
+        Render a booking's QR in memory, served from the LRU cache when possible
+        
+        Args:
+            booking_id: Booking ID used as the cache key
+            qr_data_str: Payload previously returned by generate_booking_qr
+            fmt: 'png' or 'svg'
+            
+        Returns:
+            bytes: Encoded image
+        """
+        return self.renderer.get(booking_id, qr_data_str, fmt,
+                                 error_correction=error_correction_for(qr_data_str))
+    
     def scan_qr_from_image(self, image_path):
         """
         Scan QR code from image file
@@ -68,7 +109,8 @@ class QRHandler:
             image_path: Path to image file containing QR code
             
         Returns:
-            dict: Decoded QR data or None if no QR found
+            dict: Decoded QR data (see parse_booking_qr) or None if no QR found.
+                  Signature and expiry are checked later by the caller.
         """
         try:
             img = cv2.imread(image_path)
@@ -79,23 +121,28 @@ class QRHandler:
             
             if decoded_objects:
                 qr_data = decoded_objects[0].data.decode('utf-8')
-                return json.loads(qr_data)
+                return parse_booking_qr(qr_data, verify=False)
             
             return None
         except Exception as e:
             print(f"Error scanning QR: {e}")
             return None
     
-    def scan_qr_from_webcam(self):
+    def scan_qr_from_webcam(self, source=0):
         """
         Scan QR code from webcam feed
         
+        Capture and decoding run on QRScanner's worker threads; this loop
+        only draws the preview and handles keys.
+        
+        Args:
+            source: Camera index (or a video file for testing)
+        
         Returns:
             dict: Decoded QR data or None if cancelled
         """
-        cap = cv2.VideoCapture(0)
-        
-        if not cap.isOpened():
+        scanner = QRScanner(source, debounce_seconds=1.0)
+        if not scanner.start():
             print("Error: Could not open webcam")
             return None
         
@@ -104,50 +151,57 @@ class QRHandler:
         print("=" * 60)
         
         detected_data = None
+        invalid = False
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            decoded_objects = decode(frame)
-            
-            if decoded_objects:
-                for obj in decoded_objects:
-                    qr_data = obj.data.decode('utf-8')
-                    
-                    points = obj.polygon
-                    if len(points) == 4:
-                        pts = [(point.x, point.y) for point in points]
+        try:
+            while scanner.running:
+                detection = scanner.read()
+                if detection:
+                    try:
+                        detected_data = parse_booking_qr(detection['data'], verify=False)
+                        invalid = False
+                    except QRPayloadError:
+                        detected_data = None
+                        invalid = True
+                
+                frame = scanner.get_latest_frame()
+                if frame is None:
+                    cv2.waitKey(10)
+                    continue
+                frame = frame.copy()
+                
+                last = scanner.last_detection
+                if last and time.monotonic() - last['time'] < 0.5:
+                    pts = last['polygon']
+                    if len(pts) == 4:
                         for i in range(4):
                             cv2.line(frame, pts[i], pts[(i + 1) % 4], (0, 255, 0), 3)
                     
                     cv2.putText(frame, "QR Detected!", (10, 30),
                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                     
-                    try:
-                        detected_data = json.loads(qr_data)
-                        cv2.putText(frame, "Press SPACE to confirm", (10, 70),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    except:
+                    if invalid:
                         cv2.putText(frame, "Invalid QR format", (10, 70),
                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            else:
-                cv2.putText(frame, "No QR detected - Show QR to camera", (10, 30),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            
-            cv2.imshow('QR Scanner - SPACE to confirm | ESC to cancel', frame)
-            
-            key = cv2.waitKey(1) & 0xFF
-            
-            if key == ord(' ') and detected_data:
-                break
-            elif key == 27:
-                detected_data = None
-                break
-        
-        cap.release()
-        cv2.destroyAllWindows()
+                    else:
+                        cv2.putText(frame, "Press SPACE to confirm", (10, 70),
+                                  cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                else:
+                    cv2.putText(frame, "No QR detected - Show QR to camera", (10, 30),
+                              cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                
+                cv2.imshow('QR Scanner - SPACE to confirm | ESC to cancel', frame)
+                
+                key = cv2.waitKey(1) & 0xFF
+                
+                if key == ord(' ') and detected_data:
+                    break
+                elif key == 27:
+                    detected_data = None
+                    break
+        finally:
+            scanner.stop()
+            cv2.destroyAllWindows()
         
         return detected_data
     
@@ -164,7 +218,10 @@ class QRHandler:
         if not isinstance(qr_data, dict):
             return False
         
-        required_fields = ['type', 'booking_id', 'ticket', 'user_id', 'vehicle', 'slot']
+        if qr_data.get('signed'):
+            required_fields = ['type', 'booking_id', 'ticket', 'expires_at']
+        else:
+            required_fields = ['type', 'booking_id', 'ticket', 'user_id', 'vehicle', 'slot']
         
         for field in required_fields:
             if field not in qr_data:
@@ -175,18 +232,24 @@ class QRHandler:
         
         return True
     
-    def get_qr_as_base64(self, qr_image_path):
+    def get_qr_as_base64(self, qr_image_path=None, qr_data_str=None, booking_id=None):
         """
         Convert QR image to base64 for web display
         
         Args:
             qr_image_path: Path to QR image
+            qr_data_str: Payload to render in memory instead of reading a file
+            booking_id: Cache key for in-memory rendering
             
         Returns:
-            str: Base64 encoded image
+            str: Base64 encoded PNG
         """
         import base64
         
+        if qr_data_str is not None:
+            png = self.render_booking_qr(booking_id, qr_data_str, 'png')
+            return base64.b64encode(png).decode('utf-8')
+        
         with open(qr_image_path, "rb") as img_file:
             return base64.b64encode(img_file.read()).decode('utf-8')
 
@@ -214,8 +277,7 @@ def test_qr_handler():
         print(f"✓ QR Scanned Successfully!")
         print(f"  Booking ID: {scanned_data['booking_id']}")
         print(f"  Ticket: {scanned_data['ticket']}")
-        print(f"  Vehicle: {scanned_data['vehicle']}")
-        print(f"  Slot: {scanned_data['slot']}")
+        print(f"  Signed: {scanned_data['signed']}")
     else:
         print("✗ Failed to scan QR")
     
@@ -0,0 +1,211 @@
+"""Compact Signed Booking QR Payloads"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import struct
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+import qrcode
+
+
+PAYLOAD_PREFIX = "PK1:"
+PAYLOAD_VERSION = 1
+SIGNATURE_BYTES = 10
+
+# Entry scans reject tickets older than this. Exit scans skip the expiry
+# check: a stay can outlast any fixed TTL, and the booking's status decides
+# whether the car may leave.
+DEFAULT_TTL_HOURS = 48
+
+# version, booking_id, expires_at (epoch seconds), ticket encoding
+_HEADER = struct.Struct('>BIIB')
+
+_TICKET_PACKED = 0
+_TICKET_RAW = 1
+_TICKET_PATTERN = re.compile(r'^PKG(\d{14})([0-9A-F]{4})$')
+
+
+class QRPayloadError(ValueError):
+    """Raised when a scanned QR is unreadable, forged or expired"""
+
+
+class QRSecretError(QRPayloadError):
+    """Raised when no signing key is configured, so tickets can't be signed or checked"""
+
+
+_secret_warned = False
+
+
+def get_secret() -> bytes:
+    """
+    Signing key shared by the desktop app, web app and gates
+
+    Only PARKING_QR_SECRET is used, so every component signs and verifies
+    with the same key. There is no built-in default, since a published key
+    would let anyone forge tickets.
+
+    Raises:
+        QRSecretError: If no key is configured
+    """
+    global _secret_warned
+    secret = os.environ.get('PARKING_QR_SECRET')
+    if not secret:
+        if not _secret_warned:
+            _secret_warned = True
+            print("=" * 60)
+            print("✗ PARKING_QR_SECRET is not set - signed QR tickets are disabled")
+            print("=" * 60)
+        raise QRSecretError("QR signing key not configured (set PARKING_QR_SECRET)")
+    return secret.encode('utf-8')
+
+
+def _pack_ticket(ticket_number: str) -> bytes:
+    match = _TICKET_PATTERN.match(ticket_number)
+    if match:
+        # PKG + 14-digit timestamp + 4 hex chars fits in 8 bytes
+        return (bytes([_TICKET_PACKED]) + int(match.group(1)).to_bytes(6, 'big') +
+                int(match.group(2), 16).to_bytes(2, 'big'))
+
+    raw = ticket_number.encode('utf-8')
+    if len(raw) > 255:
+        raise QRPayloadError("Ticket number too long")
+    return bytes([_TICKET_RAW, len(raw)]) + raw
+
+
+def _unpack_ticket(data: bytes, offset: int):
+    kind = data[offset - 1]
+    if kind == _TICKET_PACKED:
+        stamp = int.from_bytes(data[offset:offset + 6], 'big')
+        suffix = int.from_bytes(data[offset + 6:offset + 8], 'big')
+        return f"PKG{stamp:014d}{suffix:04X}", offset + 8
+    if kind == _TICKET_RAW:
+        length = data[offset]
+        end = offset + 1 + length
+        return data[offset + 1:end].decode('utf-8'), end
+    raise QRPayloadError("Unknown ticket encoding")
+
+
+def _sign(body: bytes, secret: bytes) -> bytes:
+    return hmac.new(secret, body, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def encode_booking_payload(booking_id: int, ticket_number: str,
+                           expires_at: datetime = None, secret: bytes = None) -> str:
+    """
+    Encode a booking as a short signed string, e.g. 'PK1:AEAAAB...'
+
+    The result only uses QR alphanumeric-mode characters, so it packs into a
+    much smaller code than the JSON payload.
+
+    Args:
+        booking_id: Booking ID
+        ticket_number: Ticket number
+        expires_at: Last moment the ticket is accepted (default now + 48h)
+        secret: Signing key (default get_secret())
+
+    Returns:
+        str: Payload to put in the QR code
+
+    Raises:
+        QRSecretError: If no secret is given and none is configured
+    """
+    if expires_at is None:
+        expires_at = datetime.now() + timedelta(hours=DEFAULT_TTL_HOURS)
+
+    ticket = _pack_ticket(ticket_number)
+    body = (_HEADER.pack(PAYLOAD_VERSION, booking_id, int(expires_at.timestamp()), ticket[0]) +
+            ticket[1:])
+    signed = body + _sign(body, secret or get_secret())
+
+    return PAYLOAD_PREFIX + base64.b32encode(signed).decode('ascii').rstrip('=')
+
+
+def decode_booking_payload(text: str, verify: bool = True, secret: bytes = None,
+                           now: float = None, check_expiry: bool = True) -> Dict:
+    """
+    Decode a compact payload, checking signature (and expiry, when
+    `check_expiry`) if `verify`
+
+    Raises:
+        QRPayloadError: If the payload is malformed, forged or expired
+    """
+    encoded = text[len(PAYLOAD_PREFIX):].upper()
+    try:
+        data = base64.b32decode(encoded + '=' * (-len(encoded) % 8))
+    except (ValueError, TypeError):
+        raise QRPayloadError("Unreadable QR data")
+
+    if len(data) < _HEADER.size + SIGNATURE_BYTES:
+        raise QRPayloadError("Unreadable QR data")
+
+    body, signature = data[:-SIGNATURE_BYTES], data[-SIGNATURE_BYTES:]
+    version, booking_id, expires_at, _ = _HEADER.unpack_from(body)
+    if version != PAYLOAD_VERSION:
+        raise QRPayloadError(f"Unsupported QR version {version}")
+
+    try:
+        ticket_number, end = _unpack_ticket(body, _HEADER.size)
+    except (IndexError, UnicodeDecodeError):
+        raise QRPayloadError("Unreadable QR data")
+    if end != len(body):
+        raise QRPayloadError("Unreadable QR data")
+
+    if verify:
+        if not hmac.compare_digest(signature, _sign(body, secret or get_secret())):
+            raise QRPayloadError("Invalid QR signature - ticket may be forged")
+        if check_expiry and (now or time.time()) > expires_at:
+            raise QRPayloadError(
+                f"Ticket expired at {datetime.fromtimestamp(expires_at):%Y-%m-%d %H:%M}")
+
+    return {
+        'type': 'parking_booking',
+        'version': version,
+        'booking_id': booking_id,
+        'ticket': ticket_number,
+        'expires_at': expires_at,
+        'signed': True,
+        'raw': text,
+    }
+
+
+def parse_booking_qr(text: str, verify: bool = True, secret: bytes = None,
+                     now: float = None, check_expiry: bool = True) -> Dict:
+    """
+    Parse any booking QR: compact signed payloads and the older JSON format
+
+    Legacy JSON codes carry no signature, so they are returned with
+    signed=False and must still be checked against the database. Exit
+    scans pass check_expiry=False.
+
+    Raises:
+        QRPayloadError: If the QR is not a valid, unexpired booking ticket
+    """
+    text = text.strip()
+    if text.upper().startswith(PAYLOAD_PREFIX):
+        return decode_booking_payload(text, verify=verify, secret=secret, now=now,
+                                      check_expiry=check_expiry)
+
+    try:
+        data = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        raise QRPayloadError("Unreadable QR data")
+
+    if not isinstance(data, dict) or data.get('type') != 'parking_booking':
+        raise QRPayloadError("This is not a valid parking booking QR code")
+
+    data['signed'] = False
+    data['raw'] = text
+    return data
+
+
+def error_correction_for(text: str) -> int:
+    """Compact payloads are short enough for level M; legacy JSON keeps H"""
+    if text.startswith(PAYLOAD_PREFIX):
+        return qrcode.constants.ERROR_CORRECT_M
+    return qrcode.constants.ERROR_CORRECT_H
@@ -0,0 +1,122 @@
+"""In-Memory QR Code Rendering with an LRU Cache"""
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import qrcode
+import qrcode.image.svg
+
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+class QRRenderer:
+    """
+    Render QR codes to PNG or SVG bytes without touching the disk
+
+    Rendered images are kept in a bounded LRU keyed by the caller's key
+    (usually the booking id) plus a digest of the encoded data, so a changed
+    payload for the same booking is never served stale.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def data_digest(data: str) -> str:
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+    def render(self, data: str, fmt: str = 'png', error_correction=qrcode.constants.ERROR_CORRECT_H,
+               box_size: int = 10, border: int = 4) -> bytes:
+        """Render `data` to image bytes (no caching)"""
+        if fmt not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported QR format: {fmt}")
+
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=error_correction,
+            box_size=box_size,
+            border=border,
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+
+        buffer = io.BytesIO()
+        if fmt == 'svg':
+            img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        else:
+            img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffer)
+        return buffer.getvalue()
+
+    def get(self, key, data: str, fmt: str = 'png', **render_options) -> bytes:
+        """
+        Return cached image bytes for `key`, rendering on a miss
+
+        Args:
+            key: Cache key, e.g. booking id
+            data: String to encode
+            fmt: 'png' or 'svg'
+
+        Returns:
+            bytes: Encoded image
+        """
+        cache_key = (key, self.data_digest(data), fmt)
+
+        with self._lock:
+            image = self._cache.get(cache_key)
+            if image is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        image = self.render(data, fmt, **render_options)
+
+        with self._lock:
+            if cache_key not in self._cache:
+                self._cache[cache_key] = image
+                self._cache_bytes += len(image)
+            while self._cache and (len(self._cache) > self.max_entries or
+                                   self._cache_bytes > self.max_bytes):
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+        return image
+
+    def invalidate(self, key):
+        """Drop every cached rendering for `key`"""
+        with self._lock:
+            for cache_key in [k for k in self._cache if k[0] == key]:
+                self._cache_bytes -= len(self._cache.pop(cache_key))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._cache),
+            'bytes': self._cache_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_renderer_instance: Optional[QRRenderer] = None
+
+def get_qr_renderer() -> QRRenderer:
+    global _renderer_instance
+    if _renderer_instance is None:
+        _renderer_instance = QRRenderer()
+    return _renderer_instance
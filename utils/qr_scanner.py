@@ -0,0 +1,287 @@
+"""Threaded QR Scanning Pipeline for Webcams and Video Files"""
+
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+import cv2
+from pyzbar.pyzbar import decode
+
+
+class QRScanner:
+    """
+    Capture thread + decode worker for QR codes
+
+    The capture thread only grabs frames; the worker converts them to
+    grayscale, decodes a downsampled copy, and once a code has been seen
+    decodes just the region around it at full resolution until it is lost.
+    The same code is reported at most once per `debounce_seconds`.
+
+    Camera sources keep only the newest frame, so a slow decode never builds
+    a backlog. Video files are read without dropping frames, which makes a
+    recorded clip behave the same on every run.
+    """
+
+    def __init__(self, source=0, max_width: int = 640, frame_skip: int = 1,
+                 debounce_seconds: float = 3.0, roi_margin: float = 0.5,
+                 roi_max_misses: int = 5, on_detect: Callable = None, decoder: Callable = None):
+        """
+        Args:
+            source: Camera index or path to a video file
+            max_width: Full frames are downsampled to this width before decoding
+            frame_skip: Only every Nth captured frame is decoded
+            debounce_seconds: Ignore repeat reads of the same code within this time
+            roi_margin: Padding around the last detection, as a fraction of its size
+            roi_max_misses: Fall back to full-frame decoding after this many ROI misses
+            on_detect: Called from the worker thread with each detection dict
+            decoder: Replacement for pyzbar's decode(image)
+        """
+        self.source = source
+        self.is_file = isinstance(source, str)
+        self.max_width = max_width
+        self.frame_skip = max(1, frame_skip)
+        self.debounce_seconds = debounce_seconds
+        self.roi_margin = roi_margin
+        self.roi_max_misses = roi_max_misses
+        self.on_detect = on_detect
+        self.decoder = decoder or decode
+
+        self._cap = None
+        self._frames = queue.Queue(maxsize=2)
+        self._detections = queue.Queue(maxsize=100)
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self._latest_frame = None
+        self._roi = None
+        self._roi_misses = 0
+        self._last_seen: Dict[str, float] = {}
+        self.last_detection: Optional[Dict] = None
+
+        self.counters = {
+            'captured': 0, 'dropped': 0, 'decoded': 0, 'roi_decodes': 0,
+            'full_decodes': 0, 'detections': 0, 'debounced': 0,
+        }
+        self._decode_ms_total = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self) -> bool:
+        """Open the source and start both threads; False if it cannot be opened"""
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            print(f"Error: Could not open video source {self.source}")
+            return False
+
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name='qr-capture', daemon=True),
+            threading.Thread(target=self._decode_loop, name='qr-decode', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def get_latest_frame(self):
+        """Most recent captured color frame, for on-screen preview"""
+        with self._lock:
+            return self._latest_frame
+
+    def read(self, timeout: float = None) -> Optional[Dict]:
+        """Next detection, or None if nothing arrives within `timeout`"""
+        try:
+            return self._detections.get(timeout=timeout) if timeout else self._detections.get_nowait()
+        except queue.Empty:
+            return None
+
+    def detections(self, max_count: int = None) -> Iterator[Dict]:
+        """Yield detections until the source ends or `max_count` is reached"""
+        produced = 0
+        while not (max_count and produced >= max_count):
+            detection = self.read(timeout=0.1)
+            if detection is not None:
+                produced += 1
+                yield detection
+            elif not self.running and self._detections.empty():
+                break
+
+    def _capture_loop(self):
+        index = 0
+        try:
+            while not self._stop.is_set():
+                ret, frame = self._cap.read()
+                if not ret:
+                    break
+
+                index += 1
+                self.counters['captured'] += 1
+                with self._lock:
+                    self._latest_frame = frame
+
+                if index % self.frame_skip:
+                    continue
+
+                if self.is_file:
+                    while not self._stop.is_set():
+                        try:
+                            self._frames.put((index, frame), timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                else:
+                    try:
+                        self._frames.put_nowait((index, frame))
+                    except queue.Full:
+                        try:
+                            self._frames.get_nowait()
+                            self.counters['dropped'] += 1
+                        except queue.Empty:
+                            pass
+                        self._frames.put_nowait((index, frame))
+        finally:
+            # End-of-stream marker for the decode worker
+            while not self._stop.is_set():
+                try:
+                    self._frames.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            try:
+                item = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+
+            index, frame = item
+            start = time.perf_counter()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            results, used_roi = self._decode_gray(gray)
+            decode_ms = (time.perf_counter() - start) * 1000
+
+            self.counters['decoded'] += 1
+            self._decode_ms_total += decode_ms
+
+            for data, polygon in results:
+                self._emit(data, polygon, index, decode_ms, used_roi)
+
+    def _decode_gray(self, gray):
+        """Decode the ROI if one is active, otherwise a downsampled full frame"""
+        if self._roi is not None:
+            x, y, w, h = self._roi
+            self.counters['roi_decodes'] += 1
+            results = self._run_decoder(gray[y:y + h, x:x + w], 1.0, x, y)
+            if results:
+                self._roi_misses = 0
+                self._update_roi(results, gray.shape)
+                return results, True
+
+            self._roi_misses += 1
+            if self._roi_misses < self.roi_max_misses:
+                return [], True
+            self._roi = None
+
+        self.counters['full_decodes'] += 1
+        scale = min(1.0, self.max_width / gray.shape[1])
+        small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale,
+                                                     interpolation=cv2.INTER_AREA)
+        results = self._run_decoder(small, scale, 0, 0)
+        if results:
+            self._roi_misses = 0
+            self._update_roi(results, gray.shape)
+        return results, False
+
+    def _run_decoder(self, image, scale: float, offset_x: int, offset_y: int):
+        """Decode and map each polygon back to full-frame coordinates"""
+        results = []
+        for obj in self.decoder(image):
+            polygon = [(int(p.x / scale) + offset_x, int(p.y / scale) + offset_y)
+                       for p in obj.polygon]
+            results.append((obj.data.decode('utf-8', errors='replace'), polygon))
+        return results
+
+    def _update_roi(self, results, shape):
+        xs = [x for _, polygon in results for x, _ in polygon]
+        ys = [y for _, polygon in results for _, y in polygon]
+        if not xs:
+            return
+
+        pad = int(max(max(xs) - min(xs), max(ys) - min(ys)) * self.roi_margin)
+        x0, y0 = max(0, min(xs) - pad), max(0, min(ys) - pad)
+        x1, y1 = min(shape[1], max(xs) + pad), min(shape[0], max(ys) + pad)
+        self._roi = (x0, y0, x1 - x0, y1 - y0)
+
+    def _emit(self, data: str, polygon, index: int, decode_ms: float, used_roi: bool):
+        now = time.monotonic()
+        detection = {
+            'data': data,
+            'polygon': polygon,
+            'frame_index': index,
+            'decode_ms': round(decode_ms, 2),
+            'roi': used_roi,
+            'time': now,
+        }
+        self.last_detection = detection
+
+        last = self._last_seen.get(data)
+        self._last_seen[data] = now
+        if last is not None and now - last < self.debounce_seconds:
+            self.counters['debounced'] += 1
+            return
+
+        self.counters['detections'] += 1
+        if self.on_detect:
+            self.on_detect(detection)
+        try:
+            self._detections.put_nowait(detection)
+        except queue.Full:
+            pass
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.counters)
+        decoded = stats['decoded']
+        stats['avg_decode_ms'] = round(self._decode_ms_total / decoded, 2) if decoded else 0.0
+        return stats
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.qr_scanner <video_file|camera_index>")
+        sys.exit(1)
+
+    from utils.qr_payload import parse_booking_qr, QRPayloadError
+
+    source = int(sys.argv[1]) if sys.argv[1].isdigit() else sys.argv[1]
+    with QRScanner(source) as scanner:
+        for detection in scanner.detections():
+            try:
+                ticket = parse_booking_qr(detection['data'])
+                status = f"booking {ticket['booking_id']} ticket {ticket['ticket']}"
+            except QRPayloadError as e:
+                status = f"rejected - {e}"
+            print(f"frame {detection['frame_index']:>5} {detection['decode_ms']:6.1f} ms "
+                  f"{'roi ' if detection['roi'] else 'full'} {status}")
+        print(scanner.get_stats())
@@ -0,0 +1,154 @@
+"""Cached In-Memory PDF Receipt Rendering"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.pdf_generator import PDFGenerator
+from utils.qr_payload import error_correction_for
+from utils.qr_renderer import get_qr_renderer
+
+
+# Bump when the receipt layout changes so cached PDFs and ETags roll over
+RECEIPT_TEMPLATE_VERSION = 1
+
+RECEIPT_FIELDS = ('ticket_number', 'vehicle_number', 'slot_number', 'entry_time', 'exit_time',
+                  'duration_hours', 'base_price', 'base_amount', 'surge_amount', 'total_amount',
+                  'generated_at')
+
+
+def receipt_hash(bill_data: Dict, qr_data: str = None) -> str:
+    """Stable digest of everything printed on a receipt"""
+    content = {field: bill_data.get(field) for field in RECEIPT_FIELDS}
+    content['qr'] = qr_data
+    content['template'] = RECEIPT_TEMPLATE_VERSION
+    encoded = json.dumps(content, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:20]
+
+
+_worker_generator = None
+
+
+def _init_worker():
+    global _worker_generator
+    _worker_generator = PDFGenerator()
+
+
+def _render_receipt(job: Tuple[Dict, Optional[bytes]]) -> bytes:
+    if _worker_generator is None:
+        _init_worker()
+    bill_data, qr_png = job
+    return _worker_generator.render_parking_receipt(bill_data, qr_png, bill_data.get('generated_at'))
+
+
+class ReceiptRenderer:
+    """
+    Render receipts to PDF bytes, cached by receipt hash
+
+    The cache is a bounded LRU, so repeat downloads of the same receipt
+    (browser reloads, reprints) are served without rebuilding the PDF.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generator = PDFGenerator()
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.last_batch_rate = 0.0
+
+    def _qr_png(self, bill_data: Dict, qr_data: str = None) -> Optional[bytes]:
+        if not qr_data:
+            return None
+        return get_qr_renderer().get(bill_data.get('booking_id'), qr_data, 'png',
+                                     error_correction=error_correction_for(qr_data))
+
+    def get(self, bill_data: Dict, qr_data: str = None) -> Tuple[str, bytes]:
+        """
+        Return (receipt_hash, pdf_bytes), rendering on a cache miss
+
+        Args:
+            bill_data: Receipt fields; set 'generated_at' for a stable footer
+            qr_data: Optional booking QR payload to print on the receipt
+        """
+        digest = receipt_hash(bill_data, qr_data)
+
+        with self._lock:
+            pdf = self._cache.get(digest)
+            if pdf is not None:
+                self._cache.move_to_end(digest)
+                self.hits += 1
+                return digest, pdf
+            self.misses += 1
+
+        pdf = self.generator.render_parking_receipt(bill_data, self._qr_png(bill_data, qr_data),
+                                                    bill_data.get('generated_at'))
+        self._store(digest, pdf)
+        return digest, pdf
+
+    def _store(self, digest: str, pdf: bytes):
+        with self._lock:
+            if digest not in self._cache:
+                self._cache[digest] = pdf
+                self._cache_bytes += len(pdf)
+            while self._cache and (len(self._cache) > self.max_entries or
+                                   self._cache_bytes > self.max_bytes):
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def render_batch(self, bills: List[Dict], workers: int = None, chunksize: int = 8,
+                     qr_data: List[str] = None) -> Iterator[Tuple[Dict, str, bytes]]:
+        """
+        Render many receipts on a process pool, yielding in input order
+
+        Results are not added to the cache; bulk reprints would only evict
+        the receipts people are actually downloading.
+
+        Yields:
+            tuple: (bill_data, receipt_hash, pdf_bytes)
+        """
+        qr_data = qr_data or [None] * len(bills)
+        jobs = [(bill, self._qr_png(bill, qr)) for bill, qr in zip(bills, qr_data)]
+
+        start = time.perf_counter()
+        if workers == 1 or len(jobs) < 2:
+            results = map(_render_receipt, jobs)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            results = pool.map(_render_receipt, jobs, chunksize=chunksize)
+
+        try:
+            for bill, qr, pdf in zip(bills, qr_data, results):
+                yield bill, receipt_hash(bill, qr), pdf
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            elapsed = time.perf_counter() - start
+            self.last_batch_rate = round(len(jobs) / elapsed, 1) if elapsed else 0.0
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._cache),
+            'bytes': self._cache_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_renderer_instance: Optional[ReceiptRenderer] = None
+
+def get_receipt_renderer() -> ReceiptRenderer:
+    global _renderer_instance
+    if _renderer_instance is None:
+        _renderer_instance = ReceiptRenderer()
+    return _renderer_instance